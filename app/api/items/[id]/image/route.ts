@@ -110,5 +110,22 @@ export async function DELETE(
     return NextResponse.json({ error: 'Failed to delete item' }, { status: 500 })
   }
 
+  // コーデ改善APIに保存された埋め込みも削除（失敗しても次回アップロード時に整理される）
+  const improvementApiBaseUrl = process.env.OUTFIT_COMPATIBILITY_API_URL
+  if (improvementApiBaseUrl) {
+    const trimmedBaseUrl = improvementApiBaseUrl.replace(/\/+$/, '') || improvementApiBaseUrl
+    try {
+      const closetResponse = await fetch(
+        `${trimmedBaseUrl}/users/${encodeURIComponent(user.id)}/closet/items/${encodeURIComponent(params.id)}`,
+        { method: 'DELETE' }
+      )
+      if (!closetResponse.ok && closetResponse.status !== 404) {
+        console.error('Failed to delete stored closet item:', await closetResponse.text())
+      }
+    } catch (closetError) {
+      console.error('Failed to call outfit compatibility service:', closetError)
+    }
+  }
+
   return NextResponse.json({ success: true })
 }
\ No newline at end of file
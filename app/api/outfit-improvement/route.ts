@@ -7,7 +7,7 @@ type ItemRow = {
   id: string
   category: Database['public']['Enums']['item_category']
   image_path: string | null
-  embedding: number[] | null
+  hasEmbedding: boolean
 }
 
 type SuggestionItem = {
@@ -78,11 +78,6 @@ const normalizeEmbedding = (embedding: unknown): number[] | null => {
   return null
 }
 
-const isValidEmbedding = (embedding: unknown): embedding is number[] => {
-  const normalized = normalizeEmbedding(embedding)
-  return Array.isArray(normalized) && normalized.length > 0
-}
-
 const isImprovementServiceResponse = (data: unknown): data is ImprovementServiceResponse => {
   if (!data || typeof data !== 'object') {
     return false
@@ -149,13 +144,23 @@ export async function POST(request: Request) {
       return NextResponse.json({ success: false, error: 'selectedItemIds must be a non-empty array of strings' }, { status: 400 })
     }
 
-    const { data: allItems, error } = await supabase
-      .from('items')
-      .select('id, category, image_path, embedding')
-      .eq('user_id', user.id)
-
-    if (error) {
-      console.error('Failed to fetch items:', error)
+    // Embeddings live in the compatibility service, so only ids and
+    // categories are read here; vectors are fetched only for items the
+    // service reports as missing.
+    const [{ data: allItems, error }, { data: itemsWithoutEmbedding, error: embeddingError }] = await Promise.all([
+      supabase
+        .from('items')
+        .select('id, category, image_path')
+        .eq('user_id', user.id),
+      supabase
+        .from('items')
+        .select('id')
+        .eq('user_id', user.id)
+        .is('embedding', null),
+    ])
+
+    if (error || embeddingError) {
+      console.error('Failed to fetch items:', error ?? embeddingError)
       return NextResponse.json({ success: false, error: 'Failed to fetch items' }, { status: 500 })
     }
 
@@ -163,10 +168,11 @@ export async function POST(request: Request) {
       return NextResponse.json({ success: false, error: 'No items available for the user' }, { status: 400 })
     }
 
-    const normalizedItems = allItems.map((item) => ({
+    const withoutEmbedding = new Set((itemsWithoutEmbedding ?? []).map((item) => item.id))
+    const normalizedItems: ItemRow[] = allItems.map((item) => ({
       ...item,
-      embedding: normalizeEmbedding(item.embedding) ?? null,
-    })) satisfies ItemRow[]
+      hasEmbedding: !withoutEmbedding.has(item.id),
+    }))
 
     const itemsById = new Map(normalizedItems.map((item) => [item.id, item]))
     const selectedItems: ItemRow[] = []
@@ -179,17 +185,24 @@ export async function POST(request: Request) {
       selectedItems.push(item)
     }
 
-    const validSelectedItems = selectedItems.filter((item) => isValidEmbedding(item.embedding))
-    const ignoredSelectedItems = selectedItems.filter((item) => !isValidEmbedding(item.embedding))
+    const validSelectedItems = selectedItems.filter((item) => item.hasEmbedding)
+    const ignoredSelectedItems = selectedItems.filter((item) => !item.hasEmbedding)
     const ignoredItemIds = ignoredSelectedItems.map((item) => item.id)
 
+    const noValidSelection = () => NextResponse.json({
+      success: false,
+      error: 'No valid embeddings available in the selected items',
+      reason: 'NO_VALID_SELECTION',
+      ignoredItemIds,
+    })
+    const noReplacementCandidate = () => NextResponse.json({
+      success: false,
+      error: 'No replacement candidates found for the selected items',
+      reason: 'NO_REPLACEMENT_CANDIDATE',
+    }, { status: 400 })
+
     if (validSelectedItems.length === 0) {
-      return NextResponse.json({
-        success: false,
-        error: 'No valid embeddings available in the selected items',
-        reason: 'NO_VALID_SELECTION',
-        ignoredItemIds,
-      })
+      return noValidSelection()
     }
 
     const selectedIdSet = new Set(selectedItemIds)
@@ -200,7 +213,7 @@ export async function POST(request: Request) {
           candidate.category === item.category
           && candidate.id !== item.id
           && !selectedIdSet.has(candidate.id)
-          && isValidEmbedding(candidate.embedding)
+          && candidate.hasEmbedding
         )
 
         if (candidates.length === 0) {
@@ -215,11 +228,7 @@ export async function POST(request: Request) {
       .filter((entry): entry is { original: ItemRow; candidates: ItemRow[] } => entry !== null)
 
     if (replacementOptions.length === 0) {
-      return NextResponse.json({
-        success: false,
-        error: 'No replacement candidates found for the selected items',
-        reason: 'NO_REPLACEMENT_CANDIDATE',
-      }, { status: 400 })
+      return noReplacementCandidate()
     }
 
     const improvementApiBaseUrl = process.env.OUTFIT_COMPATIBILITY_API_URL
@@ -228,41 +237,87 @@ export async function POST(request: Request) {
       return NextResponse.json({ success: false, error: 'Outfit compatibility API is not configured' }, { status: 500 })
     }
 
-    const closetItemsPayload = new Map<string, ClosetItemPayload>()
-    const addClosetItemPayload = (item: ItemRow) => {
-      if (!isValidEmbedding(item.embedding) || closetItemsPayload.has(item.id)) {
-        return
-      }
-
-      closetItemsPayload.set(item.id, {
-        id: item.id,
-        category: item.category,
-        embedding: item.embedding as number[],
-      })
-    }
-
-    validSelectedItems.forEach(addClosetItemPayload)
-    replacementOptions.forEach(({ candidates }) => {
-      candidates.forEach(addClosetItemPayload)
-    })
-
+    const selectedIds = validSelectedItems.map((item) => item.id)
     const requestBody = {
-      selected_item_ids: validSelectedItems.map((item) => item.id),
-      closet_items: Array.from(closetItemsPayload.values()),
+      selected_item_ids: selectedIds,
+      candidate_item_ids: Array.from(new Set(
+        replacementOptions.flatMap(({ candidates }) => candidates.map((item) => item.id))
+      )),
     }
 
     const trimmedBaseUrl = improvementApiBaseUrl.replace(/\/+$/, '')
-    const targetUrl = `${trimmedBaseUrl || improvementApiBaseUrl}/suggest-improvement`
+    const userUrl = `${trimmedBaseUrl || improvementApiBaseUrl}/users/${encodeURIComponent(user.id)}`
+
+    const requestSuggestion = () => fetch(`${userUrl}/suggest-improvement`, {
+      method: 'POST',
+      headers: {
+        'Content-Type': 'application/json',
+      },
+      body: JSON.stringify(requestBody),
+    })
 
     let improvementResponse: Response
     try {
-      improvementResponse = await fetch(targetUrl, {
-        method: 'POST',
-        headers: {
-          'Content-Type': 'application/json',
-        },
-        body: JSON.stringify(requestBody),
-      })
+      improvementResponse = await requestSuggestion()
+
+      if (improvementResponse.status === 409) {
+        const conflict = await improvementResponse.json().catch(() => null)
+        const reportedIds: unknown = conflict?.detail?.missing_item_ids
+        const missingIds = Array.isArray(reportedIds)
+          ? reportedIds.filter((id): id is string => typeof id === 'string')
+          : [...requestBody.selected_item_ids, ...requestBody.candidate_item_ids]
+
+        const { data: missingRows, error: missingError } = await supabase
+          .from('items')
+          .select('id, category, embedding')
+          .eq('user_id', user.id)
+          .in('id', missingIds)
+
+        if (missingError) {
+          console.error('Failed to fetch item embeddings:', missingError)
+          return NextResponse.json({ success: false, error: 'Failed to fetch items' }, { status: 500 })
+        }
+
+        const items: ClosetItemPayload[] = []
+        for (const row of missingRows ?? []) {
+          const embedding = normalizeEmbedding(row.embedding)
+          if (embedding && embedding.length > 0) {
+            items.push({ id: row.id, category: row.category, embedding })
+          }
+        }
+
+        // Items whose stored embedding turned out to be unusable are left out.
+        const uploadedIds = new Set(items.map((item) => item.id))
+        const unusableIds = new Set(missingIds.filter((id) => !uploadedIds.has(id)))
+        if (unusableIds.size > 0) {
+          ignoredItemIds.push(...requestBody.selected_item_ids.filter((id) => unusableIds.has(id)))
+          requestBody.selected_item_ids = requestBody.selected_item_ids.filter((id) => !unusableIds.has(id))
+          requestBody.candidate_item_ids = requestBody.candidate_item_ids.filter((id) => !unusableIds.has(id))
+          if (requestBody.selected_item_ids.length === 0) {
+            return noValidSelection()
+          }
+          if (requestBody.candidate_item_ids.length === 0) {
+            return noReplacementCandidate()
+          }
+        }
+
+        if (items.length > 0) {
+          const uploadResponse = await fetch(`${userUrl}/closet/items`, {
+            method: 'PUT',
+            headers: {
+              'Content-Type': 'application/json',
+            },
+            // Also prunes stored items the user has deleted since the last upload.
+            body: JSON.stringify({ items, retain_item_ids: normalizedItems.map((item) => item.id) }),
+          })
+          if (!uploadResponse.ok) {
+            console.error('Failed to store closet items:', await uploadResponse.text())
+            return NextResponse.json({ success: false, error: 'Outfit compatibility service returned an error' }, { status: 502 })
+          }
+        }
+
+        improvementResponse = await requestSuggestion()
+      }
     } catch (fetchError) {
       console.error('Failed to call outfit compatibility service:', fetchError)
       return NextResponse.json({ success: false, error: 'Failed to call outfit compatibility service' }, { status: 502 })
@@ -0,0 +1,136 @@
+import math
+import re
+from dataclasses import dataclass, field, replace
+from typing import List, Optional, Sequence
+
+from vecs import IndexArgsHNSW, IndexArgsIVFFlat, IndexMeasure, IndexMethod
+
+# pgvector operator class for IndexMeasure.max_inner_product (`<#>`), which is
+# what search_items_by_vector orders by.
+IP_OPS = "vector_ip_ops"
+
+_CATEGORY_RE = re.compile(r"^[a-z][a-z0-9_]*$")
+
+
+@dataclass
+class IndexConfig:
+    """How the collection's vector index is built after seeding.
+
+    ``method`` is ``auto``, ``hnsw`` or ``ivfflat``; unset parameters keep
+    pgvector's / vecs' defaults. ``partial_categories`` additionally builds
+    one partial index per category (``WHERE metadata->>'category' = ...``)
+    so category-filtered searches walk a graph that only holds that
+    category instead of post-filtering the global index's candidates.
+    ``ivf_lists`` only applies to the global index; IVFFlat partial indexes
+    size their lists from the category's row count (see ``ivf_lists_for``).
+    """
+
+    method: str = "auto"
+    hnsw_m: Optional[int] = None
+    hnsw_ef_construction: Optional[int] = None
+    ivf_lists: Optional[int] = None
+    partial_categories: Sequence[str] = field(default_factory=tuple)
+
+    def index_method(self) -> IndexMethod:
+        return IndexMethod(self.method)
+
+    def index_arguments(self):
+        if self.method == "hnsw" and (self.hnsw_m or self.hnsw_ef_construction):
+            arguments = IndexArgsHNSW()
+            if self.hnsw_m:
+                arguments.m = self.hnsw_m
+            if self.hnsw_ef_construction:
+                arguments.ef_construction = self.hnsw_ef_construction
+            return arguments
+        if self.method == "ivfflat" and self.ivf_lists:
+            return IndexArgsIVFFlat(n_lists=self.ivf_lists)
+        if self.method == "auto" and (self.hnsw_m or self.hnsw_ef_construction or self.ivf_lists):
+            raise ValueError("Index parameters require an explicit index method (hnsw or ivfflat).")
+        return None
+
+
+def _partial_prefix(table_name: str) -> str:
+    # Must not start with "ix_vector": vecs treats any such index on the table
+    # as *the* collection index and would drop it on the next create_index.
+    return f"ixp_{table_name}_"
+
+
+def partial_index_names(vx, table_name: str) -> List[str]:
+    from sqlalchemy import text
+
+    query = text(
+        "select indexname from pg_indexes where schemaname = 'vecs' and tablename = :table and indexname like :prefix"
+    )
+    prefix = _partial_prefix(table_name).replace("_", r"\_") + "%"
+    with vx.Session() as session:
+        return [row[0] for row in session.execute(query, {"table": table_name, "prefix": prefix})]
+
+
+def index_access_method(vx, index_name: str) -> str:
+    """Access method (``hnsw``/``ivfflat``) of an existing index in the vecs schema."""
+    from sqlalchemy import text
+
+    query = text("select indexdef from pg_indexes where schemaname = 'vecs' and indexname = :name")
+    with vx.Session() as session:
+        indexdef = session.execute(query, {"name": index_name}).scalar_one()
+    match = re.search(r"\busing\s+(\w+)", indexdef, re.IGNORECASE)
+    if match is None:
+        raise RuntimeError(f"Cannot determine the access method of index {index_name}: {indexdef}")
+    return match.group(1).lower()
+
+
+def ivf_lists_for(rows: int) -> int:
+    """pgvector's suggested IVFFlat list count for a table of ``rows`` rows."""
+    if rows > 1_000_000:
+        return int(math.sqrt(rows))
+    return max(1, rows // 1000)
+
+
+def _partial_index_sql(table_name: str, category: str, config: IndexConfig, rows: int) -> str:
+    name = f"{_partial_prefix(table_name)}{category}"
+    predicate = f"(metadata->>'category') = '{category}'"
+    if config.method not in ("hnsw", "ivfflat"):
+        raise ValueError(f"Partial indexes need a resolved index method, got {config.method!r}.")
+    if config.method == "ivfflat":
+        lists = ivf_lists_for(rows)
+        using = f"using ivfflat (vec {IP_OPS}) with (lists = {lists})"
+    else:
+        m = config.hnsw_m or IndexArgsHNSW.m
+        ef_construction = config.hnsw_ef_construction or IndexArgsHNSW.ef_construction
+        using = f"using hnsw (vec {IP_OPS}) with (m = {m}, ef_construction = {ef_construction})"
+    return f'create index "{name}" on vecs."{table_name}" {using} where {predicate}'
+
+
+def build_index(vx, collection, config: IndexConfig) -> None:
+    """(Re)build the collection index and any per-category partial indexes."""
+    collection.create_index(
+        measure=IndexMeasure.max_inner_product,
+        method=config.index_method(),
+        index_arguments=config.index_arguments(),
+    )
+    if config.method == "auto":
+        # Build the partial indexes with whatever vecs picked for the main one.
+        config = replace(config, method=index_access_method(vx, collection.index))
+    print(f"Created {config.method} index {collection.index}")
+
+    from sqlalchemy import text
+
+    table_name = collection.table.name
+    categories = sorted(set(config.partial_categories))
+    for category in categories:
+        if not _CATEGORY_RE.match(category):
+            raise ValueError(f"Unsupported category name for a partial index: {category!r}")
+
+    with vx.Session() as session:
+        with session.begin():
+            rows = {}
+            if categories and config.method == "ivfflat":
+                rows = dict(session.execute(text(
+                    f"select metadata->>'category', count(*) from vecs.\"{table_name}\" group by 1"
+                )).all())
+            for name in partial_index_names(vx, table_name):
+                session.execute(text(f'drop index if exists vecs."{name}"'))
+            for category in categories:
+                session.execute(text(_partial_index_sql(table_name, category, config, rows.get(category, 0))))
+    if categories:
+        print(f"Created partial indexes for categories: {', '.join(categories)}")
@@ -0,0 +1,175 @@
+import os
+from pathlib import Path
+from typing import List, Optional
+
+import numpy as np
+import torch
+
+BACKENDS = ("torch", "onnx", "onnx-int8")
+ONNX_OPSET = 17
+TEXT_MAX_LENGTH = 77
+
+
+def _ensure_onnxruntime():  # pragma: no cover - optional dependency
+    try:
+        import onnxruntime  # type: ignore
+    except ImportError as exc:
+        raise RuntimeError(
+            "onnxruntime is required for the ONNX backends. Install it or set CLIP_BACKEND=torch."
+        ) from exc
+    return onnxruntime
+
+
+def tokenize(clip, texts: List[str], return_tensors: str = "np"):
+    return clip.preprocess(
+        text=texts,
+        return_tensors=return_tensors,
+        padding=True,
+        truncation=True,
+        max_length=TEXT_MAX_LENGTH,
+    )
+
+
+class TorchBackend:
+    """Runs the FashionCLIP text and vision towers with the fp32 PyTorch graph."""
+
+    name = "torch"
+
+    def __init__(self, clip):
+        self.clip = clip
+
+    def encode_texts(self, texts: List[str]) -> np.ndarray:
+        inputs = tokenize(self.clip, texts, return_tensors="pt")
+        with torch.no_grad():
+            features = self.clip.model.get_text_features(
+                input_ids=inputs["input_ids"].to(self.clip.device),
+                attention_mask=inputs["attention_mask"].to(self.clip.device),
+            )
+        return features.detach().cpu().numpy()
+
+    def encode_pixels(self, pixel_values: np.ndarray) -> np.ndarray:
+        with torch.no_grad():
+            features = self.clip.model.get_image_features(
+                pixel_values=torch.from_numpy(pixel_values).to(self.clip.device)
+            )
+        return features.detach().cpu().numpy()
+
+
+class _TextTower(torch.nn.Module):
+    def __init__(self, clip_model):
+        super().__init__()
+        self.clip_model = clip_model
+
+    def forward(self, input_ids, attention_mask):
+        return self.clip_model.get_text_features(input_ids=input_ids, attention_mask=attention_mask)
+
+
+class _VisionTower(torch.nn.Module):
+    def __init__(self, clip_model):
+        super().__init__()
+        self.clip_model = clip_model
+
+    def forward(self, pixel_values):
+        return self.clip_model.get_image_features(pixel_values=pixel_values)
+
+
+def export_onnx(clip, out_dir: Path) -> None:
+    """Export both towers to ``out_dir/{text,vision}.onnx`` with dynamic batch axes."""
+    out_dir.mkdir(parents=True, exist_ok=True)
+    clip_model = clip.model.to("cpu").eval()
+    dummy_text = tokenize(clip, ["a photo of a shirt"], return_tensors="pt")
+    image_size = clip_model.config.vision_config.image_size
+    dummy_pixels = torch.zeros(1, 3, image_size, image_size)
+
+    with torch.no_grad():
+        torch.onnx.export(
+            _TextTower(clip_model),
+            (dummy_text["input_ids"], dummy_text["attention_mask"]),
+            str(out_dir / "text.onnx"),
+            input_names=["input_ids", "attention_mask"],
+            output_names=["embeddings"],
+            dynamic_axes={
+                "input_ids": {0: "batch", 1: "sequence"},
+                "attention_mask": {0: "batch", 1: "sequence"},
+                "embeddings": {0: "batch"},
+            },
+            opset_version=ONNX_OPSET,
+        )
+        torch.onnx.export(
+            _VisionTower(clip_model),
+            (dummy_pixels,),
+            str(out_dir / "vision.onnx"),
+            input_names=["pixel_values"],
+            output_names=["embeddings"],
+            dynamic_axes={"pixel_values": {0: "batch"}, "embeddings": {0: "batch"}},
+            opset_version=ONNX_OPSET,
+        )
+    clip.model.to(clip.device)
+
+
+def quantize_onnx(out_dir: Path) -> None:
+    """Write dynamically int8-quantized copies of the exported towers."""
+    _ensure_onnxruntime()
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    for tower in ("text", "vision"):
+        quantize_dynamic(
+            str(out_dir / f"{tower}.onnx"),
+            str(out_dir / f"{tower}.int8.onnx"),
+            weight_type=QuantType.QInt8,
+        )
+
+
+class OnnxBackend:
+    """Runs exported FashionCLIP towers with ONNX Runtime on CPU.
+
+    Missing exports under ``onnx_dir`` are created on first use, so the
+    first start with a new model is slow; bake them into the image to avoid it.
+    """
+
+    def __init__(self, clip, onnx_dir: Path, quantized: bool = False, intra_op_threads: Optional[int] = None):
+        ort = _ensure_onnxruntime()
+        self.clip = clip
+        self.name = "onnx-int8" if quantized else "onnx"
+        suffix = ".int8.onnx" if quantized else ".onnx"
+        text_path = onnx_dir / f"text{suffix}"
+        vision_path = onnx_dir / f"vision{suffix}"
+
+        if not (onnx_dir / "text.onnx").is_file() or not (onnx_dir / "vision.onnx").is_file():
+            export_onnx(clip, onnx_dir)
+        if quantized and (not text_path.is_file() or not vision_path.is_file()):
+            quantize_onnx(onnx_dir)
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if intra_op_threads:
+            options.intra_op_num_threads = intra_op_threads
+        providers = ["CPUExecutionProvider"]
+        self.text_session = ort.InferenceSession(str(text_path), options, providers=providers)
+        self.vision_session = ort.InferenceSession(str(vision_path), options, providers=providers)
+
+    def encode_texts(self, texts: List[str]) -> np.ndarray:
+        inputs = tokenize(self.clip, texts)
+        (features,) = self.text_session.run(
+            None,
+            {
+                "input_ids": inputs["input_ids"].astype(np.int64),
+                "attention_mask": inputs["attention_mask"].astype(np.int64),
+            },
+        )
+        return features
+
+    def encode_pixels(self, pixel_values: np.ndarray) -> np.ndarray:
+        (features,) = self.vision_session.run(
+            None, {"pixel_values": pixel_values.astype(np.float32, copy=False)}
+        )
+        return features
+
+
+def load_backend(name: str, clip, onnx_dir: Optional[str] = None, intra_op_threads: Optional[int] = None):
+    if name == "torch":
+        return TorchBackend(clip)
+    if name in ("onnx", "onnx-int8"):
+        directory = Path(onnx_dir or os.path.join(os.path.dirname(__file__), "onnx"))
+        return OnnxBackend(clip, directory, quantized=name == "onnx-int8", intra_op_threads=intra_op_threads)
+    raise ValueError(f"Unsupported CLIP backend: {name}. Choose one of {', '.join(BACKENDS)}.")
@@ -0,0 +1,219 @@
+import asyncio
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Generic, List, Optional, Sequence, Set, Tuple, TypeVar
+
+import numpy as np
+
+from executor import InferenceExecutor, QueueFullError
+
+T = TypeVar("T")
+
+
+class BatcherStats:
+    """Rolling counters describing how a MicroBatcher is grouping requests."""
+
+    def __init__(self, window: int = 1024):
+        self.requests_total = 0
+        self.batches_total = 0
+        self.failures_total = 0
+        self.rejected_total = 0
+        self.batch_sizes: Deque[int] = deque(maxlen=window)
+        self.wait_ms: Deque[float] = deque(maxlen=window)
+        self.compute_ms: Deque[float] = deque(maxlen=window)
+
+    def record_batch(self, size: int, waits_ms: Sequence[float], compute_ms: float) -> None:
+        self.batches_total += 1
+        self.requests_total += size
+        self.batch_sizes.append(size)
+        self.wait_ms.extend(waits_ms)
+        self.compute_ms.append(compute_ms)
+
+    @staticmethod
+    def _percentile(values: Sequence[float], q: float) -> float:
+        if not values:
+            return 0.0
+        return float(np.percentile(np.asarray(values, dtype=np.float64), q))
+
+    def snapshot(self) -> Dict[str, float]:
+        return {
+            "requests_total": self.requests_total,
+            "batches_total": self.batches_total,
+            "failures_total": self.failures_total,
+            "rejected_total": self.rejected_total,
+            "batch_size_avg": float(np.mean(self.batch_sizes)) if self.batch_sizes else 0.0,
+            "batch_size_max": max(self.batch_sizes, default=0),
+            "wait_ms_p50": self._percentile(self.wait_ms, 50),
+            "wait_ms_p99": self._percentile(self.wait_ms, 99),
+            "compute_ms_p50": self._percentile(self.compute_ms, 50),
+            "compute_ms_p99": self._percentile(self.compute_ms, 99),
+        }
+
+
+class MicroBatcher(Generic[T]):
+    """Collects concurrent single-item requests and encodes them as one batch.
+
+    ``encode_fn`` receives a list of inputs and must return an array whose
+    rows line up with those inputs. A batch is flushed as soon as it holds
+    ``max_batch_size`` items or the oldest item has waited ``max_wait_ms``.
+    When an ``executor`` is given the encode call runs there instead of on
+    the event loop, with up to one batch per executor worker in flight while
+    the next one is being collected, and ``submit`` raises
+    ``QueueFullError`` once ``max_queue_size`` requests are already waiting.
+    """
+
+    def __init__(
+        self,
+        encode_fn: Callable[[List[T]], np.ndarray],
+        max_batch_size: int = 32,
+        max_wait_ms: float = 5.0,
+        max_queue_size: Optional[int] = None,
+        executor: Optional[InferenceExecutor] = None,
+    ):
+        if max_batch_size < 1:
+            raise ValueError("max_batch_size must be >= 1.")
+        if max_wait_ms < 0:
+            raise ValueError("max_wait_ms must be >= 0.")
+        self.encode_fn = encode_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self.max_queue_size = max_queue_size
+        self.executor = executor
+        self.stats = BatcherStats()
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self.max_inflight = executor.max_workers if executor is not None else 1
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._batches: Set[asyncio.Task] = set()
+
+    @property
+    def queue_depth(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def _ensure_worker(self) -> asyncio.Queue:
+        if self._worker is None or self._worker.done():
+            self._queue = asyncio.Queue()
+            self._slots = asyncio.Semaphore(self.max_inflight)
+            self._worker = asyncio.get_running_loop().create_task(self._run())
+        return self._queue
+
+    async def submit(self, item: T) -> np.ndarray:
+        queue = self._ensure_worker()
+        if self.max_queue_size is not None and queue.qsize() >= self.max_queue_size:
+            self.stats.rejected_total += 1
+            raise QueueFullError("Batching queue is full.")
+        future = asyncio.get_running_loop().create_future()
+        await queue.put((item, future, time.perf_counter()))
+        return await future
+
+    async def close(self) -> None:
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+        for task in list(self._batches):
+            task.cancel()
+        await asyncio.gather(*self._batches, return_exceptions=True)
+
+    async def _collect(self) -> List[Tuple[T, asyncio.Future, float]]:
+        assert self._queue is not None
+        batch = [await self._queue.get()]
+        deadline = batch[0][2] + self.max_wait_ms / 1000.0
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                # Drain whatever is already queued without waiting any longer.
+                while len(batch) < self.max_batch_size and not self._queue.empty():
+                    batch.append(self._queue.get_nowait())
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout=remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self) -> None:
+        assert self._slots is not None
+        while True:
+            # Wait for a free executor slot first, so requests keep
+            # accumulating into the next batch while all workers are busy.
+            await self._slots.acquire()
+            try:
+                batch = await self._collect()
+            except BaseException:
+                self._slots.release()
+                raise
+            batch = [entry for entry in batch if not entry[1].cancelled()]
+            if not batch:
+                self._slots.release()
+                continue
+            task = asyncio.get_running_loop().create_task(self._run_batch(batch, self._slots))
+            self._batches.add(task)
+            task.add_done_callback(self._batches.discard)
+
+    async def _run_batch(self, batch: List[Tuple[T, asyncio.Future, float]], slots: asyncio.Semaphore) -> None:
+        try:
+            await self._process(batch)
+        except asyncio.CancelledError:
+            for _, future, _ in batch:
+                self._resolve(future, exc=RuntimeError("Batcher is shutting down."))
+            raise
+        finally:
+            slots.release()
+
+    async def _process(self, batch: List[Tuple[T, asyncio.Future, float]]) -> None:
+        started = time.perf_counter()
+        waits_ms = [(started - enqueued) * 1000.0 for _, _, enqueued in batch]
+        items = [item for item, _, _ in batch]
+
+        try:
+            rows = await self._encode(items)
+        except QueueFullError as exc:
+            self.stats.rejected_total += len(batch)
+            for _, future, _ in batch:
+                self._resolve(future, exc=exc)
+            return
+        except Exception as exc:
+            if len(batch) == 1:
+                self.stats.failures_total += 1
+                self._resolve(batch[0][1], exc=exc)
+                return
+            # One bad input must not fail its neighbours: retry each half, so
+            # it costs about 2 * log2(len(batch)) extra passes, not one per item.
+            middle = len(batch) // 2
+            await self._process(batch[:middle])
+            await self._process(batch[middle:])
+            return
+
+        compute_ms = (time.perf_counter() - started) * 1000.0
+        self.stats.record_batch(len(batch), waits_ms, compute_ms)
+        for (_, future, _), row in zip(batch, rows):
+            self._resolve(future, result=row)
+
+    async def _encode(self, items: List[T]) -> np.ndarray:
+        if self.executor is None:
+            return self.encode_fn(items)
+        return await self.executor.run(self.encode_fn, items)
+
+    @staticmethod
+    def _resolve(future: asyncio.Future, result: Any = None, exc: Optional[BaseException] = None) -> None:
+        if future.done():
+            return
+        if exc is not None:
+            future.set_exception(exc)
+        else:
+            future.set_result(result)
+
+    def metrics(self) -> Dict[str, float]:
+        return {
+            "queue_depth": self.queue_depth,
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait_ms,
+            "max_queue_size": self.max_queue_size or 0,
+            "max_inflight": self.max_inflight,
+            "inflight_batches": len(self._batches),
+            **self.stats.snapshot(),
+        }
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""Measure memory per worker and throughput of serve.py as workers are added.
+
+For each worker count this starts ``serve.py``, waits until every worker is
+ready, reads RSS/PSS of the parent and workers from /proc (Linux only), then
+drives /vectorize with unique texts (so the embedding cache never hits):
+
+    python bench_prefork.py --workers 1 2 4 --duration 20 --concurrency 16
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List
+from urllib import error, request
+
+HERE = Path(__file__).resolve().parent
+
+
+def _smaps_rollup(pid: int) -> Dict[str, int]:
+    values = {}
+    with open(f"/proc/{pid}/smaps_rollup") as fh:
+        for line in fh:
+            parts = line.split()
+            if len(parts) >= 3 and parts[2] == "kB":
+                values[parts[0].rstrip(":")] = int(parts[1])
+    return values
+
+
+def _children(pid: int) -> List[int]:
+    children = []
+    for task in Path(f"/proc/{pid}/task").iterdir():
+        content = (task / "children").read_text().split()
+        children.extend(int(child) for child in content)
+    return children
+
+
+def _post(url: str, payload: dict, timeout: float = 60.0) -> int:
+    data = json.dumps(payload).encode("utf-8")
+    req = request.Request(url, data=data, headers={"Content-Type": "application/json"})
+    try:
+        with request.urlopen(req, timeout=timeout) as resp:
+            resp.read()
+            return resp.status
+    except error.HTTPError as exc:
+        return exc.code
+
+
+def _wait_ready(base_url: str, workers: int, timeout: float) -> None:
+    # Each probe lands on an arbitrary worker; require a run of successes
+    # long enough that every worker has very likely answered ready.
+    deadline = time.monotonic() + timeout
+    streak = 0
+    while time.monotonic() < deadline:
+        try:
+            with request.urlopen(f"{base_url}/readyz", timeout=5) as resp:
+                streak = streak + 1 if resp.status == 200 else 0
+        except (error.URLError, ConnectionError):
+            streak = 0
+        if streak >= workers * 4:
+            return
+        time.sleep(0.25)
+    raise RuntimeError("Server did not become ready in time.")
+
+
+def _drive(base_url: str, duration: float, concurrency: int) -> Dict[str, float]:
+    counter = [0, 0]
+    lock = threading.Lock()
+    stop_at = time.monotonic() + duration
+
+    def _loop(worker_index: int) -> None:
+        sequence = 0
+        while time.monotonic() < stop_at:
+            status = _post(
+                f"{base_url}/vectorize",
+                {"text": f"benchmark item {worker_index} {sequence} {time.time_ns()}"},
+            )
+            sequence += 1
+            with lock:
+                counter[0 if status == 200 else 1] += 1
+
+    threads = [threading.Thread(target=_loop, args=(index,)) for index in range(concurrency)]
+    started = time.monotonic()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.monotonic() - started
+    return {"ok": counter[0], "errors": counter[1], "rps": counter[0] / elapsed}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--duration", type=float, default=20.0)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--startup-timeout", type=float, default=600.0)
+    args = parser.parse_args()
+
+    base_url = f"http://127.0.0.1:{args.port}"
+    env = {**os.environ, "CLIP_INFERENCE_WORKERS": "1"}
+
+    print(f"{'workers':>7} {'parent_rss_mb':>13} {'worker_rss_mb':>13} {'worker_pss_mb':>13} {'total_pss_mb':>12} {'rps':>8} {'errors':>6}")
+    for workers in args.workers:
+        server = subprocess.Popen(
+            [sys.executable, "serve.py", "--workers", str(workers), "--port", str(args.port), "--log-level", "warning"],
+            cwd=HERE,
+            env=env,
+        )
+        try:
+            _wait_ready(base_url, workers, args.startup_timeout)
+            result = _drive(base_url, args.duration, args.concurrency)
+
+            parent = _smaps_rollup(server.pid)
+            children = [_smaps_rollup(pid) for pid in _children(server.pid)]
+            worker_rss = sum(child["Rss"] for child in children) / max(len(children), 1) / 1024
+            worker_pss = sum(child["Pss"] for child in children) / max(len(children), 1) / 1024
+            total_pss = (parent["Pss"] + sum(child["Pss"] for child in children)) / 1024
+            print(
+                f"{workers:>7} {parent['Rss'] / 1024:>13.1f} {worker_rss:>13.1f} {worker_pss:>13.1f} "
+                f"{total_pss:>12.1f} {result['rps']:>8.1f} {result['errors']:>6}"
+            )
+        finally:
+            server.terminate()
+            server.wait(timeout=30)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""Compare ONNX / int8 FashionCLIP backends against the fp32 PyTorch embeddings.
+
+Reports cosine similarity to the torch embeddings and encode latency for
+each backend on a sample of texts and images:
+
+    python compare_backends.py --images ../dataset/images --limit 64
+"""
+import argparse
+import time
+from pathlib import Path
+from typing import Callable, List, Tuple
+
+import numpy as np
+from fashion_clip.fashion_clip import FashionCLIP
+from PIL import Image
+
+from backends import BACKENDS, load_backend
+
+SAMPLE_TEXTS = [
+    "white shirt",
+    "black jeans",
+    "red summer dress",
+    "brown leather belt",
+    "navy blue blazer",
+    "running shoes",
+    "denim jacket",
+    "striped t-shirt",
+    "silver watch",
+    "wool scarf",
+    "canvas sneakers",
+    "floral skirt",
+]
+
+
+def _load_images(directory: str, limit: int) -> List[Image.Image]:
+    if directory:
+        paths = sorted(Path(directory).glob("*.jpg"))[:limit]
+        if paths:
+            return [Image.open(path).convert("RGB") for path in paths]
+    # Random noise still exercises the whole vision graph for parity checks.
+    rng = np.random.default_rng(0)
+    return [
+        Image.fromarray(rng.integers(0, 256, (256, 256, 3), dtype=np.uint8))
+        for _ in range(limit)
+    ]
+
+
+def _normalize(embeddings: np.ndarray) -> np.ndarray:
+    return embeddings / np.linalg.norm(embeddings, ord=2, axis=-1, keepdims=True)
+
+
+def _timed(fn: Callable[[], np.ndarray], repeats: int) -> Tuple[np.ndarray, float]:
+    result = fn()  # warm-up
+    started = time.perf_counter()
+    for _ in range(repeats):
+        result = fn()
+    return result, (time.perf_counter() - started) / repeats * 1000.0
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--images", default="", help="Directory of .jpg files to sample.")
+    parser.add_argument("--limit", type=int, default=32, help="Number of images to encode.")
+    parser.add_argument("--repeats", type=int, default=5, help="Timed repetitions per backend.")
+    parser.add_argument("--onnx-dir", default=None, help="Where ONNX exports are read/written.")
+    parser.add_argument("--backends", nargs="+", default=list(BACKENDS), choices=BACKENDS)
+    args = parser.parse_args()
+
+    clip = FashionCLIP("fashion-clip")
+    images = _load_images(args.images, args.limit)
+    pixels = clip.preprocess(images=images, return_tensors="np")["pixel_values"]
+
+    reference = load_backend("torch", clip)
+    ref_text = _normalize(reference.encode_texts(SAMPLE_TEXTS))
+    ref_image = _normalize(reference.encode_pixels(pixels))
+
+    print(f"{'backend':<10} {'modality':<7} {'cos_mean':>9} {'cos_min':>9} {'ms/batch':>9}")
+    for name in args.backends:
+        backend = load_backend(name, clip, onnx_dir=args.onnx_dir)
+        for modality, fn, ref in (
+            ("text", lambda: backend.encode_texts(SAMPLE_TEXTS), ref_text),
+            ("image", lambda: backend.encode_pixels(pixels), ref_image),
+        ):
+            embeddings, ms = _timed(fn, args.repeats)
+            cosine = np.sum(_normalize(embeddings) * ref, axis=-1)
+            print(
+                f"{name:<10} {modality:<7} {cosine.mean():>9.5f} {cosine.min():>9.5f} {ms:>9.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,244 @@
+import asyncio
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# Rough per-entry overhead of the key string, OrderedDict node and ndarray header.
+_ENTRY_OVERHEAD_BYTES = 200
+# SQLite's default limit on bound parameters is 999 on older builds.
+_SQL_CHUNK = 500
+
+logger = logging.getLogger("clip_api")
+
+
+def normalize_text(text: str) -> str:
+    """Canonical form used for cache keys; CLIP's tokenizer lowercases anyway."""
+    return " ".join(text.lower().split())
+
+
+class EmbeddingCache:
+    """Content-addressed embedding cache with an LRU memory tier and optional SQLite tier.
+
+    Keys are SHA-256 digests of the model id, the input kind and the input
+    payload (normalized text or raw image bytes), so identical inputs share
+    one entry and a model change never serves stale vectors; text keys also
+    cover the prompt templates texts are embedded with. The memory tier
+    evicts least-recently-used entries once ``max_bytes`` is exceeded.
+
+    The SQLite tier at ``disk_path`` persists entries across restarts and is
+    only touched from one background thread: lookups that miss memory are
+    batched into one query per call and awaited, writes are queued without
+    waiting. Once it holds more than ``max_disk_rows`` rows, the least
+    recently used tenth is deleted.
+    """
+
+    def __init__(
+        self,
+        model_id: str,
+        max_bytes: int = 64 * 1024 * 1024,
+        disk_path: Optional[str] = None,
+        max_disk_rows: int = 500_000,
+        text_templates: Sequence[str] = ("{}",),
+    ):
+        self.model_id = model_id
+        # Plain "text" for the default template keeps existing keys valid.
+        templates = list(text_templates)
+        self._text_kind = "text" if templates == ["{}"] else "text:" + "\0".join(templates)
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.disk_path = disk_path
+        self.max_disk_rows = max_disk_rows
+        self.disk_evictions = 0
+        self.disk_errors = 0
+        self._disk_rows = 0  # estimate; recounted before evicting
+        self._db: Optional[sqlite3.Connection] = None
+        self._disk_executor: Optional[ThreadPoolExecutor] = None
+        self._disk_pid: Optional[int] = None
+
+    def _executor(self) -> ThreadPoolExecutor:
+        # Neither SQLite handles nor threads survive fork(); recreate lazily in each process.
+        if self._disk_executor is None or self._disk_pid != os.getpid():
+            self._db = None
+            self._disk_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="embedding-cache")
+            self._disk_pid = os.getpid()
+        return self._disk_executor
+
+    def _connection(self) -> sqlite3.Connection:
+        # Only called on the cache's disk thread.
+        if self._db is None:
+            db = sqlite3.connect(self.disk_path, check_same_thread=False)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings "
+                "(key TEXT PRIMARY KEY, vector BLOB NOT NULL, accessed REAL NOT NULL DEFAULT 0)"
+            )
+            columns = {row[1] for row in db.execute("PRAGMA table_info(embeddings)")}
+            if "accessed" not in columns:
+                db.execute("ALTER TABLE embeddings ADD COLUMN accessed REAL NOT NULL DEFAULT 0")
+            db.execute("CREATE INDEX IF NOT EXISTS embeddings_accessed ON embeddings (accessed)")
+            db.commit()
+            self._disk_rows = db.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+            self._db = db
+        return self._db
+
+    def key(self, kind: str, payload: bytes) -> str:
+        digest = hashlib.sha256()
+        digest.update(self.model_id.encode("utf-8"))
+        digest.update(b"\0")
+        digest.update(kind.encode("utf-8"))
+        digest.update(b"\0")
+        digest.update(payload)
+        return digest.hexdigest()
+
+    def text_key(self, text: str) -> str:
+        return self.key(self._text_kind, normalize_text(text).encode("utf-8"))
+
+    def image_key(self, image_bytes: bytes) -> str:
+        return self.key("image", image_bytes)
+
+    async def get(self, key: str) -> Optional[np.ndarray]:
+        return (await self.get_many([key]))[0]
+
+    async def get_many(self, keys: Sequence[str]) -> List[Optional[np.ndarray]]:
+        """Look up ``keys``; memory misses go to disk in one batched query."""
+        with self._lock:
+            vectors: List[Optional[np.ndarray]] = []
+            for key in keys:
+                vector = self._entries.get(key)
+                if vector is not None:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                vectors.append(vector)
+        missing = [index for index, vector in enumerate(vectors) if vector is None]
+
+        if missing and self.disk_path is not None:
+            loop = asyncio.get_running_loop()
+            try:
+                found = await loop.run_in_executor(
+                    self._executor(), self._disk_get, [keys[index] for index in missing]
+                )
+            except sqlite3.Error:
+                logger.exception("Embedding cache disk lookup failed")
+                self.disk_errors += 1
+                found = {}
+            with self._lock:
+                for index in missing:
+                    vector = found.get(keys[index])
+                    if vector is not None:
+                        self._insert(keys[index], vector)
+                        self.disk_hits += 1
+                        vectors[index] = vector
+
+        self.misses += sum(1 for vector in vectors if vector is None)
+        return vectors
+
+    def put(self, key: str, vector: np.ndarray) -> None:
+        self.put_many([(key, vector)])
+
+    def put_many(self, items: Iterable[Tuple[str, np.ndarray]]) -> None:
+        """Store entries in memory now and queue one disk write for all of them."""
+        rows = []
+        with self._lock:
+            for key, vector in items:
+                vector = np.array(vector, dtype=np.float32, copy=True)
+                vector.flags.writeable = False
+                self._insert(key, vector)
+                rows.append((key, vector))
+        if rows and self.disk_path is not None:
+            self._executor().submit(self._disk_put, rows).add_done_callback(self._log_disk_error)
+
+    def _log_disk_error(self, future: Future) -> None:
+        exc = future.exception()
+        if exc is not None:
+            self.disk_errors += 1
+            logger.error("Embedding cache disk write failed", exc_info=exc)
+
+    def _disk_get(self, keys: List[str]) -> Dict[str, np.ndarray]:
+        db = self._connection()
+        found: Dict[str, np.ndarray] = {}
+        for start in range(0, len(keys), _SQL_CHUNK):
+            chunk = keys[start:start + _SQL_CHUNK]
+            placeholders = ",".join("?" * len(chunk))
+            for key, blob in db.execute(
+                f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", chunk
+            ):
+                found[key] = np.frombuffer(blob, dtype=np.float32)
+        if found:
+            now = time.time()
+            db.executemany("UPDATE embeddings SET accessed = ? WHERE key = ?", [(now, key) for key in found])
+            db.commit()
+        return found
+
+    def _disk_put(self, rows: List[Tuple[str, np.ndarray]]) -> None:
+        db = self._connection()
+        now = time.time()
+        db.executemany(
+            "INSERT OR REPLACE INTO embeddings (key, vector, accessed) VALUES (?, ?, ?)",
+            [(key, vector.tobytes(), now) for key, vector in rows],
+        )
+        self._disk_rows += len(rows)
+        if self._disk_rows > self.max_disk_rows:
+            self._disk_rows = db.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+            excess = self._disk_rows - int(self.max_disk_rows * 0.9)
+            if self._disk_rows > self.max_disk_rows and excess > 0:
+                db.execute(
+                    "DELETE FROM embeddings WHERE key IN "
+                    "(SELECT key FROM embeddings ORDER BY accessed LIMIT ?)",
+                    (excess,),
+                )
+                self._disk_rows -= excess
+                self.disk_evictions += excess
+        db.commit()
+
+    def _insert(self, key: str, vector: np.ndarray) -> None:
+        previous = self._entries.pop(key, None)
+        if previous is not None:
+            self._bytes -= previous.nbytes + _ENTRY_OVERHEAD_BYTES
+        self._entries[key] = vector
+        self._bytes += vector.nbytes + _ENTRY_OVERHEAD_BYTES
+        while self._bytes > self.max_bytes and self._entries:
+            _, evicted = self._entries.popitem(last=False)
+            self._bytes -= evicted.nbytes + _ENTRY_OVERHEAD_BYTES
+            self.evictions += 1
+
+    def close(self) -> None:
+        if self._disk_executor is not None and self._disk_pid == os.getpid():
+            # Let queued writes finish before closing the connection.
+            self._disk_executor.shutdown(wait=True)
+            self._disk_executor = None
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+    def metrics(self) -> Dict[str, float]:
+        lookups = self.hits + self.disk_hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+            "disk_enabled": self.disk_path is not None,
+            "disk_rows": self._disk_rows,
+            "max_disk_rows": self.max_disk_rows,
+            "disk_evictions": self.disk_evictions,
+            "disk_errors": self.disk_errors,
+        }
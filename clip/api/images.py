@@ -0,0 +1,29 @@
+from io import BytesIO
+from typing import Optional
+
+from PIL import Image, UnidentifiedImageError
+
+
+class InvalidImageError(ValueError):
+    """Raised when uploaded bytes cannot be decoded as an image.
+
+    ``index`` is the position of the offending image in a batch, when known.
+    """
+
+    index: Optional[int] = None
+
+
+def decode_image(data: bytes, draft_size: Optional[int] = None) -> Image.Image:
+    """Decode image bytes in memory into an RGB PIL image.
+
+    For JPEGs, ``draft_size`` lets libjpeg decode at a reduced scale (a power
+    of two no smaller than the requested size), which skips most of the IDCT
+    work for large photos that CLIP downsizes to 224px anyway.
+    """
+    try:
+        image = Image.open(BytesIO(data))
+        if draft_size and image.format == "JPEG":
+            image.draft("RGB", (draft_size, draft_size))
+        return image.convert("RGB")
+    except (UnidentifiedImageError, OSError, Image.DecompressionBombError) as exc:
+        raise InvalidImageError("Uploaded data is not a decodable image.") from exc
@@ -0,0 +1,35 @@
+import logging
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional
+
+
+class Lifecycle:
+    """Tracks model loading / warm-up progress for the liveness and readiness probes."""
+
+    def __init__(self, logger: logging.Logger):
+        self.logger = logger
+        self.ready = False
+        self.error: Optional[str] = None
+        self.timings_ms: Dict[str, float] = {}
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed_ms = (time.perf_counter() - started) * 1000.0
+            self.timings_ms[name] = elapsed_ms
+            self.logger.info("Startup phase %s took %.1f ms", name, elapsed_ms)
+
+    def fail(self, exc: BaseException) -> None:
+        self.error = f"{type(exc).__name__}: {exc}"
+        self.logger.exception("Startup failed")
+
+    def status(self) -> Dict[str, object]:
+        return {
+            "ready": self.ready,
+            "error": self.error,
+            "timings_ms": self.timings_ms,
+        }
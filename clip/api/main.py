@@ -1,48 +1,455 @@
-from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel
+from fastapi import Depends, FastAPI, File, HTTPException, Request, Response, UploadFile
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel, Field
 from fashion_clip.fashion_clip import FashionCLIP
 import numpy as np
-from typing import List
+from PIL import Image
+from typing import Callable, List, Optional
+import asyncio
 import base64
 import binascii
-from tempfile import NamedTemporaryFile
+import logging
+import os
+from contextlib import asynccontextmanager
 
-app = FastAPI()
-model = FashionCLIP('fashion-clip')
+from backends import load_backend
+from batching import MicroBatcher
+from embedding_cache import EmbeddingCache
+from executor import InferenceExecutor, QueueFullError
+from images import InvalidImageError, decode_image
+from lifecycle import Lifecycle
+from projection import Projection
+from singleflight import SingleFlight
+from vocabulary import VocabularyTable, encode_with_templates, load_terms
+import vector_codec
+from vector_codec import OCTET_STREAM, VectorDtype, VectorEncoding
+
+MAX_BATCH_SIZE = int(os.environ.get("CLIP_MAX_BATCH_SIZE", "32"))
+MAX_WAIT_MS = float(os.environ.get("CLIP_MAX_WAIT_MS", "5"))
+MAX_QUEUE_SIZE = int(os.environ.get("CLIP_MAX_QUEUE_SIZE", "256"))
+INFERENCE_WORKERS = int(os.environ.get("CLIP_INFERENCE_WORKERS", "1"))
+MAX_PENDING = int(os.environ.get("CLIP_MAX_PENDING", "64"))
+TORCH_THREADS = int(os.environ.get("CLIP_TORCH_THREADS", "0")) or None
+MAX_REQUEST_ITEMS = int(os.environ.get("CLIP_MAX_REQUEST_ITEMS", "1024"))
+IMAGE_DRAFT_SIZE = int(os.environ.get("CLIP_IMAGE_DRAFT_SIZE", "448")) or None
+MODEL_ID = os.environ.get("CLIP_MODEL_ID", "fashion-clip")
+CACHE_MAX_BYTES = int(os.environ.get("CLIP_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+CACHE_PATH = os.environ.get("CLIP_CACHE_PATH") or None
+CACHE_DISK_MAX_ROWS = int(os.environ.get("CLIP_CACHE_DISK_MAX_ROWS", "500000"))
+BACKEND = os.environ.get("CLIP_BACKEND", "torch")
+ONNX_DIR = os.environ.get("CLIP_ONNX_DIR") or None
+PROJECTION_PATH = os.environ.get("CLIP_PROJECTION_PATH") or None
+VOCAB_ENABLED = os.environ.get("CLIP_VOCAB_ENABLED", "1") != "0"
+VOCAB_PATH = os.environ.get("CLIP_VOCAB_PATH") or None
+PROMPT_TEMPLATES = [
+    template for template in os.environ.get("CLIP_PROMPT_TEMPLATES", "{}").split("|") if template
+] or ["{}"]
+WARMUP_BATCH_SIZES = [
+    int(size)
+    for size in os.environ.get("CLIP_WARMUP_BATCH_SIZES", f"1,{MAX_BATCH_SIZE}").split(",")
+    if size.strip()
+]
+
+logger = logging.getLogger("clip_api")
+
+# Loaded by the lifespan startup task; requests are refused until it finishes.
+model: Optional[FashionCLIP] = None
+backend = None
+vocabulary: Optional[VocabularyTable] = None
+lifecycle = Lifecycle(logger)
+
+embedding_cache = EmbeddingCache(
+    f"{MODEL_ID}:{BACKEND}",
+    max_bytes=CACHE_MAX_BYTES,
+    disk_path=CACHE_PATH,
+    max_disk_rows=CACHE_DISK_MAX_ROWS,
+    text_templates=PROMPT_TEMPLATES,
+)
+inflight = SingleFlight()
+projection = Projection.load(PROJECTION_PATH) if PROJECTION_PATH else None
+
+
+def _normalize(embeddings: np.ndarray) -> np.ndarray:
+    return embeddings/np.linalg.norm(embeddings, ord=2, axis=-1, keepdims=True)
+
+
+def _encode_texts(texts: List[str]) -> np.ndarray:
+    return _normalize(backend.encode_texts(texts))
+
+
+def _encode_text_queries(texts: List[str]) -> np.ndarray:
+    # Same prompt templates as the vocabulary table, so a phrase embeds the
+    # same whether or not it is in the table.
+    return encode_with_templates(texts, _encode_texts, PROMPT_TEMPLATES)
+
+
+def _encode_pil_images(images: List[Image.Image]) -> np.ndarray:
+    # Bypass FashionCLIP.encode_images, which expects file paths and builds a
+    # datasets.Dataset per call; preprocess and run the vision tower directly.
+    inputs = model.preprocess(images=images, return_tensors="np")
+    return _normalize(backend.encode_pixels(inputs["pixel_values"]))
+
+
+def _encode_image_bytes(images: List[bytes]) -> np.ndarray:
+    decoded = []
+    for position, data in enumerate(images):
+        try:
+            decoded.append(decode_image(data, IMAGE_DRAFT_SIZE))
+        except InvalidImageError as exc:
+            exc.index = position
+            raise
+    return _encode_pil_images(decoded)
+
+
+executor = InferenceExecutor(
+    max_workers=INFERENCE_WORKERS, max_pending=MAX_PENDING, intra_op_threads=TORCH_THREADS
+)
+text_batcher = MicroBatcher(
+    _encode_text_queries,
+    max_batch_size=MAX_BATCH_SIZE,
+    max_wait_ms=MAX_WAIT_MS,
+    max_queue_size=MAX_QUEUE_SIZE,
+    executor=executor,
+)
+image_batcher = MicroBatcher(
+    _encode_image_bytes,
+    max_batch_size=MAX_BATCH_SIZE,
+    max_wait_ms=MAX_WAIT_MS,
+    max_queue_size=MAX_QUEUE_SIZE,
+    executor=executor,
+)
+
+
+def _service_unavailable(exc: QueueFullError) -> HTTPException:
+    return HTTPException(status_code=503, detail=str(exc), headers={"Retry-After": "1"})
+
+
+def preload_model() -> FashionCLIP:
+    """Load FashionCLIP eagerly, e.g. in a pre-fork parent (see serve.py)."""
+    global model
+
+    if model is None:
+        with lifecycle.phase("load_model"):
+            model = FashionCLIP(MODEL_ID)
+    return model
+
+
+def _load_and_warm_up() -> None:
+    global backend, vocabulary
+
+    preload_model()
+    with lifecycle.phase("load_backend"):
+        backend = load_backend(BACKEND, model, onnx_dir=ONNX_DIR, intra_op_threads=TORCH_THREADS)
+    # Run every expected batch shape once so lazy kernel/allocator/tokenizer
+    # initialization is paid here rather than by the first real requests.
+    with lifecycle.phase("warmup_text"):
+        for size in WARMUP_BATCH_SIZES:
+            _encode_text_queries(["a photo of a white shirt"] * size)
+    with lifecycle.phase("warmup_image"):
+        blank = Image.new("RGB", (256, 256), color=(128, 128, 128))
+        for size in WARMUP_BATCH_SIZES:
+            _encode_pil_images([blank] * size)
+    if VOCAB_ENABLED:
+        with lifecycle.phase("vocabulary"):
+            vocabulary = VocabularyTable.build(
+                load_terms(VOCAB_PATH), _encode_texts, PROMPT_TEMPLATES, batch_size=MAX_BATCH_SIZE
+            )
+
+
+async def _startup() -> None:
+    try:
+        with lifecycle.phase("total"):
+            # Warm up on the inference thread itself so its torch thread
+            # settings and per-thread pools are the ones exercised.
+            await executor.run(_load_and_warm_up)
+    except Exception as exc:
+        lifecycle.fail(exc)
+        return
+    lifecycle.ready = True
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    startup_task = asyncio.create_task(_startup())
+    try:
+        yield
+    finally:
+        startup_task.cancel()
+        await text_batcher.close()
+        await image_batcher.close()
+        executor.shutdown()
+        embedding_cache.close()
+
+
+def _maybe_project(embeddings: np.ndarray, projected: bool) -> np.ndarray:
+    # The cache always holds full 512-d vectors; projection is applied per response.
+    # Projected vectors only match the ec_item_vectors_<dim> collections, searched
+    # with search_items_by_projected_vector; search_items_by_vector takes 512-d.
+    if not projected:
+        return embeddings
+    if projection is None:
+        raise HTTPException(status_code=400, detail="No projection is configured (CLIP_PROJECTION_PATH).")
+    return projection.apply(embeddings)
+
+
+def _require_ready() -> None:
+    if not lifecycle.ready:
+        raise HTTPException(status_code=503, detail="Model is not ready.", headers={"Retry-After": "5"})
+
+
+app = FastAPI(lifespan=lifespan)
 
 class TextRequest(BaseModel):
     text: str
+    projected: bool = False
+
+class ComposeRequest(BaseModel):
+    terms: List[str] = Field(..., min_items=1)
+    weights: Optional[List[float]] = None
+    projected: bool = False
 
 class VectorResponse(BaseModel):
     vector: List[float]
 
 class ImageRequest(BaseModel):
     image_base64: str
+    projected: bool = False
+
+class TextBatchRequest(BaseModel):
+    texts: List[str] = Field(..., min_items=1)
+    encoding: VectorEncoding = "json"
+    dtype: VectorDtype = "float32"
+    projected: bool = False
+
+class ImageBatchRequest(BaseModel):
+    images_base64: List[str] = Field(..., min_items=1)
+    encoding: VectorEncoding = "json"
+    dtype: VectorDtype = "float32"
+    projected: bool = False
+
+class BatchVectorResponse(BaseModel):
+    shape: List[int]
+    dtype: VectorDtype
+    encoding: VectorEncoding
+    vectors: Optional[List[List[float]]] = None
+    data: Optional[str] = Field(
+        default=None,
+        description="Base64 of the little-endian row-major matrix when encoding is 'base64'.",
+    )
+
+@app.get("/healthz")
+async def healthz():
+    return {"status": "ok"}
+
+@app.get("/readyz")
+async def readyz():
+    status_code = 200 if lifecycle.ready else 503
+    return JSONResponse(status_code=status_code, content=lifecycle.status())
+
+@app.get("/metrics")
+async def metrics():
+    return {
+        "text": text_batcher.metrics(),
+        "image": image_batcher.metrics(),
+        "executor": executor.metrics(),
+        "cache": embedding_cache.metrics(),
+        "singleflight": inflight.metrics(),
+        "backend": BACKEND,
+        "projection_dim": projection.dim if projection is not None else None,
+        "vocabulary": vocabulary.metrics() if vocabulary is not None else None,
+        "startup": lifecycle.status(),
+    }
+
+async def _cached_submit(batcher: MicroBatcher, key: str, item) -> np.ndarray:
+    cached = await embedding_cache.get(key)
+    if cached is not None:
+        return cached
 
-@app.post("/vectorize", response_model=VectorResponse)
+    async def compute() -> np.ndarray:
+        embedding = await batcher.submit(item)
+        embedding_cache.put(key, embedding)
+        return embedding
+
+    return await inflight.do(key, compute)
+
+async def _embed_text(text: str) -> np.ndarray:
+    # Known vocabulary phrases are answered from the precomputed table.
+    if vocabulary is not None:
+        row = vocabulary.lookup(text)
+        if row is not None:
+            return row
+    return await _cached_submit(text_batcher, embedding_cache.text_key(text), text)
+
+@app.post("/vectorize", response_model=VectorResponse, dependencies=[Depends(_require_ready)])
 async def vectorize_text(request: TextRequest):
-    text_emb = model.encode_text([request.text], batch_size=1)[0]
-    text_emb = text_emb/np.linalg.norm(text_emb, ord=2, axis=-1, keepdims=True)
-    return VectorResponse(vector=text_emb.tolist())
+    try:
+        text_emb = await _embed_text(request.text)
+    except QueueFullError as exc:
+        raise _service_unavailable(exc) from exc
+    return VectorResponse(vector=_maybe_project(text_emb, request.projected).tolist())
 
-@app.post("/vectorize-image", response_model=VectorResponse)
-async def vectorize_image(request: ImageRequest):
+@app.post("/vectorize-compose", response_model=VectorResponse, dependencies=[Depends(_require_ready)])
+async def vectorize_compose(request: ComposeRequest):
+    """Sum of normalized term embeddings, e.g. ["black", "leather jacket"] for multi-term queries."""
     try:
-        image_bytes = base64.b64decode(request.image_base64, validate=True)
+        # Gathered so unseen terms land in the same micro-batch.
+        vectors = await asyncio.gather(*(_embed_text(term) for term in request.terms))
+    except QueueFullError as exc:
+        raise _service_unavailable(exc) from exc
+    try:
+        composed = VocabularyTable.compose(vectors, request.weights)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+    return VectorResponse(vector=_maybe_project(composed, request.projected).tolist())
+
+def _decode_image_base64(image_base64: str, label: str = "") -> bytes:
+    try:
+        image_bytes = base64.b64decode(image_base64, validate=True)
     except (binascii.Error, ValueError):
-        raise HTTPException(status_code=400, detail="Invalid base64-encoded image data.")
+        raise HTTPException(status_code=400, detail=f"{label}Invalid base64-encoded image data.")
 
+    if not image_bytes:
+        raise HTTPException(status_code=400, detail=f"{label}Image data is empty.")
+    return image_bytes
+
+
+def _check_item_count(count: int) -> None:
+    # Checked before any per-item work so oversized requests are rejected cheaply.
+    if count > MAX_REQUEST_ITEMS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {MAX_REQUEST_ITEMS} items can be encoded per request.",
+        )
+
+
+async def _encode_in_chunks(
+    encode_fn: Callable[[list], np.ndarray],
+    items: list,
+    keys: List[str],
+    known: Optional[List[Optional[np.ndarray]]] = None,
+) -> np.ndarray:
+    _check_item_count(len(items))
+    rows: List[Optional[np.ndarray]] = list(known or [None] * len(items))
+    unknown = [index for index, row in enumerate(rows) if row is None]
+    for index, row in zip(unknown, await embedding_cache.get_many([keys[index] for index in unknown])):
+        rows[index] = row
+    missing = [index for index, row in enumerate(rows) if row is None]
+    try:
+        for start in range(0, len(missing), MAX_BATCH_SIZE):
+            chunk = missing[start:start + MAX_BATCH_SIZE]
+            try:
+                embeddings = await executor.run(encode_fn, [items[index] for index in chunk])
+            except InvalidImageError as exc:
+                if exc.index is not None:
+                    exc.index = chunk[exc.index]  # position in the request, not the chunk
+                raise
+            embedding_cache.put_many((keys[index], embedding) for index, embedding in zip(chunk, embeddings))
+            for index, embedding in zip(chunk, embeddings):
+                rows[index] = embedding
+    except QueueFullError as exc:
+        raise _service_unavailable(exc) from exc
+    return np.stack(rows).astype(np.float32, copy=False)
+
+
+def _batch_response(
+    http_request: Request,
+    matrix: np.ndarray,
+    encoding: VectorEncoding,
+    dtype: VectorDtype,
+):
+    if encoding == "binary" or OCTET_STREAM in http_request.headers.get("accept", ""):
+        return Response(
+            content=vector_codec.to_bytes(matrix, dtype),
+            media_type=OCTET_STREAM,
+            headers={
+                "X-Vector-Shape": vector_codec.shape_header(matrix),
+                "X-Vector-Dtype": dtype,
+            },
+        )
+    if encoding == "base64":
+        return BatchVectorResponse(
+            shape=list(matrix.shape),
+            dtype=dtype,
+            encoding=encoding,
+            data=vector_codec.to_base64(matrix, dtype),
+        )
+    return BatchVectorResponse(
+        shape=list(matrix.shape),
+        dtype="float32",
+        encoding=encoding,
+        vectors=matrix.tolist(),
+    )
+
+@app.post("/vectorize-image", response_model=VectorResponse, dependencies=[Depends(_require_ready)])
+async def vectorize_image(request: ImageRequest):
+    image_bytes = _decode_image_base64(request.image_base64)
+
+    return await _vectorize_image_bytes(image_bytes, request.projected)
+
+@app.post("/vectorize-image-upload", response_model=VectorResponse, dependencies=[Depends(_require_ready)])
+async def vectorize_image_upload(file: UploadFile = File(...), projected: bool = False):
+    image_bytes = await file.read()
     if not image_bytes:
         raise HTTPException(status_code=400, detail="Image data is empty.")
+    return await _vectorize_image_bytes(image_bytes, projected)
 
-    with NamedTemporaryFile(suffix=".png") as tmp_file:
-        tmp_file.write(image_bytes)
-        tmp_file.flush()
+async def _vectorize_image_bytes(image_bytes: bytes, projected: bool = False) -> VectorResponse:
+    try:
+        image_emb = await _cached_submit(
+            image_batcher, embedding_cache.image_key(image_bytes), image_bytes
+        )
+    except QueueFullError as exc:
+        raise _service_unavailable(exc) from exc
+    except InvalidImageError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+    except Exception as exc:
+        raise HTTPException(status_code=500, detail="Failed to encode image.") from exc
 
-        try:
-            image_emb = model.encode_images([tmp_file.name], batch_size=1)[0]
-        except Exception as exc:
-            raise HTTPException(status_code=500, detail="Failed to encode image.") from exc
+    return VectorResponse(vector=_maybe_project(image_emb, projected).tolist())
 
-    image_emb = image_emb/np.linalg.norm(image_emb, ord=2, axis=-1, keepdims=True)
-    return VectorResponse(vector=image_emb.tolist())
+@app.post("/vectorize-batch", response_model=BatchVectorResponse, dependencies=[Depends(_require_ready)])
+async def vectorize_text_batch(request: TextBatchRequest, http_request: Request):
+    _check_item_count(len(request.texts))
+    keys = [embedding_cache.text_key(text) for text in request.texts]
+    known = [vocabulary.lookup(text) if vocabulary is not None else None for text in request.texts]
+    matrix = await _encode_in_chunks(_encode_text_queries, request.texts, keys, known)
+    matrix = _maybe_project(matrix, request.projected)
+    return _batch_response(http_request, matrix, request.encoding, request.dtype)
+
+@app.post("/vectorize-image-batch", response_model=BatchVectorResponse, dependencies=[Depends(_require_ready)])
+async def vectorize_image_batch(request: ImageBatchRequest, http_request: Request):
+    _check_item_count(len(request.images_base64))
+    images = [
+        _decode_image_base64(image_base64, label=f"Item {index}: ")
+        for index, image_base64 in enumerate(request.images_base64)
+    ]
+    matrix = _maybe_project(await _encode_image_batch(images), request.projected)
+    return _batch_response(http_request, matrix, request.encoding, request.dtype)
+
+@app.post("/vectorize-image-batch-upload", response_model=BatchVectorResponse, dependencies=[Depends(_require_ready)])
+async def vectorize_image_batch_upload(
+    http_request: Request,
+    files: List[UploadFile] = File(...),
+    encoding: VectorEncoding = "json",
+    dtype: VectorDtype = "float32",
+    projected: bool = False,
+):
+    _check_item_count(len(files))
+    images = [await file.read() for file in files]
+    for index, image_bytes in enumerate(images):
+        if not image_bytes:
+            raise HTTPException(status_code=400, detail=f"Item {index}: Image data is empty.")
+    matrix = _maybe_project(await _encode_image_batch(images), projected)
+    return _batch_response(http_request, matrix, encoding, dtype)
+
+async def _encode_image_batch(images: List[bytes]) -> np.ndarray:
+    try:
+        keys = [embedding_cache.image_key(image_bytes) for image_bytes in images]
+        return await _encode_in_chunks(_encode_image_bytes, images, keys)
+    except HTTPException:
+        raise
+    except InvalidImageError as exc:
+        label = f"Item {exc.index}: " if exc.index is not None else ""
+        raise HTTPException(status_code=400, detail=f"{label}{exc}") from exc
+    except Exception as exc:
+        raise HTTPException(status_code=500, detail="Failed to encode image batch.") from exc
@@ -0,0 +1,68 @@
+from pathlib import Path
+from typing import Optional, Union
+
+import numpy as np
+
+
+class Projection:
+    """Linear map from 512-d CLIP embeddings to a smaller search space.
+
+    ``apply`` computes ``((x - mean) @ components.T) * scale`` and
+    L2-normalizes the result, so projected vectors can be searched with the
+    same inner-product index as the full ones. PCA (optionally whitened) is
+    fitted with ``fit_pca``; any other learned linear map can be stored in
+    the same ``.npz`` layout (``mean``, ``components``, optional ``scale``).
+    """
+
+    def __init__(self, mean: np.ndarray, components: np.ndarray, scale: Optional[np.ndarray] = None):
+        if components.ndim != 2 or mean.shape != (components.shape[1],):
+            raise ValueError("components must be (dim, input_dim) and mean must be (input_dim,).")
+        if scale is not None and scale.shape != (components.shape[0],):
+            raise ValueError("scale must have one entry per output dimension.")
+        self.mean = mean.astype(np.float32)
+        self.components = components.astype(np.float32)
+        self.scale = scale.astype(np.float32) if scale is not None else None
+
+    @property
+    def dim(self) -> int:
+        return self.components.shape[0]
+
+    @property
+    def input_dim(self) -> int:
+        return self.components.shape[1]
+
+    @classmethod
+    def fit_pca(cls, embeddings: np.ndarray, dim: int, whiten: bool = False) -> "Projection":
+        embeddings = np.asarray(embeddings, dtype=np.float64)
+        if not 0 < dim <= embeddings.shape[1]:
+            raise ValueError(f"dim must be in (0, {embeddings.shape[1]}].")
+        mean = embeddings.mean(axis=0)
+        _, singular_values, vt = np.linalg.svd(embeddings - mean, full_matrices=False)
+        scale = None
+        if whiten:
+            std = singular_values[:dim] / np.sqrt(max(len(embeddings) - 1, 1))
+            scale = 1.0 / np.maximum(std, 1e-12)
+        return cls(mean, vt[:dim], scale)
+
+    def explained_variance_ratio(self, embeddings: np.ndarray) -> float:
+        centered = np.asarray(embeddings, dtype=np.float64) - self.mean
+        projected = centered @ self.components.T.astype(np.float64)
+        return float(np.sum(projected ** 2) / np.sum(centered ** 2))
+
+    def apply(self, embeddings: np.ndarray) -> np.ndarray:
+        projected = (np.asarray(embeddings, dtype=np.float32) - self.mean) @ self.components.T
+        if self.scale is not None:
+            projected = projected * self.scale
+        return projected / np.linalg.norm(projected, ord=2, axis=-1, keepdims=True)
+
+    def save(self, path: Union[str, Path]) -> None:
+        arrays = {"mean": self.mean, "components": self.components}
+        if self.scale is not None:
+            arrays["scale"] = self.scale
+        np.savez(path, **arrays)
+
+    @classmethod
+    def load(cls, path: Union[str, Path]) -> "Projection":
+        with np.load(path) as data:
+            scale = data["scale"] if "scale" in data.files else None
+            return cls(data["mean"], data["components"], scale)
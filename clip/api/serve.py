@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""Pre-fork server for the CLIP API that shares one copy of the model weights.
+
+The parent loads FashionCLIP once, moves its parameters into shared memory
+and binds the listening socket; each forked worker then runs its own uvicorn
+event loop on that socket. Weight pages are mapped by every worker but paid
+for once, so RSS per additional worker is only the runtime overhead:
+
+    python serve.py --workers 4 --port 8000
+"""
+import argparse
+import os
+import signal
+import socket
+import sys
+import time
+from typing import Dict
+
+import uvicorn
+
+
+def _bind(host: str, port: int) -> socket.socket:
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+
+def _run_worker(sock: socket.socket, log_level: str) -> None:
+    import main
+
+    config = uvicorn.Config(main.app, log_level=log_level, lifespan="on")
+    uvicorn.Server(config).run(sockets=[sock])
+
+
+def _spawn(sock: socket.socket, log_level: str) -> int:
+    pid = os.fork()
+    if pid == 0:
+        # Default signal handling in the child; uvicorn installs its own.
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        signal.signal(signal.SIGINT, signal.SIG_DFL)
+        try:
+            _run_worker(sock, log_level)
+        finally:
+            os._exit(0)
+    return pid
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--log-level", default="info")
+    args = parser.parse_args()
+
+    import main as app_module
+
+    # Only load weights here. Running inference in the parent would start the
+    # OpenMP thread pool, which is not safe to inherit across fork().
+    clip = app_module.preload_model()
+    clip.model.share_memory()
+
+    sock = _bind(args.host, args.port)
+    workers: Dict[int, float] = {}
+    stopping = False
+
+    def _stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(workers):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, _stop)
+    signal.signal(signal.SIGINT, _stop)
+
+    for _ in range(args.workers):
+        workers[_spawn(sock, args.log_level)] = time.monotonic()
+    print(f"Serving on {args.host}:{args.port} with {args.workers} workers (parent {os.getpid()})", flush=True)
+
+    while workers:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+        started = workers.pop(pid, None)
+        if stopping or started is None:
+            continue
+        print(f"Worker {pid} exited with status {status}; restarting", file=sys.stderr, flush=True)
+        if time.monotonic() - started < 1.0:
+            time.sleep(1.0)  # avoid a tight crash loop
+        workers[_spawn(sock, args.log_level)] = time.monotonic()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,38 @@
+import asyncio
+from typing import Awaitable, Callable, Dict, TypeVar
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    """Coalesces concurrent calls that share a key into one computation.
+
+    The first caller for a key starts the computation as a task; callers that
+    arrive while it is still running await the same task instead of starting
+    their own. The key is forgotten as soon as the task finishes, so this only
+    covers the in-flight window; pair it with a cache for completed results.
+    """
+
+    def __init__(self):
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.executed_total = 0
+        self.coalesced_total = 0
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[T]]) -> T:
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+            self.executed_total += 1
+        else:
+            self.coalesced_total += 1
+        # Shield so one caller disconnecting does not cancel the shared work.
+        return await asyncio.shield(task)
+
+    def metrics(self) -> Dict[str, int]:
+        return {
+            "inflight": len(self._inflight),
+            "executed_total": self.executed_total,
+            "coalesced_total": self.coalesced_total,
+        }
@@ -0,0 +1,40 @@
+import base64
+from typing import Literal, Tuple
+
+import numpy as np
+
+VectorEncoding = Literal["json", "base64", "binary"]
+VectorDtype = Literal["float32", "float16"]
+
+OCTET_STREAM = "application/octet-stream"
+
+_DTYPES = {
+    "float32": np.dtype("<f4"),
+    "float16": np.dtype("<f2"),
+}
+
+
+def to_bytes(matrix: np.ndarray, dtype: VectorDtype = "float32") -> bytes:
+    """Serialize a matrix as contiguous little-endian row-major bytes."""
+    if dtype not in _DTYPES:
+        raise ValueError(f"Unsupported dtype: {dtype}")
+    return np.ascontiguousarray(matrix, dtype=_DTYPES[dtype]).tobytes()
+
+
+def to_base64(matrix: np.ndarray, dtype: VectorDtype = "float32") -> str:
+    return base64.b64encode(to_bytes(matrix, dtype)).decode("ascii")
+
+
+def from_bytes(data: bytes, shape: Tuple[int, ...], dtype: VectorDtype = "float32") -> np.ndarray:
+    """Inverse of ``to_bytes``; returns a float32 array of the given shape."""
+    if dtype not in _DTYPES:
+        raise ValueError(f"Unsupported dtype: {dtype}")
+    return np.frombuffer(data, dtype=_DTYPES[dtype]).reshape(shape).astype(np.float32)
+
+
+def from_base64(data: str, shape: Tuple[int, ...], dtype: VectorDtype = "float32") -> np.ndarray:
+    return from_bytes(base64.b64decode(data), shape, dtype)
+
+
+def shape_header(matrix: np.ndarray) -> str:
+    return ",".join(str(dim) for dim in matrix.shape)
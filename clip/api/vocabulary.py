@@ -0,0 +1,143 @@
+import json
+from typing import Callable, Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+
+from embedding_cache import normalize_text
+
+# Category names used by catalog.py's category_map plus the garments users
+# typically search for, combined with common colors and materials.
+DEFAULT_ITEMS = [
+    "tops", "bottoms", "shoes", "accessories",
+    "topwear", "bottomwear", "sandal", "flip flops", "watches", "belts", "bags",
+    "jewellery", "scarves", "headwear", "eyewear", "ties",
+    "shirt", "t-shirt", "blouse", "sweater", "hoodie", "cardigan", "jacket", "coat",
+    "dress", "skirt", "jeans", "trousers", "pants", "shorts",
+    "sneakers", "boots", "sandals", "heels", "loafers",
+    "watch", "belt", "bag", "necklace", "scarf", "hat", "cap", "sunglasses", "tie",
+]
+DEFAULT_ATTRIBUTES = [
+    "white", "black", "grey", "gray", "navy", "blue", "red", "green", "yellow",
+    "pink", "purple", "brown", "beige", "orange",
+    "cotton", "denim", "leather", "wool", "linen", "silk", "knit",
+]
+DEFAULT_TEMPLATES = ["{}"]
+
+
+def encode_with_templates(
+    texts: Sequence[str],
+    encode_fn: Callable[[List[str]], np.ndarray],
+    templates: Sequence[str] = DEFAULT_TEMPLATES,
+    batch_size: Optional[int] = None,
+) -> np.ndarray:
+    """Embed ``texts`` through every prompt template (prompt ensembling).
+
+    ``encode_fn`` must return L2-normalized rows; with several templates the
+    per-template rows are averaged and renormalized, with the single
+    ``"{}"`` template this is just ``encode_fn(texts)``. All prompts go
+    through ``encode_fn`` together, in chunks of ``batch_size`` if given.
+    """
+    prompts = [template.format(text) for template in templates for text in texts]
+    if batch_size:
+        rows = np.concatenate(
+            [encode_fn(prompts[start:start + batch_size]) for start in range(0, len(prompts), batch_size)]
+        )
+    else:
+        rows = encode_fn(prompts)
+    if len(templates) == 1:
+        return rows
+    total = rows.reshape(len(templates), len(texts), -1).sum(axis=0)
+    return total / np.linalg.norm(total, ord=2, axis=-1, keepdims=True)
+
+
+def build_terms(items: Iterable[str], attributes: Iterable[str]) -> List[str]:
+    """Every item and attribute on its own plus every "attribute item" pair."""
+    items = list(dict.fromkeys(items))
+    attributes = list(dict.fromkeys(attributes))
+    terms = items + attributes + [f"{attribute} {item}" for attribute in attributes for item in items]
+    return list(dict.fromkeys(normalize_text(term) for term in terms))
+
+
+def load_terms(path: Optional[str]) -> List[str]:
+    """Read ``{"items": [...], "attributes": [...], "terms": [...]}``; missing keys use the defaults."""
+    if not path:
+        return build_terms(DEFAULT_ITEMS, DEFAULT_ATTRIBUTES)
+    with open(path, "r", encoding="utf-8") as fh:
+        config = json.load(fh)
+    terms = build_terms(config.get("items", DEFAULT_ITEMS), config.get("attributes", DEFAULT_ATTRIBUTES))
+    extra = [normalize_text(term) for term in config.get("terms", [])]
+    return list(dict.fromkeys(terms + extra))
+
+
+class VocabularyTable:
+    """In-memory embedding table for a fixed prompt vocabulary.
+
+    Each term is embedded once per prompt template; with several templates
+    (e.g. ``"{}"`` and ``"a photo of {}"``) the normalized embeddings are
+    averaged and renormalized (prompt ensembling). With the default single
+    ``"{}"`` template, table rows equal what the model returns for the term.
+    ``templates`` is kept so text outside the table can be embedded the same
+    way (see ``encode_with_templates``).
+    """
+
+    def __init__(self, terms: Sequence[str], matrix: np.ndarray, templates: Sequence[str] = DEFAULT_TEMPLATES):
+        if len(terms) != len(matrix):
+            raise ValueError("terms and matrix must have the same length.")
+        self.terms = list(terms)
+        self.templates = list(templates)
+        self.matrix = np.ascontiguousarray(matrix, dtype=np.float32)
+        self.matrix.flags.writeable = False
+        self._index: Dict[str, int] = {term: row for row, term in enumerate(self.terms)}
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def build(
+        cls,
+        terms: Sequence[str],
+        encode_fn: Callable[[List[str]], np.ndarray],
+        templates: Sequence[str] = DEFAULT_TEMPLATES,
+        batch_size: int = 64,
+    ) -> "VocabularyTable":
+        """Embed ``terms`` with ``encode_fn``, which must return L2-normalized rows."""
+        terms = list(dict.fromkeys(normalize_text(term) for term in terms))
+        return cls(terms, encode_with_templates(terms, encode_fn, templates, batch_size), templates)
+
+    def __len__(self) -> int:
+        return len(self.terms)
+
+    def __contains__(self, text: str) -> bool:
+        return normalize_text(text) in self._index
+
+    def lookup(self, text: str) -> Optional[np.ndarray]:
+        row = self._index.get(normalize_text(text))
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return self.matrix[row]
+
+    @staticmethod
+    def compose(vectors: Sequence[np.ndarray], weights: Optional[Sequence[float]] = None) -> np.ndarray:
+        """Weighted sum of normalized term vectors, renormalized to unit length."""
+        if not vectors:
+            raise ValueError("At least one vector is required.")
+        stacked = np.stack(vectors).astype(np.float32)
+        if weights is None:
+            combined = stacked.sum(axis=0)
+        else:
+            if len(weights) != len(vectors):
+                raise ValueError("weights must have one entry per term.")
+            combined = np.asarray(weights, dtype=np.float32) @ stacked
+        norm = np.linalg.norm(combined)
+        if norm == 0:
+            raise ValueError("Composed vector has zero length.")
+        return combined / norm
+
+    def metrics(self) -> Dict[str, int]:
+        return {
+            "terms": len(self.terms),
+            "templates": len(self.templates),
+            "hits": self.hits,
+            "misses": self.misses,
+        }
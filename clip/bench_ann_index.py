@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+"""Compare filtered and unfiltered ANN search: one global index vs per-category partial indexes.
+
+By default this runs against an in-memory IVF store built with numpy, which
+reproduces how pgvector answers ``WHERE category = ... ORDER BY vec <#> q``
+with a single global index: the index yields its probed candidates and the
+category filter is applied afterwards, so rare categories lose recall (or
+return fewer than k rows). Partial indexes search only that category's rows.
+
+    python bench_ann_index.py --items 200000 --probes 4 --k 10
+
+With ``--db`` the same queries (catalog vectors plus noise) run against the
+seeded collection instead, timing the SQL used by search_items_by_vector and
+scoring recall against an exact scan with index scans disabled:
+
+    python bench_ann_index.py --db --queries 200
+"""
+import argparse
+import os
+import time
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+CATEGORY_SHARES = {'tops': 0.45, 'bottoms': 0.25, 'shoes': 0.2, 'accessories': 0.1}
+
+
+class IVFStore:
+    """Inner-product IVF index over ``vectors`` (rows assumed unit length)."""
+
+    def __init__(self, vectors: np.ndarray, lists: int, seed: int = 0, iterations: int = 8):
+        rng = np.random.default_rng(seed)
+        lists = max(1, min(lists, len(vectors)))
+        centroids = vectors[rng.choice(len(vectors), size=lists, replace=False)].copy()
+        for _ in range(iterations):
+            assignment = np.argmax(vectors @ centroids.T, axis=1)
+            for list_id in range(lists):
+                members = vectors[assignment == list_id]
+                if len(members):
+                    centroid = members.mean(axis=0)
+                    centroids[list_id] = centroid / np.linalg.norm(centroid)
+        self.vectors = vectors
+        self.centroids = centroids
+        self.lists = [np.flatnonzero(assignment == list_id) for list_id in range(lists)]
+
+    def candidates(self, query: np.ndarray, probes: int) -> np.ndarray:
+        nearest = np.argsort(-(self.centroids @ query))[:probes]
+        return np.concatenate([self.lists[list_id] for list_id in nearest])
+
+
+def _top_k(vectors: np.ndarray, rows: np.ndarray, query: np.ndarray, k: int) -> np.ndarray:
+    scores = vectors[rows] @ query
+    order = np.argsort(-scores)[:k]
+    return rows[order]
+
+
+def make_items(items: int, dim: int, seed: int) -> Tuple[np.ndarray, np.ndarray]:
+    rng = np.random.default_rng(seed)
+    names = np.array(list(CATEGORY_SHARES), dtype=object)
+    categories = names[rng.choice(len(names), size=items, p=list(CATEGORY_SHARES.values()))]
+    # Categories overlap in embedding space (like CLIP image features), with
+    # a few style clusters shared across all of them.
+    styles = rng.normal(size=(32, dim))
+    offsets = {name: rng.normal(scale=0.6, size=dim) for name in names}
+    vectors = styles[rng.integers(0, len(styles), size=items)] + rng.normal(scale=0.8, size=(items, dim))
+    vectors += np.stack([offsets[name] for name in categories])
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors.astype(np.float32), categories
+
+
+def _summarize(latencies: List[float], recalls: List[float]) -> str:
+    latencies_ms = np.array(latencies) * 1000
+    return (f"p50 {np.percentile(latencies_ms, 50):7.2f} ms  p95 {np.percentile(latencies_ms, 95):7.2f} ms  "
+            f"recall@k {np.mean(recalls):.3f}")
+
+
+def run_mock(args) -> None:
+    vectors, categories = make_items(args.items, args.dim, args.seed)
+    rng = np.random.default_rng(args.seed + 1)
+    lists = args.lists or max(int(np.sqrt(args.items)), 1)
+
+    started = time.perf_counter()
+    global_index = IVFStore(vectors, lists, args.seed)
+    print(f"global index: {lists} lists over {args.items} items, built in {time.perf_counter() - started:.1f}s")
+    partial: Dict[str, Tuple[np.ndarray, IVFStore]] = {}
+    for name in CATEGORY_SHARES:
+        rows = np.flatnonzero(categories == name)
+        # Same rows-per-list density as the global index.
+        partial[name] = (rows, IVFStore(vectors[rows], max(int(lists * len(rows) / args.items), 1), args.seed))
+
+    queries = vectors[rng.integers(0, args.items, size=args.queries)] + rng.normal(scale=0.3, size=(args.queries, args.dim))
+    queries = (queries / np.linalg.norm(queries, axis=1, keepdims=True)).astype(np.float32)
+    query_categories = rng.choice(list(CATEGORY_SHARES), size=args.queries)
+    all_rows = np.arange(args.items)
+
+    results = {name: ([], []) for name in ('unfiltered', 'filtered/global', 'filtered/partial')}
+    for query, category in zip(queries, query_categories):
+        exact = set(_top_k(vectors, all_rows, query, args.k))
+        started = time.perf_counter()
+        found = _top_k(vectors, global_index.candidates(query, args.probes), query, args.k)
+        results['unfiltered'][0].append(time.perf_counter() - started)
+        results['unfiltered'][1].append(len(exact & set(found)) / args.k)
+
+        rows, index = partial[category]
+        exact = set(_top_k(vectors, rows, query, args.k))
+        started = time.perf_counter()
+        candidates = global_index.candidates(query, args.probes)
+        found = _top_k(vectors, candidates[categories[candidates] == category], query, args.k)
+        results['filtered/global'][0].append(time.perf_counter() - started)
+        results['filtered/global'][1].append(len(exact & set(found)) / args.k)
+
+        started = time.perf_counter()
+        found = rows[_top_k(index.vectors, index.candidates(query, args.probes), query, args.k)]
+        results['filtered/partial'][0].append(time.perf_counter() - started)
+        results['filtered/partial'][1].append(len(exact & set(found)) / args.k)
+
+    for name, (latencies, recalls) in results.items():
+        print(f"{name:18s} {_summarize(latencies, recalls)}")
+
+
+def run_db(args) -> None:
+    from dotenv import load_dotenv
+    from sqlalchemy import create_engine, text
+
+    load_dotenv("../.env.local")
+    db_url = os.getenv("DB_URL")
+    if db_url is None:
+        raise ValueError("DB_URL environment variable is not set")
+    engine = create_engine(db_url)
+    table = args.collection
+
+    search = text(
+        f'select id from vecs."{table}" where (:category is null or metadata->>\'category\' = :category) '
+        f'order by vec <#> cast(:query as vector) limit :k'
+    )
+    rng = np.random.default_rng(args.seed)
+    with engine.connect() as conn:
+        sample = conn.execute(text(
+            f'select vec::text, metadata->>\'category\' from vecs."{table}" order by random() limit :n'
+        ), {"n": args.queries}).all()
+
+        results = {name: ([], []) for name in ('unfiltered', 'filtered')}
+        for vec_text, category in sample:
+            vec = np.array(vec_text.strip('[]').split(','), dtype=np.float32)
+            vec += rng.normal(scale=0.02, size=vec.shape).astype(np.float32)
+            query = '[' + ','.join(f'{value:.6f}' for value in vec) + ']'
+            for name, filter_category in (('unfiltered', None), ('filtered', category)):
+                params = {"category": filter_category, "query": query, "k": args.k}
+                # Custom plan per query, as search_items_by_vector is configured.
+                conn.execute(text("set plan_cache_mode = force_custom_plan"))
+                started = time.perf_counter()
+                found = [row[0] for row in conn.execute(search, params)]
+                elapsed = time.perf_counter() - started
+                conn.execute(text("set enable_indexscan = off"))
+                exact = [row[0] for row in conn.execute(search, params)]
+                conn.execute(text("set enable_indexscan = on"))
+                results[name][0].append(elapsed)
+                results[name][1].append(len(set(exact) & set(found)) / args.k)
+
+    for name, (latencies, recalls) in results.items():
+        print(f"{name:10s} {_summarize(latencies, recalls)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--db', action='store_true', help='Query the seeded collection instead of the numpy store.')
+    parser.add_argument('--collection', default='ec_item_vectors')
+    parser.add_argument('--items', type=int, default=100_000)
+    parser.add_argument('--dim', type=int, default=512)
+    parser.add_argument('--lists', type=int, default=None, help='IVF lists of the global index (default sqrt(items)).')
+    parser.add_argument('--probes', type=int, default=4)
+    parser.add_argument('--queries', type=int, default=500)
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    if args.db:
+        run_db(args)
+    else:
+        run_mock(args)
+
+
+if __name__ == '__main__':
+    main()
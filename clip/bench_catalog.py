@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""Time the catalog scan on a synthetic styles.csv and image directory.
+
+Generates ``--rows`` styles (a mix of mapped and unmapped subcategories) and
+creates empty ``<id>.jpg`` files for ``--image-fraction`` of them, then times
+``catalog.scan_catalog`` against the previous per-row ``iterrows`` +
+``os.path.exists`` loop:
+
+    python bench_catalog.py --rows 1000000 --legacy-rows 100000
+
+The legacy loop is slow enough that it is timed on the first ``--legacy-rows``
+rows and extrapolated linearly.
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from catalog import category_map, scan_catalog
+
+UNMAPPED = ['Innerwear', 'Loungewear and Nightwear', 'Saree', 'Fragrance', 'Lips', 'Free Gifts']
+
+
+def make_catalog(root: str, rows: int, image_fraction: float, seed: int) -> tuple:
+    rng = np.random.default_rng(seed)
+    sub_categories = np.array(list(category_map) + UNMAPPED, dtype=object)
+    ids = rng.permutation(np.arange(10_000, 10_000 + rows * 2))[:rows]
+    styles = pd.DataFrame({
+        'id': ids,
+        'gender': 'Unisex',
+        'masterCategory': 'Apparel',
+        'subCategory': sub_categories[rng.integers(0, len(sub_categories), size=rows)],
+    })
+    styles_path = os.path.join(root, 'styles.csv')
+    styles.to_csv(styles_path, index=False)
+
+    images_dir = os.path.join(root, 'images')
+    os.makedirs(images_dir)
+    for style_id in ids[rng.random(rows) < image_fraction]:
+        open(os.path.join(images_dir, f'{style_id}.jpg'), 'wb').close()
+    return styles_path, images_dir
+
+
+def legacy_scan(styles_path: str, images_dir: str, limit: int) -> int:
+    styles = pd.read_csv(styles_path, usecols=[0, 3], names=['id', 'subCategory'], header=0, nrows=limit)
+    found = 0
+    for _, row in styles.iterrows():
+        if row['subCategory'] not in category_map:
+            continue
+        if not os.path.exists(f"{images_dir}/{row['id']}.jpg"):
+            continue
+        found += 1
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--image-fraction', type=float, default=0.8)
+    parser.add_argument('--legacy-rows', type=int, default=100_000,
+                        help='Rows timed with the old loop (0 skips it).')
+    parser.add_argument('--dir', default=None, help='Where to build the synthetic catalog (default: a temp dir).')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(dir=args.dir) as root:
+        started = time.perf_counter()
+        styles_path, images_dir = make_catalog(root, args.rows, args.image_fraction, args.seed)
+        print(f"Generated {args.rows} rows in {time.perf_counter() - started:.1f}s")
+
+        # Warm the dentry cache so both scans see the same filesystem state.
+        scan_catalog(styles_path, images_dir)
+
+        started = time.perf_counter()
+        catalog = scan_catalog(styles_path, images_dir)
+        vectorized = time.perf_counter() - started
+        print(f"scan_catalog: {len(catalog)} items from {args.rows} rows in {vectorized:.2f}s "
+              f"({args.rows / vectorized:,.0f} rows/s)")
+
+        if args.legacy_rows:
+            limit = min(args.legacy_rows, args.rows)
+            started = time.perf_counter()
+            legacy_scan(styles_path, images_dir, limit)
+            legacy = (time.perf_counter() - started) * args.rows / limit
+            print(f"iterrows + os.path.exists: {legacy:.2f}s for {args.rows} rows "
+                  f"(extrapolated from {limit}) -> {legacy / vectorized:.1f}x slower")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+import os
+from dataclasses import dataclass, field
+from typing import Dict, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+category_map = {
+    'Topwear': 'tops',
+    'Bottomwear': 'bottoms',
+    'Shoes': 'shoes',
+    'Sandal': 'shoes',
+    'Flip Flops': 'shoes',
+    'Watches': 'accessories',
+    'Belts': 'accessories',
+    'Bags': 'accessories',
+    'Jewellery': 'accessories',
+    'Scarves': 'accessories',
+    'Headwear': 'accessories',
+    'Eyewear': 'accessories',
+    'Ties': 'accessories',
+    'Accessories': 'accessories',
+}
+
+
+@dataclass
+class Catalog:
+    """Aligned arrays describing the catalog items that will be embedded.
+
+    ``ids`` are the vector ids (``"<style id>.jpg"``), ``paths`` the image
+    files and ``categories`` the mapped categories; ``fingerprints`` is filled
+    in later by the seeder. All arrays share the same row order.
+    """
+
+    ids: np.ndarray
+    paths: np.ndarray
+    categories: np.ndarray
+    fingerprints: Optional[np.ndarray] = field(default=None)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def take(self, indices: Sequence[int]) -> "Catalog":
+        indices = np.asarray(indices, dtype=np.int64)
+        return Catalog(
+            ids=self.ids[indices],
+            paths=self.paths[indices],
+            categories=self.categories[indices],
+            fingerprints=self.fingerprints[indices] if self.fingerprints is not None else None,
+        )
+
+
+def list_image_ids(images_dir: str, suffix: str = '.jpg') -> np.ndarray:
+    """Style ids that have an image, from a single directory listing."""
+    with os.scandir(images_dir) as entries:
+        names = [entry.name for entry in entries if entry.name.endswith(suffix)]
+    return np.array([name[:-len(suffix)] for name in names], dtype=object)
+
+
+def scan_catalog(
+    styles_path: str,
+    images_dir: str,
+    categories: Dict[str, str] = category_map,
+) -> Catalog:
+    """Filter styles.csv to mapped subcategories that have an image on disk.
+
+    Replaces a per-row ``iterrows`` + ``os.path.exists`` walk with a vectorized
+    category mapping and one ``os.scandir`` listing joined on id; rows keep
+    their order from styles.csv.
+    """
+    styles = pd.read_csv(styles_path, usecols=[0, 3], names=['id', 'subCategory'], header=0)
+    styles['category'] = styles['subCategory'].map(categories)
+    styles = styles[styles['category'].notna()]
+
+    style_ids = styles['id'].astype(str)
+    has_image = style_ids.isin(list_image_ids(images_dir))
+    styles = styles[has_image.to_numpy()]
+    style_ids = style_ids[has_image]
+
+    images_dir = images_dir.rstrip('/')
+    return Catalog(
+        ids=(style_ids + '.jpg').to_numpy(dtype=object),
+        paths=(images_dir + '/' + style_ids + '.jpg').to_numpy(dtype=object),
+        categories=styles['category'].to_numpy(dtype=object),
+    )
@@ -0,0 +1,85 @@
+"""Measure recall@k of reduced-dimension search against full 512-d search.
+
+For a held-out sample of catalog vectors used as queries, the exact top-k
+neighbours by inner product over the full vectors are the ground truth;
+recall@k is the fraction of them recovered by top-k over projected vectors.
+PCA projections are fitted on the remaining vectors for each --dims value,
+and any saved projection files given with --projection are evaluated too:
+
+    uv run eval_projection.py --dims 64 128 256 --k 10 50
+    uv run eval_projection.py --embeddings embeddings.npy --projection projection_128.npz
+"""
+import argparse
+import time
+from typing import Dict
+
+import numpy as np
+
+from api.projection import Projection
+from fit_projection import load_catalog_embeddings
+
+
+def _top_k(corpus: np.ndarray, queries: np.ndarray, k: int, chunk: int = 1024) -> np.ndarray:
+    results = []
+    for start in range(0, len(queries), chunk):
+        scores = queries[start:start + chunk] @ corpus.T
+        top = np.argpartition(-scores, k, axis=1)[:, :k]
+        results.append(top)
+    return np.concatenate(results)
+
+
+def _recall(truth: np.ndarray, found: np.ndarray) -> float:
+    hits = sum(len(np.intersect1d(t, f, assume_unique=True)) for t, f in zip(truth, found))
+    return hits / truth.size
+
+
+def _evaluate(name: str, projection: Projection, corpus: np.ndarray, queries: np.ndarray,
+              truths: Dict[int, np.ndarray], full_ms: float) -> None:
+    projected_corpus = projection.apply(corpus)
+    projected_queries = projection.apply(queries)
+    started = time.perf_counter()
+    _top_k(projected_corpus, projected_queries, max(truths))
+    scan_ms = (time.perf_counter() - started) * 1000.0
+    recalls = "  ".join(
+        f"R@{k}={_recall(truth, _top_k(projected_corpus, projected_queries, k)):.4f}"
+        for k, truth in sorted(truths.items())
+    )
+    print(
+        f"{name:<24} dim={projection.dim:<4} size={projected_corpus.nbytes / corpus.nbytes:.2f}x "
+        f"scan={scan_ms:.0f}ms (full {full_ms:.0f}ms)  {recalls}"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Evaluate recall@k of projected EC item embeddings.")
+    parser.add_argument("--embeddings", default=None, help="(N, 512) .npy file; defaults to the database.")
+    parser.add_argument("--limit", type=int, default=None)
+    parser.add_argument("--queries", type=int, default=1000, help="Held-out vectors used as queries.")
+    parser.add_argument("--dims", type=int, nargs="*", default=[64, 128, 256])
+    parser.add_argument("--whiten", action="store_true")
+    parser.add_argument("--projection", nargs="*", default=[], help="Saved .npz projections to evaluate.")
+    parser.add_argument("--k", type=int, nargs="+", default=[10])
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    embeddings = load_catalog_embeddings(args.embeddings, args.limit)
+    rng = np.random.default_rng(args.seed)
+    order = rng.permutation(len(embeddings))
+    queries = embeddings[order[:args.queries]]
+    corpus = embeddings[order[args.queries:]]
+    print(f"corpus={len(corpus)} queries={len(queries)}")
+
+    started = time.perf_counter()
+    _top_k(corpus, queries, max(args.k))
+    full_ms = (time.perf_counter() - started) * 1000.0
+    truths = {k: _top_k(corpus, queries, k) for k in args.k}
+
+    name = "pca-whiten" if args.whiten else "pca"
+    for dim in args.dims:
+        _evaluate(name, Projection.fit_pca(corpus, dim, whiten=args.whiten), corpus, queries, truths, full_ms)
+    for path in args.projection:
+        _evaluate(path, Projection.load(path), corpus, queries, truths, full_ms)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""Fit a PCA projection on the seeded EC catalog embeddings.
+
+    uv run fit_projection.py --dim 256 --out projection_256.npz
+    uv run fit_projection.py --embeddings embeddings.npy --dim 128 --whiten --out projection_128w.npz
+
+The resulting file is used by the CLIP API (CLIP_PROJECTION_PATH) and by
+seed.py (PROJECTION_PATH).
+"""
+import argparse
+import os
+from typing import Optional
+
+import numpy as np
+from dotenv import load_dotenv
+
+from api.projection import Projection
+
+
+def load_catalog_embeddings(path: Optional[str] = None, limit: Optional[int] = None) -> np.ndarray:
+    """Load full 512-d catalog vectors from a .npy file or the ec_item_vectors collection."""
+    if path:
+        embeddings = np.load(path, mmap_mode="r")
+        return np.asarray(embeddings[:limit] if limit else embeddings, dtype=np.float32)
+
+    from sqlalchemy import select
+    from vecs import create_client
+
+    load_dotenv("../.env.local")
+    db_url = os.getenv("DB_URL")
+    if db_url is None:
+        raise ValueError("DB_URL environment variable is not set")
+
+    vx = create_client(db_url)
+    ec_items = vx.get_or_create_collection(name="ec_item_vectors", dimension=512)
+    query = select(ec_items.table.c.vec)
+    if limit:
+        query = query.limit(limit)
+    with vx.Session() as session:
+        rows = session.execute(query).all()
+    return np.stack([np.asarray(row[0], dtype=np.float32) for row in rows])
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Fit a PCA projection for EC item embeddings.")
+    parser.add_argument("--embeddings", default=None, help="(N, 512) .npy file; defaults to the database.")
+    parser.add_argument("--limit", type=int, default=None, help="Fit on at most this many vectors.")
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument("--whiten", action="store_true")
+    parser.add_argument("--out", required=True)
+    args = parser.parse_args()
+
+    embeddings = load_catalog_embeddings(args.embeddings, args.limit)
+    projection = Projection.fit_pca(embeddings, args.dim, whiten=args.whiten)
+    projection.save(args.out)
+    print(
+        f"Fitted {args.dim}-d projection on {len(embeddings)} vectors "
+        f"(explained variance {projection.explained_variance_ratio(embeddings):.3f}) -> {args.out}"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,198 @@
+import time
+from dataclasses import dataclass, field
+from typing import Iterator, List, Optional, Tuple
+
+import numpy as np
+import torch
+from torch.utils.data import DataLoader, Dataset
+
+from api.images import InvalidImageError, decode_image
+
+
+class CatalogImageDataset(Dataset):
+    """Decodes and CLIP-preprocesses catalog images inside DataLoader workers.
+
+    Each item is ``(index, pixel_values or None, decode_seconds, error)``;
+    images that fail to decode yield ``None`` and the reason, so one bad file
+    never reaches the model.
+    """
+
+    def __init__(self, image_paths: List[str], processor, draft_size: Optional[int] = None):
+        self.image_paths = image_paths
+        self.processor = processor
+        self.draft_size = draft_size
+
+    def __len__(self) -> int:
+        return len(self.image_paths)
+
+    def __getitem__(self, index: int) -> Tuple[int, Optional[torch.Tensor], float, Optional[str]]:
+        started = time.perf_counter()
+        pixels, error = None, None
+        try:
+            with open(self.image_paths[index], 'rb') as fh:
+                image = decode_image(fh.read(), self.draft_size)
+            pixels = self.processor(images=image, return_tensors='pt')['pixel_values'][0]
+        except (InvalidImageError, OSError) as e:
+            error = f"decode: {e}"
+        else:
+            if not torch.isfinite(pixels).all():
+                pixels, error = None, "decode: non-finite pixel values"
+        return index, pixels, time.perf_counter() - started, error
+
+
+def collate_images(batch):
+    indices = [index for index, pixels, _, _ in batch if pixels is not None]
+    failed = [(index, error) for index, pixels, _, error in batch if pixels is None]
+    pixels = torch.stack([pixels for _, pixels, _, _ in batch if pixels is not None]) if indices else None
+    decode_seconds = sum(seconds for _, _, seconds, _ in batch)
+    return indices, pixels, failed, decode_seconds
+
+
+@dataclass
+class StageStats:
+    """Per-stage throughput used to tell decode-bound runs from model-bound ones."""
+
+    workers: int
+    images: int = 0
+    failed: int = 0
+    decode_seconds: float = 0.0
+    wait_seconds: float = 0.0
+    model_seconds: float = 0.0
+    started: float = field(default_factory=time.perf_counter)
+
+    def _rate(self, seconds: float) -> float:
+        return self.images / seconds if seconds > 0 else float('inf')
+
+    def summary(self) -> dict:
+        return {
+            # Worker decode time is spread over `workers` processes.
+            'decode_img_s': self._rate(self.decode_seconds / max(self.workers, 1)),
+            'model_img_s': self._rate(self.model_seconds),
+            'end_to_end_img_s': self._rate(time.perf_counter() - self.started),
+            'loader_wait_s': round(self.wait_seconds, 1),
+        }
+
+    def report(self) -> str:
+        summary = self.summary()
+        bound = 'decode' if summary['decode_img_s'] < summary['model_img_s'] else 'model'
+        return (
+            f"{self.images} images ({self.failed} quarantined): "
+            f"decode {summary['decode_img_s']:.1f} img/s, model {summary['model_img_s']:.1f} img/s, "
+            f"end-to-end {summary['end_to_end_img_s']:.1f} img/s, waited {summary['loader_wait_s']}s on loader "
+            f"-> {bound}-bound"
+        )
+
+
+def make_loader(
+    image_paths: List[str],
+    processor,
+    decode_batch_size: int,
+    num_workers: int,
+    prefetch_factor: int,
+    draft_size: Optional[int] = None,
+) -> DataLoader:
+    """Loader of small decode batches; ``encode_loader`` packs them into model batches.
+
+    Workers hold at most ``num_workers * prefetch_factor`` decode batches, so
+    host memory in flight scales with ``decode_batch_size`` (about 0.6 MB per
+    224x224 image), not with the model batch size.
+    """
+    return DataLoader(
+        CatalogImageDataset(image_paths, processor, draft_size),
+        batch_size=decode_batch_size,
+        shuffle=False,
+        num_workers=num_workers,
+        prefetch_factor=prefetch_factor if num_workers > 0 else None,
+        persistent_workers=False,
+        collate_fn=collate_images,
+    )
+
+
+# (dataset index, reason) for an image that could not be embedded
+Failure = Tuple[int, str]
+
+
+def encode_loader(
+    clip, loader: DataLoader, batch_size: int, stats: StageStats
+) -> Iterator[Tuple[List[int], np.ndarray, List[Failure]]]:
+    """Run the vision tower over preprocessed images, ``batch_size`` at a time.
+
+    Decode batches from ``loader`` are copied into one reusable buffer of
+    ``batch_size`` images (pinned when CUDA is available), which is encoded
+    whenever it fills up. Yields ``(indices, embeddings, failures)`` per model
+    batch; embeddings are raw (unnormalized) image features in the order of
+    ``indices``.
+    """
+    buffer: Optional[torch.Tensor] = None
+    indices: List[int] = []
+    failed: List[Failure] = []
+
+    def _flush() -> Tuple[List[int], np.ndarray, List[Failure]]:
+        embeddings = np.zeros((0, clip.model.config.projection_dim), dtype=np.float32)
+        encoded, rejected = [], []
+        if indices:
+            started = time.perf_counter()
+            encoded, embeddings, rejected = _encode_bisecting(clip, buffer[:len(indices)], list(indices))
+            stats.model_seconds += time.perf_counter() - started
+            stats.images += len(encoded)
+        stats.failed += len(failed) + len(rejected)
+        result = encoded, embeddings, failed + rejected
+        indices.clear()
+        failed.clear()
+        return result
+
+    iterator = iter(loader)
+    while True:
+        waited = time.perf_counter()
+        try:
+            decode_indices, pixels, decode_failed, decode_seconds = next(iterator)
+        except StopIteration:
+            break
+        stats.wait_seconds += time.perf_counter() - waited
+        stats.decode_seconds += decode_seconds
+        failed.extend(decode_failed)
+        if pixels is None:
+            continue
+
+        if buffer is None:
+            buffer = torch.empty((batch_size, *pixels.shape[1:]), dtype=pixels.dtype)
+            if torch.cuda.is_available():
+                buffer = buffer.pin_memory()
+        offset = 0
+        while offset < len(decode_indices):
+            take = min(batch_size - len(indices), len(decode_indices) - offset)
+            buffer[len(indices):len(indices) + take] = pixels[offset:offset + take]
+            indices.extend(decode_indices[offset:offset + take])
+            offset += take
+            if len(indices) == batch_size:
+                yield _flush()
+
+    if indices or failed:
+        yield _flush()
+
+
+def _encode_bisecting(
+    clip, pixels: torch.Tensor, indices: List[int]
+) -> Tuple[List[int], np.ndarray, List[Failure]]:
+    """Encode a batch, isolating the images that make the forward pass fail.
+
+    A failing batch is split in half and each half retried, so a single bad
+    image costs about ``2 * log2(batch_size)`` extra forward passes instead of
+    one pass per image; the healthy halves are still encoded in bulk.
+    """
+    try:
+        return indices, _forward(clip, pixels), []
+    except Exception as e:
+        if len(indices) == 1:
+            return [], np.zeros((0, clip.model.config.projection_dim), dtype=np.float32), [(indices[0], f"encode: {e}")]
+        print(f"Error encoding batch of {len(indices)} images, bisecting: {e}")
+    middle = len(indices) // 2
+    left = _encode_bisecting(clip, pixels[:middle], indices[:middle])
+    right = _encode_bisecting(clip, pixels[middle:], indices[middle:])
+    return left[0] + right[0], np.concatenate([left[1], right[1]]), left[2] + right[2]
+
+
+def _forward(clip, pixels: torch.Tensor) -> np.ndarray:
+    with torch.no_grad():
+        features = clip.model.get_image_features(pixel_values=pixels.to(clip.device, non_blocking=True))
+    return features.detach().cpu().numpy()
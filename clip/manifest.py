@@ -0,0 +1,46 @@
+import sqlite3
+from typing import Dict, Iterable, Optional
+
+
+class SeedManifest:
+    """Local record of which catalog ids have been committed to the vector store.
+
+    Rows are written only after the corresponding upsert succeeded, so a
+    rerun after a crash can skip everything listed here and resume from the
+    first uncommitted batch. Each row also keeps the image fingerprint it was
+    embedded from, so a replaced image is re-embedded even if its id is known.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS committed (id TEXT PRIMARY KEY, category TEXT NOT NULL)"
+        )
+        columns = {row[1] for row in self._db.execute("PRAGMA table_info(committed)")}
+        if "fingerprint" not in columns:
+            self._db.execute("ALTER TABLE committed ADD COLUMN fingerprint TEXT")
+        self._db.commit()
+
+    def committed(self) -> Dict[str, Optional[str]]:
+        """Map of committed id to the fingerprint it was embedded from."""
+        return dict(self._db.execute("SELECT id, fingerprint FROM committed"))
+
+    def mark_committed(self, rows: Iterable[tuple]) -> None:
+        """Record ``(id, category, fingerprint)`` rows as committed."""
+        self._db.executemany(
+            "INSERT OR REPLACE INTO committed (id, category, fingerprint) VALUES (?, ?, ?)", rows
+        )
+        self._db.commit()
+
+    def remove(self, ids: Iterable[str]) -> None:
+        self._db.executemany("DELETE FROM committed WHERE id = ?", ((id_,) for id_ in ids))
+        self._db.commit()
+
+    def reset(self) -> None:
+        self._db.execute("DELETE FROM committed")
+        self._db.commit()
+
+    def close(self) -> None:
+        self._db.close()
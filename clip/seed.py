@@ -1,114 +1,333 @@
 from fashion_clip.fashion_clip import FashionCLIP
-from vecs import create_client, IndexMeasure
+from vecs import create_client
 from dotenv import load_dotenv
+import argparse
+import hashlib
 import os
-import pandas as pd
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from tqdm import tqdm
 import numpy as np
-from unittest.mock import patch
-
-load_dotenv("../.env.local")
-
-db_url = os.getenv("DB_URL")
-if db_url is None:
-    raise ValueError("DB_URL environment variable is not set")
-
-vx = create_client(db_url)
-
-ec_items = vx.get_or_create_collection(name="ec_item_vectors", dimension=512)
-
-model = FashionCLIP('fashion-clip')
-
-styles = pd.read_csv('./dataset/styles.csv', usecols=[0, 3], names=['id', 'subCategory'], header=0)
-
-category_map = {
-    'Topwear': 'tops',
-    'Bottomwear': 'bottoms',
-    'Shoes': 'shoes',
-    'Sandal': 'shoes',
-    'Flip Flops': 'shoes',
-    'Watches': 'accessories',
-    'Belts': 'accessories',
-    'Bags': 'accessories',
-    'Jewellery': 'accessories',
-    'Scarves': 'accessories',
-    'Headwear': 'accessories',
-    'Eyewear': 'accessories',
-    'Ties': 'accessories',
-    'Accessories': 'accessories',
-}
-
-# Prepare data for batch processing
-batch_size = 2048
-image_paths = []
-image_metadata = []
-
-for _, row in styles.iterrows():
-    style_id = row['id']
-    sub_category = row['subCategory']
-
-    # Skip if subCategory is not in category_map
-    if sub_category not in category_map:
-        continue
-
-    # Convert subCategory to category using category_map
-    category = category_map[sub_category]
-
-    # Check if image file exists
-    image_path = f'./dataset/images/{style_id}.jpg'
-    if not os.path.exists(image_path):
-        continue
-
-    image_paths.append(image_path)
-    image_metadata.append({
-        'id': f"{style_id}.jpg",
-        'category': category
-    })
-
-# Process images in batches
-records = []
-total_batches = (len(image_paths) + batch_size - 1) // batch_size
-
-# Disable tqdm in encode_images by patching it
-with patch('fashion_clip.fashion_clip.tqdm'):
-    for i in tqdm(range(0, len(image_paths), batch_size), total=total_batches, desc="Processing image batches"):
-        batch_paths = image_paths[i:i + batch_size]
-        batch_metadata = image_metadata[i:i + batch_size]
+from typing import Dict, Iterator, List, Optional, Sequence, TextIO
 
+from ann_index import IndexConfig, build_index
+from api.projection import Projection
+from catalog import Catalog, category_map, scan_catalog
+from image_pipeline import StageStats, encode_loader, make_loader
+from manifest import SeedManifest
+from snapshot import Record, SnapshotWriter
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Embed the EC catalog with FashionCLIP and upsert it into vecs.")
+    parser.add_argument('--styles', default='./dataset/styles.csv')
+    parser.add_argument('--images', default='./dataset/images')
+    parser.add_argument('--batch-size', type=int, default=512,
+                        help='Images per forward pass of the vision tower.')
+    parser.add_argument('--decode-batch-size', type=int, default=32,
+                        help='Images each DataLoader worker decodes per batch; only these small '
+                             'batches are in flight between workers and the model.')
+    parser.add_argument('--workers', type=int, default=max((os.cpu_count() or 2) - 1, 1),
+                        help='DataLoader processes decoding and preprocessing images.')
+    parser.add_argument('--prefetch', type=int, default=2,
+                        help='Decode batches each worker prepares ahead of the model.')
+    parser.add_argument('--draft-size', type=int, default=448,
+                        help='JPEG draft decode size (0 decodes at full resolution).')
+    parser.add_argument('--upsert-chunk', type=int, default=4096,
+                        help='Records per upsert; bounds memory held between encode and write.')
+    parser.add_argument('--queue-depth', type=int, default=2,
+                        help='Encoded batches allowed to wait for the database writer.')
+    parser.add_argument('--manifest', default=None,
+                        help='Progress manifest used to resume an interrupted run '
+                             '(default: ./seed_manifest_<collection>.sqlite).')
+    parser.add_argument('--quarantine', default=None,
+                        help='Tab-separated list of images that could not be embedded, appended to on '
+                             'every run (default: ./seed_quarantine_<collection>.tsv).')
+    parser.add_argument('--restart', action='store_true',
+                        help='Ignore the manifest and re-embed every item.')
+    parser.add_argument('--incremental', action='store_true',
+                        help='Compare against fingerprints stored in the collection: embed only new or '
+                             'changed images and delete vectors of items removed from the catalog.')
+    parser.add_argument('--fingerprint', choices=['stat', 'sha256'], default='stat',
+                        help='How images are fingerprinted: file size+mtime (fast) or content hash.')
+    parser.add_argument('--snapshot', default=None,
+                        help='Also write the records embedded in this run to a local snapshot directory '
+                             '(see snapshot.py; use with --restart for a full-catalog snapshot).')
+    parser.add_argument('--snapshot-dtype', choices=['float32', 'float16'], default='float32')
+    index = parser.add_argument_group('vector index')
+    index.add_argument('--index-method', choices=['auto', 'hnsw', 'ivfflat'], default='auto',
+                       help='ANN index built after seeding (auto: HNSW when pgvector supports it).')
+    index.add_argument('--hnsw-m', type=int, default=None,
+                       help='HNSW graph degree (pgvector default 16).')
+    index.add_argument('--hnsw-ef-construction', type=int, default=None,
+                       help='HNSW build candidate list size (pgvector default 64).')
+    index.add_argument('--ivf-lists', type=int, default=None,
+                       help='IVFFlat list count of the global index (default: rows/1000, at least 30; '
+                            'sqrt(rows) above 1M). Partial indexes size theirs per category.')
+    index.add_argument('--partial-indexes', action='store_true',
+                       help='Also build one partial index per category for category-filtered searches.')
+    index.add_argument('--index-only', action='store_true',
+                       help='Skip embedding and only rebuild the index(es) with the options above.')
+    return parser.parse_args()
+
+
+def fingerprint_file(path: str, mode: str = 'stat') -> str:
+    if mode == 'sha256':
+        digest = hashlib.sha256()
+        with open(path, 'rb') as fh:
+            for chunk in iter(lambda: fh.read(1 << 20), b''):
+                digest.update(chunk)
+        return f"sha256:{digest.hexdigest()}"
+    stat = os.stat(path)
+    return f"stat:{stat.st_size}:{stat.st_mtime_ns}"
+
+
+def fingerprint_files(paths: Sequence[str], mode: str) -> List[str]:
+    # I/O bound (stat or read), so threads overlap the filesystem latency.
+    with ThreadPoolExecutor(max_workers=16) as pool:
+        return list(pool.map(lambda path: fingerprint_file(path, mode), paths, chunksize=256))
+
+
+def fetch_stored_fingerprints(vx, collection) -> Dict[str, Optional[str]]:
+    """Map of every vector id in ``collection`` to its stored fingerprint (None if absent)."""
+    from sqlalchemy import select
+
+    table = collection.table
+    query = select(table.c.id, table.c.metadata['fingerprint'].astext)
+    with vx.Session() as session:
+        return {row[0]: row[1] for row in session.execute(query)}
+
+
+def _max_length(values: Sequence[str], minimum: int = 1) -> int:
+    return max([minimum] + [len(value) for value in values])
+
+
+def _normalize(embeddings: np.ndarray, projection: Optional[Projection]) -> np.ndarray:
+    embeddings = embeddings/np.linalg.norm(embeddings, ord=2, axis=-1, keepdims=True)
+    if projection is not None:
+        embeddings = projection.apply(embeddings)
+    return embeddings
+
+
+def encode_batches(
+    model: FashionCLIP,
+    catalog: Catalog,
+    args,
+    projection: Optional[Projection],
+    quarantine: TextIO,
+) -> Iterator[List[Record]]:
+    """Yield one list of records per encoded batch.
+
+    JPEG decode and CLIP preprocessing run in DataLoader worker processes
+    ahead of the forward pass; per-stage throughput is printed at the end.
+    Images that fail to decode or encode are written to ``quarantine`` as
+    ``id<TAB>path<TAB>reason`` lines and left out of the upsert.
+    """
+    loader = make_loader(
+        catalog.paths,
+        model.preprocess,
+        decode_batch_size=args.decode_batch_size,
+        num_workers=args.workers,
+        prefetch_factor=args.prefetch,
+        draft_size=args.draft_size or None,
+    )
+    stats = StageStats(workers=args.workers)
+
+    progress = tqdm(
+        encode_loader(model, loader, args.batch_size, stats),
+        total=-(-len(catalog) // args.batch_size),
+        desc="Processing image batches",
+    )
+    for indices, img_embeddings, failed in progress:
+        for index, reason in failed:
+            print(f"Error processing image {catalog.ids[index]}: {reason}")
+            quarantine.write(f"{catalog.ids[index]}\t{catalog.paths[index]}\t{' '.join(reason.split())}\n")
+        if failed:
+            quarantine.flush()
+        if not indices:
+            continue
+
+        img_embeddings = _normalize(img_embeddings, projection)
+        records = []
+        for index, emb in zip(indices, img_embeddings):
+            records.append((
+                catalog.ids[index],  # the vector's identifier
+                emb,                 # the vector embedding
+                # metadata with category and the fingerprint used for incremental runs
+                {"category": catalog.categories[index], "fingerprint": catalog.fingerprints[index]}
+            ))
+        progress.set_postfix({k: f"{v:.0f}" for k, v in stats.summary().items()})
+        yield records
+
+    print(stats.report())
+
+
+class UpsertWriter:
+    """Background consumer that upserts encoded batches in bounded chunks.
+
+    The encoder thread hands batches over through a bounded queue, so the
+    model keeps encoding while the previous chunk is written. Each chunk is
+    recorded in the manifest only after its upsert returned.
+    """
+
+    def __init__(self, collection, manifest: SeedManifest, chunk_size: int, queue_depth: int):
+        self.collection = collection
+        self.manifest = manifest
+        self.chunk_size = chunk_size
+        self.inserted = 0
+        self.error: Optional[BaseException] = None
+        self._queue: "queue.Queue[Optional[List[Record]]]" = queue.Queue(maxsize=queue_depth)
+        self._thread = threading.Thread(target=self._run, name="seed-upsert", daemon=True)
+        self._thread.start()
+
+    def put(self, records: List[Record]) -> None:
+        if self.error is not None:
+            raise RuntimeError("Database writer failed") from self.error
+        self._queue.put(records)
+
+    def close(self) -> None:
+        self._queue.put(None)
+        self._thread.join()
+        if self.error is not None:
+            raise RuntimeError("Database writer failed") from self.error
+
+    def _flush(self, pending: List[Record]) -> None:
+        self.collection.upsert(records=pending)
+        self.manifest.mark_committed(
+            (record_id, metadata['category'], metadata['fingerprint']) for record_id, _, metadata in pending
+        )
+        self.inserted += len(pending)
+
+    def _run(self) -> None:
+        pending: List[Record] = []
+        finished = False
+        try:
+            while True:
+                records = self._queue.get()
+                if records is None:
+                    finished = True
+                    break
+                pending.extend(records)
+                while len(pending) >= self.chunk_size:
+                    self._flush(pending[:self.chunk_size])
+                    pending = pending[self.chunk_size:]
+            if pending:
+                self._flush(pending)
+        except BaseException as exc:
+            self.error = exc
+            # Keep draining so the producer never blocks on a dead consumer.
+            while not finished:
+                finished = self._queue.get() is None
+
+
+def main():
+    args = parse_args()
+    load_dotenv("../.env.local")
+
+    db_url = os.getenv("DB_URL")
+    if db_url is None:
+        raise ValueError("DB_URL environment variable is not set")
+
+    vx = create_client(db_url)
+
+    # Optional reduced-dimension mode (see fit_projection.py); projected vectors
+    # go to their own collection so the full 512-d index stays untouched.
+    projection_path = os.getenv("PROJECTION_PATH")
+    projection = Projection.load(projection_path) if projection_path else None
+    if projection is None:
+        ec_items = vx.get_or_create_collection(name="ec_item_vectors", dimension=512)
+    else:
+        ec_items = vx.get_or_create_collection(
+            name=f"ec_item_vectors_{projection.dim}", dimension=projection.dim
+        )
+
+    index_config = IndexConfig(
+        method=args.index_method,
+        hnsw_m=args.hnsw_m,
+        hnsw_ef_construction=args.hnsw_ef_construction,
+        ivf_lists=args.ivf_lists,
+        partial_categories=sorted(set(category_map.values())) if args.partial_indexes else (),
+    )
+    # Fail on bad index options before spending an hour embedding.
+    index_config.index_arguments()
+    if args.index_only:
+        build_index(vx, ec_items, index_config)
+        return
+
+    manifest = SeedManifest(args.manifest or f"./seed_manifest_{ec_items.name}.sqlite")
+    if args.restart:
+        manifest.reset()
+
+    catalog = scan_catalog(args.styles, args.images)
+    catalog.fingerprints = np.array(fingerprint_files(catalog.paths, args.fingerprint), dtype=object)
+
+    # Incremental mode trusts what the collection holds; otherwise resume from
+    # the local manifest of what earlier runs committed.
+    removed: List[str] = []
+    if args.incremental:
+        known = fetch_stored_fingerprints(vx, ec_items)
+        catalog_ids = set(catalog.ids)
+        removed = [item_id for item_id in known if item_id not in catalog_ids]
+        for start in range(0, len(removed), args.upsert_chunk):
+            ec_items.delete(ids=removed[start:start + args.upsert_chunk])
+        manifest.remove(removed)
+        print(f"Deleted {len(removed)} vectors for items no longer in the catalog")
+    else:
+        known = manifest.committed()
+
+    if known:
+        stored = np.array([known.get(item_id) for item_id in catalog.ids], dtype=object)
+        remaining = np.flatnonzero(stored != catalog.fingerprints)
+        print(f"Skipping {len(catalog) - len(remaining)} of {len(catalog)} unchanged images")
+        catalog = catalog.take(remaining)
+
+    model = FashionCLIP('fashion-clip')
+
+    snapshot = None
+    if args.snapshot:
+        snapshot = SnapshotWriter(
+            args.snapshot,
+            capacity=len(catalog),
+            dim=ec_items.dimension,
+            dtype=args.snapshot_dtype,
+            collection=ec_items.name,
+            id_width=_max_length(catalog.ids),
+            category_width=_max_length(catalog.categories),
+            fingerprint_width=_max_length(catalog.fingerprints),
+        )
+
+    quarantine_path = args.quarantine or f"./seed_quarantine_{ec_items.name}.tsv"
+    writer = UpsertWriter(ec_items, manifest, args.upsert_chunk, args.queue_depth)
+    try:
+        with open(quarantine_path, "a", encoding="utf-8") as quarantine:
+            for records in encode_batches(model, catalog, args, projection, quarantine):
+                if snapshot is not None:
+                    snapshot.append(records)
+                writer.put(records)
+    except BaseException:
+        # Stop the writer, but let the encode loop's exception propagate
+        # rather than one the writer raises on close.
         try:
-            # Generate embeddings for the batch
-            img_embeddings = model.encode_images(batch_paths, batch_size=len(batch_paths))
-            img_embeddings = img_embeddings/np.linalg.norm(img_embeddings, ord=2, axis=-1, keepdims=True)
-
-            # Add to records list
-            for emb, metadata in zip(img_embeddings, batch_metadata):
-                records.append((
-                    metadata['id'],  # the vector's identifier
-                    emb,            # the vector embedding
-                    {"category": metadata['category']}  # metadata with category
-                ))
-        except Exception as e:
-            print(f"Error processing batch starting at index {i}: {e}")
-            # Process failed batch individually
-            for j, (path, metadata) in enumerate(zip(batch_paths, batch_metadata)):
-                try:
-                    img_emb = model.encode_images([path], batch_size=1)[0]
-                    img_emb = img_emb/np.linalg.norm(img_emb, ord=2, axis=-1, keepdims=True)
-                    records.append((
-                        metadata['id'],
-                        img_emb,
-                        {"category": metadata['category']}
-                    ))
-                except Exception as e2:
-                    print(f"Error processing image {metadata['id']}: {e2}")
-                    continue
-
-# Insert all records into the database
-if records:
-    ec_items.upsert(records=records)
-    print(f"Inserted {len(records)} images")
-else:
-    print("No images to insert")
-
-ec_items.create_index(measure=IndexMeasure.max_inner_product)
-print("Created index")
+            writer.close()
+        except Exception as close_error:
+            print(f"Database writer failed while stopping: {close_error!r}")
+        raise
+    writer.close()
+    if snapshot is not None:
+        snapshot.close()
+        print(f"Wrote {snapshot.count} vectors to snapshot {args.snapshot}")
+
+    if writer.inserted:
+        print(f"Inserted {writer.inserted} images")
+    else:
+        print("No images to insert")
+
+    # Rebuilding the index is the slowest step of a no-op nightly refresh.
+    if writer.inserted or removed or ec_items.index is None:
+        build_index(vx, ec_items, index_config)
+    manifest.close()
+
+
+if __name__ == "__main__":
+    main()
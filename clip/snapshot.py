@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+"""Local snapshots of catalog embeddings.
+
+A snapshot is a directory holding
+
+* ``vectors.npy`` - ``(capacity, dim)`` float32 or float16 matrix, C-contiguous
+  and memory-mappable (``np.load(..., mmap_mode='r')``); only the first
+  ``count`` rows are valid.
+* ``ids.npy`` - ``(capacity,)`` fixed-width unicode vector ids (``"<style>.jpg"``).
+* ``categories.npy`` - ``(capacity,)`` fixed-width unicode categories.
+* ``fingerprints.npy`` - ``(capacity,)`` fixed-width unicode image fingerprints
+  (empty when unknown, e.g. for rows exported from an older collection).
+* ``meta.json`` - ``{"format": "ec-embedding-snapshot", "version": 1, "count",
+  "dim", "dtype", "collection", "normalized", "created_at"}``. It is written
+  last, so a directory without it is an incomplete snapshot.
+
+Rows are L2-normalized (and projected, for ``ec_item_vectors_<dim>``) exactly
+as they are upserted, so row ``i`` is the vector stored under ``ids[i]``.
+
+    python snapshot.py export ./snapshots/ec_item_vectors          # from the database
+    python snapshot.py upsert ./snapshots/ec_item_vectors          # bulk-load into vecs
+    python snapshot.py faiss ./snapshots/ec_item_vectors --out ec_items.faiss
+"""
+import argparse
+import json
+import os
+import time
+from dataclasses import dataclass
+from typing import Iterator, List, Optional, Tuple
+
+import numpy as np
+
+FORMAT = "ec-embedding-snapshot"
+VERSION = 1
+DTYPES = {"float32": np.float32, "float16": np.float16}
+
+# (vector id, embedding, metadata) as accepted by vecs' Collection.upsert
+Record = Tuple[str, np.ndarray, dict]
+
+
+class SnapshotWriter:
+    """Writes records into preallocated memory-mapped arrays.
+
+    ``capacity`` is an upper bound on the row count (the catalog size); rows
+    that were never written stay past ``count`` and are ignored on load.
+    """
+
+    def __init__(self, path: str, capacity: int, dim: int, dtype: str = "float32",
+                 collection: Optional[str] = None, id_width: int = 64, category_width: int = 32,
+                 fingerprint_width: int = 80):
+        if dtype not in DTYPES:
+            raise ValueError(f"Unsupported snapshot dtype: {dtype}")
+        os.makedirs(path, exist_ok=True)
+        meta_path = os.path.join(path, "meta.json")
+        if os.path.exists(meta_path):
+            os.remove(meta_path)
+        self.path = path
+        self.dim = dim
+        self.dtype = dtype
+        self.collection = collection
+        self.count = 0
+        capacity = max(capacity, 1)
+        self._vectors = np.lib.format.open_memmap(
+            os.path.join(path, "vectors.npy"), mode="w+", dtype=DTYPES[dtype], shape=(capacity, dim)
+        )
+        self._ids = self._text_column("ids.npy", capacity, id_width)
+        self._categories = self._text_column("categories.npy", capacity, category_width)
+        # "sha256:<64 hex>" or "stat:<size>:<mtime_ns>"
+        self._fingerprints = self._text_column("fingerprints.npy", capacity, fingerprint_width)
+
+    def _text_column(self, name: str, capacity: int, width: int) -> np.ndarray:
+        return np.lib.format.open_memmap(
+            os.path.join(self.path, name), mode="w+", dtype=f"<U{width}", shape=(capacity,)
+        )
+
+    def append(self, records: List[Record]) -> None:
+        end = self.count + len(records)
+        if end > len(self._ids):
+            raise ValueError(f"Snapshot capacity {len(self._ids)} exceeded.")
+        rows = slice(self.count, end)
+        self._vectors[rows] = np.stack([embedding for _, embedding, _ in records])
+        self._ids[rows] = [record_id for record_id, _, _ in records]
+        self._categories[rows] = [metadata.get("category", "") for _, _, metadata in records]
+        self._fingerprints[rows] = [metadata.get("fingerprint") or "" for _, _, metadata in records]
+        self.count = end
+
+    def close(self) -> None:
+        for array in (self._vectors, self._ids, self._categories, self._fingerprints):
+            array.flush()
+        meta = {
+            "format": FORMAT,
+            "version": VERSION,
+            "count": self.count,
+            "dim": self.dim,
+            "dtype": self.dtype,
+            "collection": self.collection,
+            "normalized": True,
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        }
+        with open(os.path.join(self.path, "meta.json"), "w", encoding="utf-8") as fh:
+            json.dump(meta, fh, indent=2)
+
+
+@dataclass
+class Snapshot:
+    meta: dict
+    vectors: np.ndarray
+    ids: np.ndarray
+    categories: np.ndarray
+    fingerprints: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def records(self, chunk_size: int) -> Iterator[List[Record]]:
+        for start in range(0, len(self), chunk_size):
+            stop = start + chunk_size
+            vectors = np.asarray(self.vectors[start:stop], dtype=np.float32)
+            yield [
+                (str(record_id), vector, {"category": str(category), "fingerprint": str(fingerprint) or None})
+                for record_id, vector, category, fingerprint in zip(
+                    self.ids[start:stop], vectors, self.categories[start:stop], self.fingerprints[start:stop]
+                )
+            ]
+
+
+def load_snapshot(path: str, mmap: bool = True) -> Snapshot:
+    meta_path = os.path.join(path, "meta.json")
+    if not os.path.exists(meta_path):
+        raise FileNotFoundError(f"{path} is not a complete snapshot (missing meta.json).")
+    with open(meta_path, "r", encoding="utf-8") as fh:
+        meta = json.load(fh)
+    if meta.get("format") != FORMAT or meta.get("version") != VERSION:
+        raise ValueError(f"Unsupported snapshot format: {meta.get('format')} v{meta.get('version')}")
+    mode = "r" if mmap else None
+    count = meta["count"]
+
+    def _column(name: str) -> np.ndarray:
+        return np.load(os.path.join(path, name), mmap_mode=mode)[:count]
+
+    return Snapshot(
+        meta=meta,
+        vectors=_column("vectors.npy"),
+        ids=_column("ids.npy"),
+        categories=_column("categories.npy"),
+        fingerprints=_column("fingerprints.npy"),
+    )
+
+
+def upsert_snapshot(collection, snapshot: Snapshot, chunk_size: int = 4096) -> int:
+    inserted = 0
+    for records in snapshot.records(chunk_size):
+        collection.upsert(records=records)
+        inserted += len(records)
+    return inserted
+
+
+def build_faiss_index(snapshot: Snapshot, kind: str = "flat", hnsw_m: int = 32, chunk_size: int = 65536):
+    """Inner-product FAISS index whose row ``i`` is ``snapshot.ids[i]``."""
+    try:
+        import faiss
+    except ImportError as e:
+        raise ImportError("Building a FAISS index requires faiss-cpu (pip install faiss-cpu).") from e
+
+    dim = snapshot.meta["dim"]
+    if kind == "flat":
+        index = faiss.IndexFlatIP(dim)
+    elif kind == "hnsw":
+        index = faiss.IndexHNSWFlat(dim, hnsw_m, faiss.METRIC_INNER_PRODUCT)
+    else:
+        raise ValueError(f"Unsupported FAISS index kind: {kind}")
+    for start in range(0, len(snapshot), chunk_size):
+        index.add(np.ascontiguousarray(snapshot.vectors[start:start + chunk_size], dtype=np.float32))
+    return index
+
+
+def export_collection(vx, collection, path: str, dtype: str = "float32", chunk_size: int = 4096) -> int:
+    """Write every vector currently stored in ``collection`` to a snapshot."""
+    from sqlalchemy import func, select
+
+    table = collection.table
+    with vx.Session() as session:
+        total = session.execute(select(func.count()).select_from(table)).scalar()
+    writer = SnapshotWriter(path, capacity=total, dim=collection.dimension, dtype=dtype, collection=collection.name)
+    query = select(
+        table.c.id, table.c.vec, table.c.metadata['category'].astext, table.c.metadata['fingerprint'].astext
+    ).order_by(table.c.id)
+    with vx.Session() as session:
+        result = session.execute(query.execution_options(yield_per=chunk_size))
+        for rows in result.partitions(chunk_size):
+            writer.append([
+                (record_id, np.asarray(vec, dtype=np.float32), {"category": category, "fingerprint": fingerprint})
+                for record_id, vec, category, fingerprint in rows
+            ])
+    writer.close()
+    return writer.count
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export, bulk-load or index local embedding snapshots.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    export = commands.add_parser("export", help="Snapshot a vecs collection.")
+    export.add_argument("path")
+    export.add_argument("--collection", default="ec_item_vectors")
+    export.add_argument("--dtype", choices=list(DTYPES), default="float32")
+    upsert = commands.add_parser("upsert", help="Bulk-upsert a snapshot into its (or another) collection.")
+    upsert.add_argument("path")
+    upsert.add_argument("--collection", default=None, help="Target collection (default: the snapshot's).")
+    upsert.add_argument("--chunk", type=int, default=4096)
+    index = commands.add_parser("faiss", help="Build a FAISS inner-product index from a snapshot.")
+    index.add_argument("path")
+    index.add_argument("--out", required=True)
+    index.add_argument("--kind", choices=["flat", "hnsw"], default="flat")
+    index.add_argument("--hnsw-m", type=int, default=32)
+    args = parser.parse_args()
+
+    if args.command == "faiss":
+        import faiss
+
+        snapshot = load_snapshot(args.path)
+        started = time.perf_counter()
+        faiss.write_index(build_faiss_index(snapshot, args.kind, args.hnsw_m), args.out)
+        print(f"Indexed {len(snapshot)} vectors in {time.perf_counter() - started:.1f}s -> {args.out}")
+        return
+
+    from dotenv import load_dotenv
+    from vecs import create_client
+
+    load_dotenv("../.env.local")
+    db_url = os.getenv("DB_URL")
+    if db_url is None:
+        raise ValueError("DB_URL environment variable is not set")
+    vx = create_client(db_url)
+
+    started = time.perf_counter()
+    if args.command == "export":
+        collection = vx.get_collection(name=args.collection)
+        count = export_collection(vx, collection, args.path, args.dtype)
+        print(f"Exported {count} vectors in {time.perf_counter() - started:.1f}s -> {args.path}")
+    else:
+        snapshot = load_snapshot(args.path)
+        name = args.collection or snapshot.meta.get("collection") or "ec_item_vectors"
+        collection = vx.get_or_create_collection(name=name, dimension=snapshot.meta["dim"])
+        count = upsert_snapshot(collection, snapshot, args.chunk)
+        print(f"Upserted {count} vectors into {name} in {time.perf_counter() - started:.1f}s; "
+              f"rebuild the index with `python seed.py --index-only`")
+
+
+if __name__ == "__main__":
+    main()
@@ -6,7 +6,7 @@ import sys
 from pathlib import Path
 from typing import Iterable, List, Optional
 from urllib import error, request
-from urllib.parse import parse_qsl, urlencode, urlparse, urlunparse
+from urllib.parse import urlparse, urlunparse
 
 
 DEFAULT_EMBEDDINGS_FILE = Path(__file__).resolve().parent / "sample_embeddings.json"
@@ -79,16 +79,12 @@ def build_payload(
     return payload
 
 
-def _attach_query(url: str, params: dict) -> str:
+def _batch_url(url: str) -> str:
     parsed = urlparse(url)
-    query = dict(parse_qsl(parsed.query))
-    query.update({k: str(v) for k, v in params.items() if v is not None})
-    new_query = urlencode(query)
-    return urlunparse(parsed._replace(query=new_query))
+    return urlunparse(parsed._replace(path=parsed.path.rstrip("/") + "/batch"))
 
 
-def post_json(url: str, payload: dict, *, batch_repeat: int) -> dict:
-    url = _attach_query(url, {"batch_repeat": batch_repeat})
+def post_json(url: str, payload: dict) -> dict:
     data = json.dumps(payload).encode("utf-8")
     headers = {"Content-Type": "application/json"}
     req = request.Request(url=url, data=data, headers=headers, method="POST")
@@ -135,11 +131,13 @@ def parse_args() -> argparse.Namespace:
         help="Optional description for each embedding. Repeat per embedding.",
     )
     parser.add_argument(
-        "--batch-repeat",
-        dest="batch_repeat",
+        "--repeat",
         type=int,
         default=1,
-        help="Duplicate the payload this many times before sending it to the API.",
+        help=(
+            "Send the outfit this many times in one request to the /batch variant of --url "
+            "(e.g. /compatibility/batch)."
+        ),
     )
     return parser.parse_args()
 
@@ -159,8 +157,13 @@ def main() -> None:
         print(f"[Error] {exc}", file=sys.stderr)
         sys.exit(1)
 
+    url = args.url
+    if args.repeat > 1:
+        url = _batch_url(args.url)
+        payload = {"outfits": [payload] * args.repeat}
+
     try:
-        response = post_json(args.url, payload, batch_repeat=args.batch_repeat)
+        response = post_json(url, payload)
     except Exception as exc:  # pragma: no cover - network error surfaces to user
         print(f"[Error] Failed to call API: {exc}", file=sys.stderr)
         sys.exit(2)
@@ -0,0 +1,345 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import re
+import shutil
+import threading
+from collections import OrderedDict
+from concurrent.futures import Executor, ThreadPoolExecutor
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from numpy.lib.format import open_memmap
+
+from .score_cache import embedding_digest
+
+logger = logging.getLogger("outfit_compatibility_api")
+
+# (item id, category, prepared float32 embedding)
+ClosetEntry = Tuple[str, str, np.ndarray]
+
+_SAFE_USER_ID = re.compile(r"^[A-Za-z0-9_-]{1,128}$")
+
+
+class UserCloset:
+    """One user's closet: an id -> row index over one contiguous float32 matrix.
+
+    Rows ``[0, len(self))`` are live. Deleting an item moves the last row
+    into its slot, so the matrix stays dense and gathers stay cheap. With
+    ``path`` the matrix is a memory-mapped ``vectors.npy`` (capacity grown by
+    doubling) and ids, categories and row digests are kept in
+    ``items.json``, replaced atomically after every change. Saves run on
+    ``persist`` when given; a burst of changes is written once. On load, rows
+    whose digest no longer matches (a write interrupted by a crash) are
+    dropped; clients re-upload them like any other unknown item.
+    """
+
+    def __init__(
+        self,
+        dim: int,
+        path: Optional[str] = None,
+        capacity: int = 64,
+        persist: Optional[Executor] = None,
+    ):
+        self.dim = dim
+        self.path = path
+        self.persist = persist
+        self.ids: List[str] = []
+        self.categories: List[str] = []
+        self.digests: List[bytes] = []
+        self.index: Dict[str, int] = {}
+        self._save_lock = threading.Lock()
+        self._pending_meta: Optional[dict] = None
+        self.vectors = self._allocate(max(capacity, 1))
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @classmethod
+    def open(cls, path: str, persist: Optional[Executor] = None) -> "UserCloset":
+        with open(os.path.join(path, "items.json"), "r", encoding="utf-8") as handle:
+            meta = json.load(handle)
+        closet = cls.__new__(cls)
+        closet.dim = int(meta["dim"])
+        closet.path = path
+        closet.persist = persist
+        closet._save_lock = threading.Lock()
+        closet._pending_meta = None
+        closet.vectors = open_memmap(os.path.join(path, "vectors.npy"), mode="r+")
+        closet.ids, closet.categories, closet.digests, closet.index = [], [], [], {}
+
+        keep: List[int] = []
+        for row, (item_id, category, digest) in enumerate(zip(meta["ids"], meta["categories"], meta["digests"])):
+            if row < closet.vectors.shape[0] and embedding_digest(closet.vectors[row]).hex() == digest:
+                keep.append(row)
+                closet.index[item_id] = len(closet.ids)
+                closet.ids.append(item_id)
+                closet.categories.append(category)
+                closet.digests.append(bytes.fromhex(digest))
+        if len(keep) != len(meta["ids"]):
+            logger.warning(
+                "Dropped %d closet rows with mismatched digests from %s",
+                len(meta["ids"]) - len(keep), path,
+            )
+            closet.vectors[:len(keep)] = closet.vectors[keep]
+            closet._write(closet._snapshot())
+        return closet
+
+    def _allocate(self, capacity: int) -> np.ndarray:
+        if self.path is None:
+            return np.empty((capacity, self.dim), dtype=np.float32)
+        os.makedirs(self.path, exist_ok=True)
+        tmp_path = os.path.join(self.path, "vectors.npy.tmp")
+        vectors = open_memmap(tmp_path, mode="w+", dtype=np.float32, shape=(capacity, self.dim))
+        if len(self.ids):
+            vectors[:len(self.ids)] = self.vectors[:len(self.ids)]
+        vectors.flush()
+        os.replace(tmp_path, os.path.join(self.path, "vectors.npy"))
+        return vectors
+
+    def _reserve(self, size: int) -> None:
+        capacity = self.vectors.shape[0]
+        if size <= capacity:
+            return
+        while capacity < size:
+            capacity *= 2
+        self.vectors = self._allocate(capacity)
+
+    def _snapshot(self) -> dict:
+        return {
+            "dim": self.dim,
+            "ids": list(self.ids),
+            "categories": list(self.categories),
+            "digests": [digest.hex() for digest in self.digests],
+        }
+
+    def _save(self) -> None:
+        if self.path is None:
+            return
+        meta = self._snapshot()
+        if self.persist is None:
+            self._write(meta)
+            return
+        with self._save_lock:
+            scheduled = self._pending_meta is not None
+            self._pending_meta = meta
+        if not scheduled:
+            self.persist.submit(self._write_pending).add_done_callback(_log_save_error)
+
+    def _write_pending(self) -> None:
+        with self._save_lock:
+            meta, self._pending_meta = self._pending_meta, None
+        if meta is not None:
+            self._write(meta)
+
+    def _write(self, meta: dict) -> None:
+        self.vectors.flush()
+        tmp_path = os.path.join(self.path, "items.json.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as handle:
+            json.dump(meta, handle)
+        os.replace(tmp_path, os.path.join(self.path, "items.json"))
+
+    def upsert(self, entries: Sequence[ClosetEntry]) -> int:
+        """Insert or overwrite items; returns how many already existed."""
+        for _, _, embedding in entries:
+            if embedding.shape != (self.dim,):
+                raise ValueError(f"Embedding dimension {embedding.shape[-1]} does not match the closet's {self.dim}.")
+        new_ids = {item_id for item_id, _, _ in entries if item_id not in self.index}
+        self._reserve(len(self.ids) + len(new_ids))
+
+        replaced = 0
+        for item_id, category, embedding in entries:
+            row = self.index.get(item_id)
+            if row is None:
+                row = len(self.ids)
+                self.index[item_id] = row
+                self.ids.append(item_id)
+                self.categories.append(category)
+                self.digests.append(b"")
+            else:
+                replaced += 1
+                self.categories[row] = category
+            self.vectors[row] = embedding
+            self.digests[row] = embedding_digest(embedding)
+        self._save()
+        return replaced
+
+    def delete(self, item_ids: Sequence[str]) -> List[str]:
+        """Remove items; returns the ids that were present."""
+        removed = []
+        for item_id in item_ids:
+            row = self.index.pop(item_id, None)
+            if row is None:
+                continue
+            last = len(self.ids) - 1
+            if row != last:
+                self.vectors[row] = self.vectors[last]
+                self.ids[row] = self.ids[last]
+                self.categories[row] = self.categories[last]
+                self.digests[row] = self.digests[last]
+                self.index[self.ids[row]] = row
+            self.ids.pop()
+            self.categories.pop()
+            self.digests.pop()
+            removed.append(item_id)
+        if removed:
+            self._save()
+        return removed
+
+    def missing(self, item_ids: Sequence[str]) -> List[str]:
+        return [item_id for item_id in item_ids if item_id not in self.index]
+
+    def gather(self, item_ids: Sequence[str]) -> np.ndarray:
+        """Copy of the embeddings of ``item_ids``, safe to use after later writes."""
+        rows = np.fromiter((self.index[item_id] for item_id in item_ids), dtype=np.int64, count=len(item_ids))
+        return np.asarray(self.vectors[rows], dtype=np.float32)
+
+    def close(self) -> None:
+        """Write any pending save and release the memory map."""
+        if self.path is not None:
+            self._write_pending()
+            self.vectors.flush()
+        del self.vectors
+
+    def destroy(self) -> None:
+        with self._save_lock:
+            self._pending_meta = None
+        del self.vectors
+        if self.path is not None:
+            shutil.rmtree(self.path, ignore_errors=True)
+
+
+def _log_save_error(future) -> None:
+    exc = future.exception()
+    if exc is not None:
+        logger.error("Failed to persist closet", exc_info=exc)
+
+
+class ClosetStore:
+    """Closets of all users, optionally persisted one directory per user
+    under ``root``.
+
+    At most ``max_loaded`` closets are kept in memory; the least recently
+    used one is closed when another is loaded. Persisted closets are loaded
+    again from disk on their next use; without ``root`` an evicted closet is
+    gone and its owner gets 409s until the items are uploaded again. All
+    file I/O except growing a matrix runs on one background thread, in
+    order. Only used from the event loop, hence no locking.
+    """
+
+    def __init__(self, root: Optional[str] = None, max_items_per_user: int = 10_000, max_loaded: int = 1024):
+        self.root = root
+        self.max_items_per_user = max_items_per_user
+        self.max_loaded = max_loaded
+        self.evictions = 0
+        self._closets: "OrderedDict[str, UserCloset]" = OrderedDict()
+        self._loading: Dict[str, "asyncio.Future[Optional[UserCloset]]"] = {}
+        self._persist = (
+            ThreadPoolExecutor(max_workers=1, thread_name_prefix="closet-store") if root is not None else None
+        )
+
+    def _path(self, user_id: str) -> Optional[str]:
+        if self.root is None:
+            return None
+        if _SAFE_USER_ID.match(user_id):
+            name = user_id
+        else:
+            name = "sha256-" + hashlib.sha256(user_id.encode("utf-8")).hexdigest()
+        return os.path.join(self.root, name)
+
+    def _open(self, path: str) -> Optional[UserCloset]:
+        if not os.path.isfile(os.path.join(path, "items.json")):
+            return None
+        return UserCloset.open(path, self._persist)
+
+    def _add(self, user_id: str, closet: UserCloset) -> None:
+        self._closets[user_id] = closet
+        while len(self._closets) > self.max_loaded:
+            _, evicted = self._closets.popitem(last=False)
+            self.evictions += 1
+            if self._persist is not None:
+                # Queued behind the closet's pending saves.
+                self._persist.submit(evicted.close).add_done_callback(_log_save_error)
+
+    async def get(self, user_id: str) -> Optional[UserCloset]:
+        closet = self._closets.get(user_id)
+        if closet is not None:
+            self._closets.move_to_end(user_id)
+            return closet
+        path = self._path(user_id)
+        if path is None:
+            return None
+
+        loading = self._loading.get(user_id)
+        if loading is not None:
+            return await asyncio.shield(loading)
+        loading = asyncio.get_running_loop().run_in_executor(self._persist, self._open, path)
+        self._loading[user_id] = loading
+        try:
+            closet = await asyncio.shield(loading)
+        finally:
+            del self._loading[user_id]
+        if closet is not None and user_id not in self._closets:
+            self._add(user_id, closet)
+        return self._closets.get(user_id, closet)
+
+    async def upsert(
+        self,
+        user_id: str,
+        entries: Sequence[ClosetEntry],
+        retain_ids: Optional[Sequence[str]] = None,
+    ) -> Tuple[UserCloset, int, int]:
+        """Upsert into the user's closet, creating it on first use.
+
+        With ``retain_ids``, stored items that are neither upserted nor
+        listed there are deleted first. Returns the closet and the number of
+        replaced and pruned items.
+        """
+        closet = await self.get(user_id)
+        # Validate everything before touching the closet, so a rejected
+        # request neither prunes items nor leaves an empty closet behind.
+        dim = closet.dim if closet is not None else entries[0][2].shape[0]
+        for item_id, _, embedding in entries:
+            if embedding.shape != (dim,):
+                raise ValueError(f"Embedding of item {item_id} has dimension {embedding.shape[-1]}; expected {dim}.")
+        stored = closet.index if closet is not None else {}
+        stale: List[str] = []
+        if closet is not None and retain_ids is not None:
+            keep = set(retain_ids).union(item_id for item_id, _, _ in entries)
+            stale = [item_id for item_id in closet.ids if item_id not in keep]
+        new_items = len({item_id for item_id, _, _ in entries if item_id not in stored})
+        if len(stored) - len(stale) + new_items > self.max_items_per_user:
+            raise ValueError(f"A closet can hold at most {self.max_items_per_user} items.")
+
+        if closet is None:
+            closet = UserCloset(dim=dim, path=self._path(user_id), capacity=len(entries), persist=self._persist)
+            self._add(user_id, closet)
+        pruned = len(closet.delete(stale))
+        return closet, closet.upsert(entries), pruned
+
+    async def drop(self, user_id: str) -> bool:
+        closet = await self.get(user_id)
+        if closet is None:
+            return False
+        self._closets.pop(user_id, None)
+        if self._persist is not None:
+            await asyncio.get_running_loop().run_in_executor(self._persist, closet.destroy)
+        return True
+
+    def close(self) -> None:
+        if self._persist is not None:
+            for closet in self._closets.values():
+                self._persist.submit(closet.close).add_done_callback(_log_save_error)
+            self._closets.clear()
+            self._persist.shutdown(wait=True)
+
+    def metrics(self) -> Dict[str, object]:
+        return {
+            "users_loaded": len(self._closets),
+            "max_loaded": self.max_loaded,
+            "evictions": self.evictions,
+            "items_loaded": sum(len(closet) for closet in self._closets.values()),
+            "persistent": self.root is not None,
+        }
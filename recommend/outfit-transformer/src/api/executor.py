@@ -0,0 +1,107 @@
+import asyncio
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+logger = logging.getLogger("outfit_compatibility_api")
+
+
+class QueueFullError(RuntimeError):
+    """Raised when the service is saturated and a request must be rejected."""
+
+
+def _configure_torch_threads(intra_op_threads: Optional[int]) -> None:
+    if not intra_op_threads:
+        return
+    import torch
+
+    torch.set_num_threads(intra_op_threads)
+
+
+def _configure_interop_threads(inter_op_threads: Optional[int]) -> None:
+    if not inter_op_threads:
+        return
+    import torch
+
+    try:
+        torch.set_num_interop_threads(inter_op_threads)
+    except RuntimeError:
+        # Only allowed once per process, before any inter-op work has started.
+        logger.warning("Could not set torch inter-op threads to %d; already initialized.", inter_op_threads)
+
+
+class InferenceExecutor:
+    """Bounded thread pool that keeps blocking model work off the event loop.
+
+    PyTorch releases the GIL inside its kernels, so a small thread pool is
+    enough to overlap inference with request handling. ``max_pending`` caps
+    the number of jobs queued or running; once reached, ``run`` raises
+    ``QueueFullError`` instead of letting latency grow without limit.
+    """
+
+    def __init__(
+        self,
+        max_workers: int = 1,
+        max_pending: int = 64,
+        intra_op_threads: Optional[int] = None,
+        inter_op_threads: Optional[int] = None,
+    ):
+        if max_workers < 1:
+            raise ValueError("max_workers must be >= 1.")
+        if max_pending < 1:
+            raise ValueError("max_pending must be >= 1.")
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.intra_op_threads = intra_op_threads
+        self.inter_op_threads = inter_op_threads
+        _configure_interop_threads(inter_op_threads)
+        self._pool = ThreadPoolExecutor(
+            max_workers=max_workers,
+            thread_name_prefix="outfit-inference",
+            initializer=_configure_torch_threads,
+            initargs=(intra_op_threads,),
+        )
+        self._lock = threading.Lock()
+        self._pending = 0
+        self.rejected_total = 0
+
+    @property
+    def pending(self) -> int:
+        return self._pending
+
+    def _acquire(self) -> None:
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self.rejected_total += 1
+                raise QueueFullError("Inference queue is full.")
+            self._pending += 1
+
+    def _release(self) -> None:
+        with self._lock:
+            self._pending -= 1
+
+    async def run(self, fn: Callable[..., Any], *args: Any) -> Any:
+        self._acquire()
+        try:
+            future = self._pool.submit(fn, *args)
+        except BaseException:
+            self._release()
+            raise
+        # Released when the job finishes, not when the caller stops waiting:
+        # a cancelled request leaves its job running on a worker.
+        future.add_done_callback(lambda _: self._release())
+        return await asyncio.wrap_future(future)
+
+    def shutdown(self) -> None:
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+    def metrics(self) -> Dict[str, int]:
+        return {
+            "workers": self.max_workers,
+            "intra_op_threads": self.intra_op_threads or 0,
+            "inter_op_threads": self.inter_op_threads or 0,
+            "pending": self._pending,
+            "max_pending": self.max_pending,
+            "rejected_total": self.rejected_total,
+        }
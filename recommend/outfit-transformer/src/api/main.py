@@ -1,28 +1,77 @@
+import asyncio
+import hashlib
 import logging
 import os
+from contextlib import asynccontextmanager
 from pathlib import Path
-from typing import Dict, List, Optional
+from typing import Dict, Iterable, List, Optional
 
 import numpy as np
 import torch
-from fastapi import FastAPI, HTTPException
+from fastapi import Depends, FastAPI, HTTPException, Response
+from fastapi.responses import JSONResponse
 from pydantic import BaseModel, Field, validator
 
+from ..data.bucketing import run_bucketed
 from ..data.datatypes import FashionCompatibilityQuery, FashionItem
 from ..models.load import load_model
+from .closet_store import ClosetEntry, ClosetStore, UserCloset
+from .executor import InferenceExecutor, QueueFullError
+from .lifecycle import Lifecycle
+from .scheduler import ScoreResult, ScoringScheduler
+from .score_cache import OutfitScoreCache, embedding_digest
+from .singleflight import SingleFlight
 
 DEFAULT_CHECKPOINT = (
     Path(__file__).resolve().parents[2]
     / "checkpoints"
     / "compatibillity_clip_best.pth"
 )
-MAX_BATCH_REPEAT = int(os.environ.get("OUTFIT_MAX_BATCH_REPEAT", "1024"))
+MAX_BATCH_OUTFITS = int(os.environ.get("OUTFIT_MAX_BATCH_OUTFITS", "1024"))
+# Outfits per predict_score call; larger requests are scored in several passes.
+MAX_FORWARD_BATCH = int(os.environ.get("OUTFIT_MAX_FORWARD_BATCH", "256"))
+# Cross-request batching: outfits from concurrent requests share forward passes
+# of at most MAX_FORWARD_BATCH outfits and OUTFIT_MAX_BATCH_TOKENS padded tokens.
+MAX_BATCH_TOKENS = int(os.environ.get("OUTFIT_MAX_BATCH_TOKENS", "4096"))
+MAX_BATCH_WAIT_MS = float(os.environ.get("OUTFIT_MAX_BATCH_WAIT_MS", "5"))
+# A scheduled batch is split into forward passes of similar outfit length so
+# that no pass pads more than this fraction of its positions (empty disables).
+BUCKET_MAX_PADDING = float(os.environ.get("OUTFIT_BUCKET_MAX_PADDING", "0.25") or "1")
+# Outfits allowed to wait for a batch before new requests get 503.
+MAX_QUEUED_OUTFITS = int(os.environ.get("OUTFIT_MAX_QUEUED_OUTFITS", "8192"))
+# Threads running forward passes; the scheduler keeps one batch in flight per thread.
+INFERENCE_WORKERS = int(os.environ.get("OUTFIT_INFERENCE_WORKERS", "1"))
+TORCH_THREADS = int(os.environ.get("OUTFIT_TORCH_THREADS", "0")) or None
+TORCH_INTEROP_THREADS = int(os.environ.get("OUTFIT_TORCH_INTEROP_THREADS", "0")) or None
+SCORE_CACHE_SIZE = int(os.environ.get("OUTFIT_SCORE_CACHE_SIZE", "100000"))
+SCORE_CACHE_TTL_S = float(os.environ.get("OUTFIT_SCORE_CACHE_TTL_S", "3600"))
+# Server-side closets; empty keeps them in memory only.
+CLOSET_STORE_DIR = os.environ.get("OUTFIT_CLOSET_STORE_DIR") or None
+MAX_CLOSET_ITEMS = int(os.environ.get("OUTFIT_MAX_CLOSET_ITEMS", "10000"))
+# Closets kept in memory; the least recently used is closed (and reloaded from
+# OUTFIT_CLOSET_STORE_DIR, or re-uploaded by the client, on next use).
+MAX_LOADED_CLOSETS = int(os.environ.get("OUTFIT_MAX_LOADED_CLOSETS", "1024"))
+WARMUP_BATCH_SIZES = [
+    int(size) for size in os.environ.get("OUTFIT_WARMUP_BATCH_SIZES", "1,64").split(",") if size.strip()
+]
+WARMUP_OUTFIT_LENGTHS = [
+    int(length) for length in os.environ.get("OUTFIT_WARMUP_LENGTHS", "2,4,8").split(",") if length.strip()
+]
+
+logger = logging.getLogger("outfit_compatibility_api")
+
+
+def _checkpoint_path() -> str:
+    return os.environ.get("OUTFIT_MODEL_CHECKPOINT", str(DEFAULT_CHECKPOINT))
+
+
+def _checkpoint_id(checkpoint_path: str) -> str:
+    stat = os.stat(checkpoint_path)
+    return f"{os.path.abspath(checkpoint_path)}:{stat.st_size}:{stat.st_mtime_ns}"
 
 
 def _load_model() -> torch.nn.Module:
-    checkpoint_path = os.environ.get(
-        "OUTFIT_MODEL_CHECKPOINT", str(DEFAULT_CHECKPOINT)
-    )
+    checkpoint_path = _checkpoint_path()
     if not os.path.isfile(checkpoint_path):
         raise RuntimeError(
             "Checkpoint file not found. Provide a valid path via OUTFIT_MODEL_CHECKPOINT."
@@ -35,14 +84,42 @@ def _load_model() -> torch.nn.Module:
     return model
 
 
-try:
-    model = _load_model()
+# Populated by the lifespan startup task; scoring endpoints answer 503 until then.
+model: Optional[torch.nn.Module] = None
+MODEL_EMBED_DIM: Optional[int] = None
+HALF_MODEL_EMBED_DIM: Optional[int] = None
+lifecycle = Lifecycle(logger)
+score_cache = OutfitScoreCache(max_entries=SCORE_CACHE_SIZE, ttl_s=SCORE_CACHE_TTL_S)
+closet_store = ClosetStore(
+    root=CLOSET_STORE_DIR, max_items_per_user=MAX_CLOSET_ITEMS, max_loaded=MAX_LOADED_CLOSETS
+)
+
+
+def _load_and_warm_up() -> None:
+    global model, MODEL_EMBED_DIM, HALF_MODEL_EMBED_DIM
+
+    with lifecycle.phase("load_model"):
+        try:
+            model = _load_model()
+        except Exception as exc:  # pragma: no cover
+            raise RuntimeError("Failed to initialize compatibility model") from exc
+    score_cache.checkpoint_id = _checkpoint_id(_checkpoint_path())
     MODEL_EMBED_DIM = getattr(model.item_enc, "d_embed", None)
     HALF_MODEL_EMBED_DIM = (
         MODEL_EMBED_DIM // 2 if isinstance(MODEL_EMBED_DIM, int) and MODEL_EMBED_DIM % 2 == 0 else None
     )
-except Exception as exc:  # pragma: no cover
-    raise RuntimeError("Failed to initialize compatibility model") from exc
+
+    # Score synthetic outfits at the expected batch sizes and lengths so lazy
+    # CUDA/MKL initialization and allocator growth happen before traffic.
+    with lifecycle.phase("warmup"):
+        rng = np.random.default_rng(0)
+        for batch_size in WARMUP_BATCH_SIZES:
+            for length in WARMUP_OUTFIT_LENGTHS:
+                outfit = [
+                    FashionItem(embedding=rng.standard_normal(MODEL_EMBED_DIM).astype(np.float32))
+                    for _ in range(length)
+                ]
+                _predict_scores([FashionCompatibilityQuery(outfit=outfit)] * batch_size)
 
 
 def _prepare_embedding(vector: List[float]) -> np.ndarray:
@@ -72,6 +149,44 @@ def _prepare_embedding(vector: List[float]) -> np.ndarray:
     return emb_array
 
 
+def _payload_key(kind: str, parts: Iterable[bytes]) -> str:
+    """Hash a canonical, already-validated payload for request coalescing."""
+    digest = hashlib.sha256(kind.encode("utf-8"))
+    for part in parts:
+        digest.update(len(part).to_bytes(8, "little"))
+        digest.update(part)
+    return digest.hexdigest()
+
+
+def _predict_scores(queries: List[FashionCompatibilityQuery]) -> List[float]:
+    with torch.no_grad():
+        scores_tensor = run_bucketed(
+            lambda bucket: model.predict_score(bucket, use_precomputed_embedding=True),
+            queries,
+            batch_size=MAX_FORWARD_BATCH,
+            max_padding=BUCKET_MAX_PADDING,
+        )
+    return scores_tensor.detach().cpu().view(-1).tolist()
+
+
+def _build_outfit(payload: "OutfitEmbeddingsRequest", label: str = "") -> List[FashionItem]:
+    descriptions = payload.descriptions or [f"item_{idx}" for idx in range(len(payload.embeddings))]
+
+    items = []
+    for embedding, description in zip(payload.embeddings, descriptions):
+        try:
+            emb_array = _prepare_embedding(embedding)
+        except ValueError as exc:
+            raise HTTPException(status_code=400, detail=f"{label}{exc}") from exc
+
+        items.append(FashionItem(description=description, embedding=emb_array))
+    return items
+
+
+def _outfit_key_parts(items: List[FashionItem]) -> List[bytes]:
+    return [item.description.encode("utf-8") + item.embedding.tobytes() for item in items]
+
+
 class OutfitEmbeddingsRequest(BaseModel):
     embeddings: List[List[float]] = Field(
         ..., description="List of CLIP embeddings, one per outfit item"
@@ -124,6 +239,26 @@ class CompatibilityResponse(BaseModel):
     )
 
 
+class CompatibilityBatchRequest(BaseModel):
+    outfits: List[OutfitEmbeddingsRequest] = Field(
+        ..., description="Outfits to score; each is scored independently.", min_items=1
+    )
+
+    @validator("outfits")
+    def _validate_outfits(
+        cls, outfits: List[OutfitEmbeddingsRequest]
+    ) -> List[OutfitEmbeddingsRequest]:
+        if len(outfits) > MAX_BATCH_OUTFITS:
+            raise ValueError(f"At most {MAX_BATCH_OUTFITS} outfits can be scored per request.")
+        return outfits
+
+
+class CompatibilityBatchResponse(BaseModel):
+    scores: List[float] = Field(
+        ..., description="Compatibility score of each outfit, in request order."
+    )
+
+
 class ClosetItem(BaseModel):
     id: str = Field(..., description="Unique identifier of the closet item.")
     category: str = Field(..., description="Category of the closet item.")
@@ -164,6 +299,27 @@ class SuggestImprovementRequest(BaseModel):
         ..., description="All closet items available to the user.", min_items=1
     )
 
+    user_id: Optional[str] = Field(
+        default=None,
+        description="Owner of the closet; scopes cached scores so they can be invalidated per user.",
+    )
+
+    @validator("selected_item_ids")
+    def _validate_selected_ids(cls, value: List[str]) -> List[str]:
+        if any(not item_id for item_id in value):
+            raise ValueError("selected_item_ids must not contain empty strings.")
+        return value
+
+
+class StoredSuggestImprovementRequest(BaseModel):
+    selected_item_ids: List[str] = Field(
+        ..., description="Ordered list of item ids selected by the user.", min_items=1
+    )
+    candidate_item_ids: Optional[List[str]] = Field(
+        default=None,
+        description="Stored items that may replace a selected item; defaults to the whole stored closet.",
+    )
+
     @validator("selected_item_ids")
     def _validate_selected_ids(cls, value: List[str]) -> List[str]:
         if any(not item_id for item_id in value):
@@ -171,6 +327,23 @@ class SuggestImprovementRequest(BaseModel):
         return value
 
 
+class ClosetUpsertRequest(BaseModel):
+    items: List[ClosetItem] = Field(
+        ..., description="Closet items to insert or overwrite.", min_items=1
+    )
+    retain_item_ids: Optional[List[str]] = Field(
+        default=None,
+        description="All ids the user still owns; stored items missing from it and from items are deleted.",
+    )
+
+
+class ClosetUpsertResponse(BaseModel):
+    upserted: int = Field(..., description="Number of items written.")
+    replaced: int = Field(..., description="How many of them overwrote an existing item.")
+    pruned: int = Field(..., description="Stored items deleted because retain_item_ids omitted them.")
+    size: int = Field(..., description="Number of items in the stored closet afterwards.")
+
+
 class SuggestImprovementResponse(BaseModel):
     improved: bool = Field(
         ..., description="Whether a better outfit than the original selection was found."
@@ -187,103 +360,137 @@ class SuggestImprovementResponse(BaseModel):
     )
 
 
-logger = logging.getLogger("outfit_compatibility_api")
+async def _startup() -> None:
+    try:
+        with lifecycle.phase("total"):
+            await executor.run(_load_and_warm_up)
+    except Exception as exc:
+        lifecycle.fail(exc)
+        return
+    lifecycle.ready = True
 
 
-app = FastAPI(title="Outfit Compatibility API", version="0.1.0")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    startup_task = asyncio.create_task(_startup())
+    try:
+        yield
+    finally:
+        startup_task.cancel()
+        await scheduler.close()
+        executor.shutdown()
+        closet_store.close()
 
 
-@app.post("/compatibility", response_model=CompatibilityResponse)
-async def predict_compatibility(
-    payload: OutfitEmbeddingsRequest,
-    batch_repeat: int = 1,
-) -> CompatibilityResponse:
-    if batch_repeat < 1:
-        raise HTTPException(status_code=400, detail="batch_repeat must be >= 1.")
-    if batch_repeat > MAX_BATCH_REPEAT:
+def _require_ready() -> None:
+    if not lifecycle.ready:
         raise HTTPException(
-            status_code=400,
-            detail=f"batch_repeat must be <= {MAX_BATCH_REPEAT}.",
+            status_code=503, detail="Model is not ready.", headers={"Retry-After": "5"}
         )
 
-    descriptions = payload.descriptions or [f"item_{idx}" for idx in range(len(payload.embeddings))]
-
-    items = []
-    for embedding, description in zip(payload.embeddings, descriptions):
-        try:
-            emb_array = _prepare_embedding(embedding)
-        except ValueError as exc:
-            raise HTTPException(status_code=400, detail=str(exc)) from exc
 
-        items.append(FashionItem(description=description, embedding=emb_array))
-
-    query = FashionCompatibilityQuery(outfit=items)
-    queries = [query.copy(deep=True) for _ in range(batch_repeat)]
-
-    try:
-        with torch.no_grad():
-            score_tensor = model.predict_score(
-                queries, use_precomputed_embedding=True
-            )
-    except Exception as exc:  # pragma: no cover - surfaced via API response
-        logger.exception("Model inference failed")
-        raise HTTPException(status_code=500, detail=f"Model inference failed: {exc}") from exc
+app = FastAPI(title="Outfit Compatibility API", version="0.1.0", lifespan=lifespan)
+inflight = SingleFlight()
+# Model work runs here, never on the event loop, so probes stay responsive
+# during long forward passes.
+executor = InferenceExecutor(
+    max_workers=INFERENCE_WORKERS,
+    intra_op_threads=TORCH_THREADS,
+    inter_op_threads=TORCH_INTEROP_THREADS,
+)
+scheduler: ScoringScheduler[FashionCompatibilityQuery] = ScoringScheduler(
+    _predict_scores,
+    length_fn=lambda query: len(query.outfit),
+    executor=executor,
+    max_batch_size=MAX_FORWARD_BATCH,
+    max_tokens=MAX_BATCH_TOKENS,
+    max_wait_ms=MAX_BATCH_WAIT_MS,
+    max_queue_items=MAX_QUEUED_OUTFITS,
+)
 
-    score = float(score_tensor[0].squeeze().detach().cpu().item())
-    return CompatibilityResponse(compatibility=score)
 
+def _service_unavailable(exc: QueueFullError) -> HTTPException:
+    return HTTPException(status_code=503, detail=str(exc), headers={"Retry-After": "1"})
 
-@app.post("/suggest-improvement", response_model=SuggestImprovementResponse)
-async def suggest_improvement(
-    payload: SuggestImprovementRequest,
-) -> SuggestImprovementResponse:
-    closet_by_id: Dict[str, ClosetItem] = {}
-    for item in payload.closet_items:
-        if item.id in closet_by_id:
-            raise HTTPException(
-                status_code=400,
-                detail=f"Duplicate item id detected in closet_items: {item.id}",
-            )
-        closet_by_id[item.id] = item
 
-    missing_items = [item_id for item_id in payload.selected_item_ids if item_id not in closet_by_id]
-    if missing_items:
-        raise HTTPException(
-            status_code=400,
-            detail=f"Selected item {missing_items[0]} is not present in closet_items.",
+async def _score(key: str, queries: List[FashionCompatibilityQuery], response: Response) -> ScoreResult:
+    """Score through the shared scheduler; identical in-flight payloads share one job."""
+    result = await inflight.do(key, lambda: scheduler.submit(queries))
+    response.headers["Server-Timing"] = result.server_timing()
+    logger.debug(
+        "Scored %d outfits: waited %.1f ms, computed %.1f ms over %d batches",
+        len(queries), result.wait_ms, result.compute_ms, result.batches,
+    )
+    return result
+
+
+async def _score_outfits(
+    user_id: Optional[str],
+    outfits: List[List[str]],
+    items_by_id: Dict[str, FashionItem],
+    digests: Dict[str, bytes],
+    response: Response,
+) -> List[float]:
+    """Score outfits given as item ids, serving repeats from ``score_cache``.
+
+    Only outfits whose item multiset is neither cached nor already pending in
+    this request are sent to the model. Outfits longer than the model's
+    ``max_length`` bypass the cache: the model truncates them, so their
+    score depends on the item order.
+    """
+    scores: List[Optional[float]] = []
+    pending: Dict[tuple, List[int]] = {}
+    uncacheable = set()
+    for position, outfit in enumerate(outfits):
+        item_digests = [digests[item_id] for item_id in outfit]
+        if len(outfit) > model.cfg.max_length:
+            cache_key = (user_id or "", None, tuple(item_digests))
+            uncacheable.add(cache_key)
+            score = None
+        else:
+            cache_key = score_cache.key(user_id, item_digests)
+            score = score_cache.get(cache_key)
+        scores.append(score)
+        if score is None:
+            pending.setdefault(cache_key, []).append(position)
+
+    if pending:
+        queries = [
+            FashionCompatibilityQuery(outfit=[items_by_id[item_id] for item_id in outfits[positions[0]]])
+            for positions in pending.values()
+        ]
+        key = _payload_key(
+            "outfit-scores", [b"".join(cache_key[2]) for cache_key in pending]
         )
-
-    fashion_items_by_id: Dict[str, FashionItem] = {}
+        result = await _score(key, queries, response)
+        for (cache_key, positions), score in zip(pending.items(), result.scores):
+            if cache_key not in uncacheable:
+                score_cache.put(cache_key, score)
+            for position in positions:
+                scores[position] = score
+    return scores
+
+
+async def _suggest(
+    user_id: Optional[str],
+    selected_item_ids: List[str],
+    categories: Dict[str, str],
+    items_by_id: Dict[str, FashionItem],
+    digests: Dict[str, bytes],
+    response: Response,
+) -> SuggestImprovementResponse:
+    """Score the selection and every same-category single-item swap."""
     category_to_ids: Dict[str, List[str]] = {}
+    for item_id, category in categories.items():
+        category_to_ids.setdefault(category, []).append(item_id)
 
-    for item in payload.closet_items:
-        try:
-            embedding = _prepare_embedding(item.embedding)
-        except ValueError as exc:
-            raise HTTPException(
-                status_code=400,
-                detail=f"Invalid embedding for item {item.id}: {exc}",
-            ) from exc
-
-        fashion_item = FashionItem(
-            description=item.id,
-            category=item.category,
-            embedding=embedding,
-        )
-        fashion_items_by_id[item.id] = fashion_item
-        category_to_ids.setdefault(item.category, []).append(item.id)
-
-    selected_items = [fashion_items_by_id[item_id] for item_id in payload.selected_item_ids]
-
-    queries: List[FashionCompatibilityQuery] = [
-        FashionCompatibilityQuery(outfit=list(selected_items))
-    ]
+    outfits: List[List[str]] = [list(selected_item_ids)]
     query_infos: List[Dict[str, str]] = [
         {"type": "original"}
     ]
 
-    for index, selected_id in enumerate(payload.selected_item_ids):
-        category = closet_by_id[selected_id].category
+    for index, selected_id in enumerate(selected_item_ids):
+        category = categories[selected_id]
         candidate_ids = [
             candidate_id
             for candidate_id in category_to_ids.get(category, [])
@@ -291,9 +498,9 @@ async def suggest_improvement(
         ]
 
         for candidate_id in candidate_ids:
-            outfit = list(selected_items)
-            outfit[index] = fashion_items_by_id[candidate_id]
-            queries.append(FashionCompatibilityQuery(outfit=outfit))
+            outfit = list(selected_item_ids)
+            outfit[index] = candidate_id
+            outfits.append(outfit)
             query_infos.append(
                 {
                     "type": "replacement",
@@ -303,15 +510,13 @@ async def suggest_improvement(
             )
 
     try:
-        with torch.no_grad():
-            scores_tensor = model.predict_score(
-                queries, use_precomputed_embedding=True
-            )
+        scores = await _score_outfits(user_id, outfits, items_by_id, digests, response)
+    except QueueFullError as exc:
+        raise _service_unavailable(exc) from exc
     except Exception as exc:  # pragma: no cover - surfaced via API response
         logger.exception("Model inference failed during improvement suggestion")
         raise HTTPException(status_code=500, detail=f"Model inference failed: {exc}") from exc
 
-    scores = scores_tensor.detach().cpu().view(-1).tolist()
     original_score = float(scores[0])
     best_index = int(np.argmax(scores))
     best_score = float(scores[best_index])
@@ -340,3 +545,254 @@ async def suggest_improvement(
             score=best_score,
         ),
     )
+
+
+@app.get("/healthz")
+async def healthz() -> Dict[str, str]:
+    return {"status": "ok"}
+
+
+@app.get("/readyz")
+async def readyz() -> JSONResponse:
+    status_code = 200 if lifecycle.ready else 503
+    return JSONResponse(status_code=status_code, content=lifecycle.status())
+
+
+@app.get("/metrics")
+async def metrics() -> Dict[str, object]:
+    return {
+        "scheduler": scheduler.metrics(),
+        "score_cache": score_cache.metrics(),
+        "closet_store": closet_store.metrics(),
+        "executor": executor.metrics(),
+        "singleflight": {
+            "executed_total": inflight.executed_total,
+            "coalesced_total": inflight.coalesced_total,
+        },
+    }
+
+
+@app.delete("/users/{user_id}/score-cache")
+async def invalidate_score_cache(user_id: str) -> Dict[str, int]:
+    """Drop cached outfit scores for a user, e.g. after their closet changed."""
+    return {"invalidated": score_cache.invalidate_user(user_id)}
+
+
+async def _stored_closet(user_id: str) -> Optional[UserCloset]:
+    closet = await closet_store.get(user_id)
+    if closet is not None and MODEL_EMBED_DIM is not None and closet.dim != MODEL_EMBED_DIM:
+        # Stored under a model with another embedding size; the caller re-uploads.
+        await closet_store.drop(user_id)
+        score_cache.invalidate_user(user_id)
+        return None
+    return closet
+
+
+@app.get("/users/{user_id}/closet")
+async def get_closet(user_id: str) -> Dict[str, object]:
+    closet = await closet_store.get(user_id)
+    if closet is None:
+        raise HTTPException(status_code=404, detail="No closet stored for this user.")
+    return {
+        "dim": closet.dim,
+        "items": [
+            {"id": item_id, "category": category}
+            for item_id, category in zip(closet.ids, closet.categories)
+        ],
+    }
+
+
+@app.put(
+    "/users/{user_id}/closet/items",
+    response_model=ClosetUpsertResponse,
+    dependencies=[Depends(_require_ready)],
+)
+async def upsert_closet_items(user_id: str, payload: ClosetUpsertRequest) -> ClosetUpsertResponse:
+    """Validate and store closet embeddings once, for /users/{user_id}/suggest-improvement."""
+    entries: Dict[str, ClosetEntry] = {}
+    for item in payload.items:
+        try:
+            entries[item.id] = (item.id, item.category, _prepare_embedding(item.embedding))
+        except ValueError as exc:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Invalid embedding for item {item.id}: {exc}",
+            ) from exc
+
+    await _stored_closet(user_id)
+    try:
+        closet, replaced, pruned = await closet_store.upsert(
+            user_id, list(entries.values()), retain_ids=payload.retain_item_ids
+        )
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+    if replaced or pruned:
+        score_cache.invalidate_user(user_id)
+    return ClosetUpsertResponse(upserted=len(entries), replaced=replaced, pruned=pruned, size=len(closet))
+
+
+@app.delete("/users/{user_id}/closet/items/{item_id}")
+async def delete_closet_item(user_id: str, item_id: str) -> Dict[str, int]:
+    closet = await closet_store.get(user_id)
+    if closet is None or not closet.delete([item_id]):
+        raise HTTPException(status_code=404, detail=f"Item {item_id} is not stored for this user.")
+    score_cache.invalidate_user(user_id)
+    return {"size": len(closet)}
+
+
+@app.delete("/users/{user_id}/closet")
+async def delete_closet(user_id: str) -> Dict[str, bool]:
+    deleted = await closet_store.drop(user_id)
+    score_cache.invalidate_user(user_id)
+    return {"deleted": deleted}
+
+
+@app.post(
+    "/compatibility",
+    response_model=CompatibilityResponse,
+    dependencies=[Depends(_require_ready)],
+)
+async def predict_compatibility(
+    payload: OutfitEmbeddingsRequest,
+    response: Response,
+) -> CompatibilityResponse:
+    items = _build_outfit(payload)
+    queries = [FashionCompatibilityQuery(outfit=items)]
+    key = _payload_key("compatibility", _outfit_key_parts(items))
+
+    try:
+        scores = (await _score(key, queries, response)).scores
+    except QueueFullError as exc:
+        raise _service_unavailable(exc) from exc
+    except Exception as exc:  # pragma: no cover - surfaced via API response
+        logger.exception("Model inference failed")
+        raise HTTPException(status_code=500, detail=f"Model inference failed: {exc}") from exc
+
+    score = float(scores[0])
+    return CompatibilityResponse(compatibility=score)
+
+
+@app.post(
+    "/compatibility/batch",
+    response_model=CompatibilityBatchResponse,
+    dependencies=[Depends(_require_ready)],
+)
+async def predict_compatibility_batch(
+    payload: CompatibilityBatchRequest,
+    response: Response,
+) -> CompatibilityBatchResponse:
+    outfits = [
+        _build_outfit(outfit, label=f"Outfit {index}: ")
+        for index, outfit in enumerate(payload.outfits)
+    ]
+    queries = [FashionCompatibilityQuery(outfit=items) for items in outfits]
+
+    key_parts: List[bytes] = []
+    for items in outfits:
+        key_parts.append(len(items).to_bytes(8, "little"))
+        key_parts.extend(_outfit_key_parts(items))
+    key = _payload_key("compatibility-batch", key_parts)
+
+    try:
+        scores = (await _score(key, queries, response)).scores
+    except QueueFullError as exc:
+        raise _service_unavailable(exc) from exc
+    except Exception as exc:  # pragma: no cover - surfaced via API response
+        logger.exception("Model inference failed for batch of %d outfits", len(queries))
+        raise HTTPException(status_code=500, detail=f"Model inference failed: {exc}") from exc
+
+    return CompatibilityBatchResponse(scores=[float(score) for score in scores])
+
+
+@app.post(
+    "/suggest-improvement",
+    response_model=SuggestImprovementResponse,
+    dependencies=[Depends(_require_ready)],
+)
+async def suggest_improvement(
+    payload: SuggestImprovementRequest,
+    response: Response,
+) -> SuggestImprovementResponse:
+    closet_by_id: Dict[str, ClosetItem] = {}
+    for item in payload.closet_items:
+        if item.id in closet_by_id:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Duplicate item id detected in closet_items: {item.id}",
+            )
+        closet_by_id[item.id] = item
+
+    missing_items = [item_id for item_id in payload.selected_item_ids if item_id not in closet_by_id]
+    if missing_items:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Selected item {missing_items[0]} is not present in closet_items.",
+        )
+
+    fashion_items_by_id: Dict[str, FashionItem] = {}
+
+    for item in payload.closet_items:
+        try:
+            embedding = _prepare_embedding(item.embedding)
+        except ValueError as exc:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Invalid embedding for item {item.id}: {exc}",
+            ) from exc
+
+        fashion_item = FashionItem(
+            description=item.id,
+            category=item.category,
+            embedding=embedding,
+        )
+        fashion_items_by_id[item.id] = fashion_item
+
+    digests = {item_id: embedding_digest(item.embedding) for item_id, item in fashion_items_by_id.items()}
+    categories = {item.id: item.category for item in payload.closet_items}
+    return await _suggest(
+        payload.user_id, payload.selected_item_ids, categories, fashion_items_by_id, digests, response
+    )
+
+
+@app.post(
+    "/users/{user_id}/suggest-improvement",
+    response_model=SuggestImprovementResponse,
+    dependencies=[Depends(_require_ready)],
+)
+async def suggest_improvement_stored(
+    user_id: str,
+    payload: StoredSuggestImprovementRequest,
+    response: Response,
+) -> SuggestImprovementResponse:
+    """``/suggest-improvement`` over the stored closet: the payload carries ids only.
+
+    Answers 409 with ``missing_item_ids`` when some ids are not stored; the
+    caller uploads those through ``PUT /users/{user_id}/closet/items`` and
+    retries.
+    """
+    closet = await _stored_closet(user_id)
+    candidate_ids = payload.candidate_item_ids
+    if candidate_ids is None:
+        candidate_ids = closet.ids if closet is not None else []
+    item_ids = list(dict.fromkeys([*payload.selected_item_ids, *candidate_ids]))
+    missing = item_ids if closet is None else closet.missing(item_ids)
+    if missing:
+        raise HTTPException(
+            status_code=409,
+            detail={"message": "Some items are not stored for this user.", "missing_item_ids": missing},
+        )
+
+    embeddings = closet.gather(item_ids)
+    items_by_id: Dict[str, FashionItem] = {}
+    categories: Dict[str, str] = {}
+    digests: Dict[str, bytes] = {}
+    for item_id, embedding in zip(item_ids, embeddings):
+        row = closet.index[item_id]
+        categories[item_id] = closet.categories[row]
+        digests[item_id] = closet.digests[row]
+        items_by_id[item_id] = FashionItem(
+            description=item_id,
+            category=categories[item_id],
+            embedding=embedding,
+        )
+    return await _suggest(user_id, payload.selected_item_ids, categories, items_by_id, digests, response)
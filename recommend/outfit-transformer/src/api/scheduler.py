@@ -0,0 +1,382 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Callable, Deque, Dict, Generic, List, Optional, Sequence, Set, Tuple, TypeVar
+
+import numpy as np
+
+from .executor import InferenceExecutor, QueueFullError
+
+T = TypeVar("T")
+
+logger = logging.getLogger("outfit_compatibility_api")
+
+
+@dataclass
+class ScoreResult:
+    scores: List[float]
+    wait_ms: float
+    compute_ms: float
+    batches: int
+
+    def server_timing(self) -> str:
+        return f"queue;dur={self.wait_ms:.1f}, compute;dur={self.compute_ms:.1f}"
+
+
+class _Job(Generic[T]):
+    __slots__ = ("order", "items", "lengths", "future", "enqueued", "scores", "cursor", "done",
+                 "started", "compute_ms", "batches")
+
+    def __init__(self, items: Sequence[T], lengths: List[int], future: asyncio.Future):
+        # Items are queued shortest first so that a job spanning several
+        # batches is cut into slices of similar length; ``order`` maps them
+        # back for the result.
+        self.order = sorted(range(len(items)), key=lengths.__getitem__)
+        self.items = [items[i] for i in self.order]
+        self.lengths = [lengths[i] for i in self.order]
+        self.future = future
+        self.enqueued = time.perf_counter()
+        self.scores: List[float] = [0.0] * len(items)
+        self.cursor = 0  # next item not yet handed to a batch
+        self.done = 0
+        self.started: Optional[float] = None
+        self.compute_ms = 0.0
+        self.batches = 0
+
+
+# (job, start, stop): a contiguous slice of one job's items inside a batch
+Slice = Tuple[_Job, int, int]
+
+
+class SchedulerStats:
+    """Rolling counters describing how jobs are merged into forward passes."""
+
+    def __init__(self, window: int = 1024):
+        self.jobs_total = 0
+        self.items_total = 0
+        self.batches_total = 0
+        self.failures_total = 0
+        self.rejected_total = 0
+        self.batch_sizes: Deque[int] = deque(maxlen=window)
+        self.batch_jobs: Deque[int] = deque(maxlen=window)
+        self.padding_ratio: Deque[float] = deque(maxlen=window)
+        self.wait_ms: Deque[float] = deque(maxlen=window)
+        self.compute_ms: Deque[float] = deque(maxlen=window)
+
+    def record_batch(self, size: int, jobs: int, tokens: int, padded_tokens: int, compute_ms: float) -> None:
+        self.batches_total += 1
+        self.items_total += size
+        self.batch_sizes.append(size)
+        self.batch_jobs.append(jobs)
+        self.padding_ratio.append(1.0 - tokens / padded_tokens if padded_tokens else 0.0)
+        self.compute_ms.append(compute_ms)
+
+    def record_job(self, result: ScoreResult) -> None:
+        self.jobs_total += 1
+        self.wait_ms.append(result.wait_ms)
+
+    @staticmethod
+    def _percentile(values: Sequence[float], q: float) -> float:
+        if not values:
+            return 0.0
+        return float(np.percentile(np.asarray(values, dtype=np.float64), q))
+
+    def snapshot(self) -> Dict[str, float]:
+        return {
+            "jobs_total": self.jobs_total,
+            "items_total": self.items_total,
+            "batches_total": self.batches_total,
+            "failures_total": self.failures_total,
+            "rejected_total": self.rejected_total,
+            "batch_size_avg": float(np.mean(self.batch_sizes)) if self.batch_sizes else 0.0,
+            "batch_jobs_avg": float(np.mean(self.batch_jobs)) if self.batch_jobs else 0.0,
+            "padding_ratio_avg": float(np.mean(self.padding_ratio)) if self.padding_ratio else 0.0,
+            "wait_ms_p50": self._percentile(self.wait_ms, 50),
+            "wait_ms_p99": self._percentile(self.wait_ms, 99),
+            "compute_ms_p50": self._percentile(self.compute_ms, 50),
+            "compute_ms_p99": self._percentile(self.compute_ms, 99),
+        }
+
+
+class ScoringScheduler(Generic[T]):
+    """Merges scoring jobs from concurrent requests into shared padded batches.
+
+    A job is the list of outfits one request wants scored. Jobs are queued
+    and a single worker packs their outfits, oldest job first, into batches
+    of at most ``max_batch_size`` outfits and ``max_tokens`` padded tokens
+    (``outfits * (longest outfit + 1)``, counting the task token). A batch is
+    flushed when it is full or the oldest queued job has waited
+    ``max_wait_ms``. Large jobs are split across consecutive batches and
+    their scores reassembled in order.
+
+    ``score_fn`` receives a list of items and returns one score per item; it
+    runs on ``executor``, off the event loop, with up to ``max_inflight``
+    batches (default: one per executor worker) running at once while the
+    next one is being collected. ``submit`` raises
+    ``QueueFullError`` when accepting a job would leave more than
+    ``max_queue_items`` items waiting (a job is always accepted into an
+    empty queue, however large).
+    """
+
+    def __init__(
+        self,
+        score_fn: Callable[[List[T]], List[float]],
+        length_fn: Callable[[T], int],
+        executor: InferenceExecutor,
+        max_batch_size: int = 256,
+        max_tokens: int = 4096,
+        max_wait_ms: float = 5.0,
+        max_queue_items: Optional[int] = None,
+        max_inflight: Optional[int] = None,
+    ):
+        if max_batch_size < 1:
+            raise ValueError("max_batch_size must be >= 1.")
+        if max_tokens < 2:
+            raise ValueError("max_tokens must be >= 2.")
+        if max_wait_ms < 0:
+            raise ValueError("max_wait_ms must be >= 0.")
+        if max_inflight is not None and max_inflight < 1:
+            raise ValueError("max_inflight must be >= 1.")
+        self.score_fn = score_fn
+        self.length_fn = length_fn
+        self.max_batch_size = max_batch_size
+        self.max_tokens = max_tokens
+        self.max_wait_ms = max_wait_ms
+        self.max_queue_items = max_queue_items
+        self.executor = executor
+        self.max_inflight = max_inflight or executor.max_workers
+        self.stats = SchedulerStats()
+        self._queued_total = 0  # items submitted but not yet handed to a batch
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._pending: Deque[_Job] = deque()
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._batches: Set[asyncio.Task] = set()
+
+    @property
+    def queue_depth(self) -> int:
+        """Outfits waiting to be placed in a batch."""
+        return self._queued_total
+
+    def _ensure_worker(self) -> asyncio.Queue:
+        if self._worker is None or self._worker.done():
+            if self._worker is not None:
+                self._fail_all(RuntimeError("Scoring worker stopped unexpectedly."))
+            self._queue = asyncio.Queue()
+            self._slots = asyncio.Semaphore(self.max_inflight)
+            self._pending.clear()
+            self._queued_total = 0
+            self._worker = asyncio.get_running_loop().create_task(self._run())
+        return self._queue
+
+    async def submit(self, items: Sequence[T]) -> ScoreResult:
+        if not items:
+            return ScoreResult(scores=[], wait_ms=0.0, compute_ms=0.0, batches=0)
+        queue = self._ensure_worker()
+        if (
+            self.max_queue_items is not None
+            and self._queued_total
+            and self._queued_total + len(items) > self.max_queue_items
+        ):
+            self.stats.rejected_total += 1
+            raise QueueFullError("Scoring queue is full.")
+        job = _Job(items, [self.length_fn(item) for item in items], asyncio.get_running_loop().create_future())
+        self._queued_total += len(items)
+        await queue.put(job)
+        return await job.future
+
+    async def close(self) -> None:
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+        for task in list(self._batches):
+            task.cancel()
+        await asyncio.gather(*self._batches, return_exceptions=True)
+        self._fail_all(RuntimeError("Scoring scheduler is shutting down."))
+
+    def _fail_all(self, exc: BaseException) -> None:
+        """Fail every job still pending or queued, so no caller waits forever."""
+        jobs = list(self._pending)
+        self._pending.clear()
+        while self._queue is not None and not self._queue.empty():
+            jobs.append(self._queue.get_nowait())
+        for job in jobs:
+            if not job.future.done():
+                job.future.set_exception(exc)
+        self._queued_total = 0
+
+    def _queued_items(self) -> Tuple[int, int]:
+        items = tokens = 0
+        for job in self._pending:
+            remaining = job.lengths[job.cursor:]
+            items += len(remaining)
+            tokens += sum(remaining) + len(remaining)
+        return items, tokens
+
+    def _full(self) -> bool:
+        items, tokens = self._queued_items()
+        return items >= self.max_batch_size or tokens >= self.max_tokens
+
+    async def _collect(self) -> None:
+        assert self._queue is not None
+        if not self._pending:
+            self._pending.append(await self._queue.get())
+        deadline = self._pending[0].enqueued + self.max_wait_ms / 1000.0
+        while not self._full():
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                # Take whatever is already queued without waiting any longer.
+                while not self._queue.empty() and not self._full():
+                    self._pending.append(self._queue.get_nowait())
+                return
+            try:
+                self._pending.append(await asyncio.wait_for(self._queue.get(), timeout=remaining))
+            except asyncio.TimeoutError:
+                return
+
+    def _take_batch(self) -> List[Slice]:
+        slices: List[Slice] = []
+        count, longest = 0, 0
+        while self._pending and count < self.max_batch_size:
+            job = self._pending[0]
+            if job.future.done():  # failed earlier or caller went away
+                self._queued_total -= len(job.items) - job.cursor
+                job.cursor = len(job.items)
+                self._pending.popleft()
+                continue
+            start = stop = job.cursor
+            while stop < len(job.items) and count < self.max_batch_size:
+                candidate_longest = max(longest, job.lengths[stop])
+                if count and (count + 1) * (candidate_longest + 1) > self.max_tokens:
+                    break
+                longest = candidate_longest
+                count += 1
+                stop += 1
+            if stop > start:
+                slices.append((job, start, stop))
+                self._queued_total -= stop - start
+                job.cursor = stop
+            if job.cursor < len(job.items):
+                break  # batch is full; the rest of this job goes in the next one
+            self._pending.popleft()
+        return slices
+
+    async def _run(self) -> None:
+        assert self._slots is not None
+        while True:
+            # Wait for a free executor slot first, so jobs keep accumulating
+            # into the next batch while all workers are busy.
+            await self._slots.acquire()
+            try:
+                await self._collect()
+                slices = self._take_batch()
+            except asyncio.CancelledError:
+                self._slots.release()
+                raise
+            except Exception as exc:
+                # A bug here must not kill the worker: fail what is pending and go on.
+                self._slots.release()
+                logger.exception("Scoring scheduler failed unexpectedly")
+                self.stats.failures_total += 1
+                for job in list(self._pending):
+                    self._fail(job, exc)
+                continue
+            if not slices:
+                self._slots.release()
+                continue
+            task = asyncio.get_running_loop().create_task(self._run_batch(slices, self._slots))
+            self._batches.add(task)
+            task.add_done_callback(self._batches.discard)
+
+    async def _run_batch(self, slices: List[Slice], slots: asyncio.Semaphore) -> None:
+        try:
+            await self._process(slices)
+        except asyncio.CancelledError:
+            for job, _, _ in slices:
+                self._fail(job, RuntimeError("Scoring scheduler is shutting down."))
+            raise
+        except Exception as exc:
+            logger.exception("Scoring batch failed unexpectedly")
+            self.stats.failures_total += 1
+            for job, _, _ in slices:
+                self._fail(job, exc)
+        finally:
+            slots.release()
+
+    async def _process(self, slices: List[Slice]) -> None:
+        started = time.perf_counter()
+        items: List[T] = []
+        for job, start, stop in slices:
+            if job.started is None:
+                job.started = started
+            items.extend(job.items[start:stop])
+
+        try:
+            scores = await self.executor.run(self.score_fn, items)
+        except QueueFullError as exc:
+            for job, _, _ in slices:
+                self._fail(job, exc)
+            return
+        except Exception as exc:
+            if len(slices) > 1:
+                # One bad request must not fail the others it was batched with.
+                for entry in slices:
+                    await self._process([entry])
+                return
+            job = slices[0][0]
+            self.stats.failures_total += 1
+            self._fail(job, exc)
+            return
+
+        compute_ms = (time.perf_counter() - started) * 1000.0
+        lengths = [length for job, start, stop in slices for length in job.lengths[start:stop]]
+        self.stats.record_batch(
+            len(items), len(slices), sum(lengths) + len(lengths), len(lengths) * (max(lengths) + 1), compute_ms
+        )
+
+        offset = 0
+        for job, start, stop in slices:
+            job.scores[start:stop] = scores[offset:offset + stop - start]
+            offset += stop - start
+            job.done += stop - start
+            job.compute_ms += compute_ms
+            job.batches += 1
+            if job.done == len(job.items) and not job.future.done():
+                scores_in_order = [0.0] * len(job.scores)
+                for position, index in enumerate(job.order):
+                    scores_in_order[index] = job.scores[position]
+                result = ScoreResult(
+                    scores=scores_in_order,
+                    wait_ms=(job.started - job.enqueued) * 1000.0,
+                    compute_ms=job.compute_ms,
+                    batches=job.batches,
+                )
+                self.stats.record_job(result)
+                job.future.set_result(result)
+
+    def _fail(self, job: _Job, exc: BaseException) -> None:
+        # Drop whatever part of the job is still queued.
+        self._queued_total -= len(job.items) - job.cursor
+        job.cursor = len(job.items)
+        if job in self._pending:
+            self._pending.remove(job)
+        if not job.future.done():
+            job.future.set_exception(exc)
+
+    def metrics(self) -> Dict[str, float]:
+        return {
+            "queue_depth": self.queue_depth,
+            "max_batch_size": self.max_batch_size,
+            "max_tokens": self.max_tokens,
+            "max_wait_ms": self.max_wait_ms,
+            "max_inflight": self.max_inflight,
+            "inflight_batches": len(self._batches),
+            "max_queue_items": self.max_queue_items or 0,
+            **self.stats.snapshot(),
+        }
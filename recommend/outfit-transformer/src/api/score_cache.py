@@ -0,0 +1,97 @@
+import hashlib
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional, Set, Tuple
+
+import numpy as np
+
+# (user id, checkpoint id, sorted item digests)
+Key = Tuple[str, str, Tuple[bytes, ...]]
+
+
+def embedding_digest(embedding: np.ndarray) -> bytes:
+    """Content hash of a prepared float32 embedding."""
+    return hashlib.blake2b(np.ascontiguousarray(embedding, dtype=np.float32).tobytes(), digest_size=16).digest()
+
+
+class OutfitScoreCache:
+    """Bounded LRU + TTL cache of compatibility scores keyed by outfit content.
+
+    OutfitTransformer has no positional encoding, so a score depends only on
+    the multiset of items; keys sort the item digests, making every ordering
+    of an outfit share one entry. Keys also carry the checkpoint id, so a
+    model swap never serves old scores, and the user id, so one user's
+    entries can be dropped when their closet changes. Only used from the
+    event loop, hence no locking.
+    """
+
+    def __init__(self, max_entries: int = 100_000, ttl_s: float = 3600.0):
+        self.max_entries = max_entries
+        self.ttl_s = ttl_s
+        self.checkpoint_id = ""
+        self._entries: "OrderedDict[Key, Tuple[float, float]]" = OrderedDict()
+        self._by_user: Dict[str, Set[Key]] = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def key(self, user_id: Optional[str], item_digests: Iterable[bytes]) -> Key:
+        return (user_id or "", self.checkpoint_id, tuple(sorted(item_digests)))
+
+    def get(self, key: Key) -> Optional[float]:
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        score, expires_at = entry
+        if expires_at < time.monotonic():
+            self._remove(key)
+            self.expirations += 1
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return score
+
+    def put(self, key: Key, score: float) -> None:
+        if self.max_entries <= 0:
+            return
+        if key in self._entries:
+            self._entries.move_to_end(key)
+        self._entries[key] = (score, time.monotonic() + self.ttl_s)
+        self._by_user.setdefault(key[0], set()).add(key)
+        while len(self._entries) > self.max_entries:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.evictions += 1
+
+    def _remove(self, key: Key) -> None:
+        self._entries.pop(key, None)
+        keys = self._by_user.get(key[0])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._by_user[key[0]]
+
+    def invalidate_user(self, user_id: str) -> int:
+        keys = self._by_user.pop(user_id, set())
+        for key in keys:
+            self._entries.pop(key, None)
+        return len(keys)
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._by_user.clear()
+
+    def metrics(self) -> Dict[str, float]:
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_s": self.ttl_s,
+            "users": len(self._by_user),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
@@ -0,0 +1,149 @@
+import math
+from typing import Callable, Iterator, List, Optional, Sequence, TypeVar
+
+import numpy as np
+import torch
+from torch import Tensor
+from torch.utils.data import Sampler
+
+T = TypeVar('T')
+
+
+def padding_ratio(lengths: Sequence[int], batches: Sequence[Sequence[int]]) -> float:
+    """Fraction of padded positions when each batch is padded to its longest outfit."""
+    real = padded = 0
+    for batch in batches:
+        batch_lengths = [lengths[i] for i in batch]
+        real += sum(batch_lengths)
+        padded += len(batch_lengths) * max(batch_lengths)
+    return 1.0 - real / padded if padded else 0.0
+
+
+def bucket_indices(
+    lengths: Sequence[int],
+    batch_size: int,
+    max_tokens: Optional[int] = None,
+    max_padding: Optional[float] = None,
+) -> List[List[int]]:
+    """Groups indices of similar length into batches.
+
+    Indices are sorted by length and cut into batches of at most
+    ``batch_size`` items and ``max_tokens`` padded positions. With
+    ``max_padding`` a batch is also closed early once adding the next (longer)
+    item would push its padding ratio above that fraction.
+    """
+    order = np.argsort(np.asarray(lengths), kind='stable')
+    batches, batch, total, longest = [], [], 0, 0
+    for index in order.tolist():
+        length = lengths[index]
+        if batch:
+            new_longest = max(longest, length)
+            size = len(batch) + 1
+            if (
+                size > batch_size
+                or (max_tokens is not None and size * new_longest > max_tokens)
+                or (max_padding is not None and 1.0 - (total + length) / (size * new_longest) > max_padding)
+            ):
+                batches.append(batch)
+                batch, total, longest = [], 0, 0
+        batch.append(index)
+        total += length
+        longest = max(longest, length)
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+def run_bucketed(
+    fn: Callable[[List[T]], Tensor],
+    queries: Sequence[T],
+    batch_size: int,
+    length_fn: Callable[[T], int] = lambda query: len(query.outfit),
+    max_tokens: Optional[int] = None,
+    max_padding: Optional[float] = None,
+) -> Tensor:
+    """Calls ``fn`` (e.g. ``model.predict_score``/``model.embed_query``) on
+    length buckets of ``queries`` and returns the rows in the original order.
+    """
+    lengths = [length_fn(query) for query in queries]
+    outputs, order = [], []
+    for batch in bucket_indices(lengths, batch_size, max_tokens, max_padding):
+        outputs.append(fn([queries[i] for i in batch]))
+        order.extend(batch)
+    stacked = torch.cat(outputs, dim=0)
+    results = torch.empty_like(stacked)
+    results[torch.as_tensor(order, device=stacked.device)] = stacked
+    return results
+
+
+class LengthBucketBatchSampler(Sampler[List[int]]):
+    """BatchSampler that builds batches from outfits of similar length.
+
+    Each epoch the dataset is shuffled, split into pools of ``pool_size``
+    indices, and every pool is sorted by length and cut into batches; the
+    batches are then shuffled again, so batch order stays random while each
+    batch needs little padding. Without ``shuffle`` the whole dataset is one
+    sorted pool. With ``num_replicas > 1`` every rank gets an equal share of
+    the batches (replacing ``DistributedSampler``); call ``set_epoch`` each
+    epoch as with that sampler.
+    """
+
+    def __init__(
+        self,
+        lengths: Sequence[int],
+        batch_size: int,
+        shuffle: bool = True,
+        drop_last: bool = False,
+        pool_size: Optional[int] = None,
+        num_replicas: int = 1,
+        rank: int = 0,
+        seed: int = 0,
+    ):
+        self.lengths = list(lengths)
+        self.batch_size = batch_size
+        self.shuffle = shuffle
+        self.drop_last = drop_last
+        self.pool_size = pool_size or batch_size * 50
+        self.num_replicas = num_replicas
+        self.rank = rank
+        self.seed = seed
+        self.epoch = 0
+
+    def set_epoch(self, epoch: int) -> None:
+        self.epoch = epoch
+
+    def _all_batches(self) -> List[List[int]]:
+        rng = np.random.default_rng(self.seed + self.epoch)
+        n = len(self.lengths)
+        order = rng.permutation(n) if self.shuffle else np.arange(n)
+        pool_size = self.pool_size if self.shuffle else n
+        batches = []
+        for start in range(0, n, pool_size):
+            pool = order[start:start + pool_size]
+            pool = pool[np.argsort([self.lengths[i] for i in pool], kind='stable')]
+            for batch_start in range(0, len(pool), self.batch_size):
+                batch = pool[batch_start:batch_start + self.batch_size].tolist()
+                if len(batch) < self.batch_size and self.drop_last:
+                    continue
+                batches.append(batch)
+        if self.shuffle:
+            batches = [batches[i] for i in rng.permutation(len(batches))]
+        if self.num_replicas > 1:
+            per_rank = len(batches) // self.num_replicas
+            batches = batches[self.rank:per_rank * self.num_replicas:self.num_replicas]
+        return batches
+
+    def __iter__(self) -> Iterator[List[int]]:
+        return iter(self._all_batches())
+
+    def __len__(self) -> int:
+        n = len(self.lengths)
+        if not self.shuffle:
+            total = n // self.batch_size if self.drop_last else math.ceil(n / self.batch_size)
+        else:
+            pools = [min(self.pool_size, n - start) for start in range(0, n, self.pool_size)]
+            total = sum(
+                size // self.batch_size if self.drop_last else math.ceil(size / self.batch_size)
+                for size in pools
+            )
+        return total // self.num_replicas if self.num_replicas > 1 else total
@@ -122,25 +122,50 @@ class OutfitTransformer(nn.Module):
         
         return images, texts, torch.BoolTensor(mask).to(self.device)
     
-    def _pad_and_mask_for_embs(self, embs_of_outfits):
-        max_length = self._get_max_length(embs_of_outfits)
-        batch_size = len(embs_of_outfits)
+    def _pack_embs(self, embs_of_outfits, max_length):
+        """Flattens outfits into unique item rows plus a gather index and lengths.
 
-        embeddings = torch.empty((batch_size, max_length, self.item_enc.d_embed), 
-                                 dtype=torch.float, device=self.device)
-        mask = []
+        Items shared between outfits (the same array object, as in the
+        candidate outfits built by the API) are stored once.
+        """
+        rows, unique, index, lengths = {}, [], [], []
+        for embs_of_outfit in embs_of_outfits:
+            embs_of_outfit = embs_of_outfit[:max_length]
+            lengths.append(len(embs_of_outfit))
+            for emb in embs_of_outfit:
+                row = rows.get(id(emb))
+                if row is None:
+                    row = rows[id(emb)] = len(unique)
+                    unique.append(emb)
+                index.append(row)
+        if unique:
+            items = np.ascontiguousarray(np.stack(unique), dtype=np.float32)
+        else:
+            items = np.empty((0, self.item_enc.d_embed), dtype=np.float32)
+        return items, np.asarray(index, dtype=np.int64), np.asarray(lengths, dtype=np.int64)
 
-        for i, embs_of_outfit in enumerate(embs_of_outfits):
-            embs_of_outfit = torch.tensor(
-                np.array(embs_of_outfit[:max_length]), dtype=torch.float
-            ).to(self.device)
-            length = len(embs_of_outfit)
+    def _pad_and_mask_packed(self, items, index, lengths, max_length):
+        """Pads packed item embeddings to ``[B, max_length, D]`` without a per-outfit loop.
 
-            embeddings[i, :length] = embs_of_outfit
-            embeddings[i, length:] = self.pad_emb  # 패딩 부분을 학습 가능한 벡터로 채움
-            mask.append([0] * length + [1] * (max_length - length))
-        
-        return embeddings, torch.BoolTensor(mask).to(self.device)
+        ``items[index]`` are the outfits' item embeddings concatenated in
+        outfit order and ``lengths`` the (already truncated) outfit lengths.
+        """
+        device = self.device
+        items = torch.as_tensor(items, dtype=torch.float).to(device, non_blocking=True)
+        index = torch.as_tensor(index).to(device, non_blocking=True)
+        lengths = torch.as_tensor(lengths).to(device, non_blocking=True)
+
+        mask = torch.arange(max_length, device=device).unsqueeze(0) >= lengths.unsqueeze(1) # [B, L]
+        embeddings = self.pad_emb.expand(len(lengths), max_length, -1).clone() # 패딩 부분은 학습 가능한 벡터
+        embeddings[~mask] = items.index_select(0, index)
+
+        return embeddings, mask
+
+    def _pad_and_mask_for_embs(self, embs_of_outfits):
+        max_length = self._get_max_length(embs_of_outfits)
+        items, index, lengths = self._pack_embs(embs_of_outfits, max_length)
+
+        return self._pad_and_mask_packed(items, index, lengths, max_length)
     
     def _style_enc_forward(self, embs_of_inputs, src_key_padding_mask):
         if self.cfg.aggregation_method == 'concat':
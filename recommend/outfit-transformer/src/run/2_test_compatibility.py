@@ -11,6 +11,7 @@ from tqdm import tqdm
 import wandb
 
 from ..data import collate_fn
+from ..data.bucketing import LengthBucketBatchSampler
 from ..data.datasets import polyvore
 from ..evaluation.metrics import compute_cp_scores
 from ..models.load import load_model
@@ -45,6 +46,8 @@ def parse_args():
     parser.add_argument('--checkpoint', type=str, 
                         default=None)
     parser.add_argument('--demo', action='store_true')
+    parser.add_argument('--length_bucketing', action='store_true',
+                        help='Batch outfits of similar length together to cut padding.')
     
     return parser.parse_args()
 
@@ -57,10 +60,18 @@ def validation(args):
         dataset_dir=args.polyvore_dir, dataset_type=args.polyvore_type, 
         dataset_split='test', metadata=metadata, embedding_dict=embedding_dict
     )
-    test_dataloader = DataLoader(
-        dataset=test, batch_size=args.batch_sz_per_gpu, shuffle=False,
-        num_workers=args.n_workers_per_gpu, collate_fn=collate_fn.cp_collate_fn
-    )
+    if args.length_bucketing:
+        test_dataloader = DataLoader(
+            dataset=test, num_workers=args.n_workers_per_gpu, collate_fn=collate_fn.cp_collate_fn,
+            batch_sampler=LengthBucketBatchSampler(
+                [len(data['question']) for data in test.data], batch_size=args.batch_sz_per_gpu, shuffle=False
+            )
+        )
+    else:
+        test_dataloader = DataLoader(
+            dataset=test, batch_size=args.batch_sz_per_gpu, shuffle=False,
+            num_workers=args.n_workers_per_gpu, collate_fn=collate_fn.cp_collate_fn
+        )
     
     model = load_model(model_type=args.model_type, checkpoint=args.checkpoint)
     model.eval()
@@ -21,6 +21,7 @@ from tqdm import tqdm
 import wandb
 
 from ..data import collate_fn
+from ..data.bucketing import LengthBucketBatchSampler
 from ..data.datasets import polyvore
 from ..evaluation.metrics import compute_cp_scores
 from ..models.load import load_model
@@ -69,6 +70,8 @@ def parse_args():
     parser.add_argument('--project_name', type=str, 
                         default=None)
     parser.add_argument('--demo', action='store_true')
+    parser.add_argument('--length_bucketing', action='store_true',
+                        help='Batch outfits of similar length together to cut padding.')
     
     return parser.parse_args()
 
@@ -86,7 +89,25 @@ def setup_dataloaders(rank, world_size, args):
         dataset_split='valid', metadata=metadata, load_image=False, embedding_dict=embedding_dict
     )
     
-    if world_size == 1:
+    if args.length_bucketing:
+        train_sampler = LengthBucketBatchSampler(
+            [len(data['question']) for data in train.data], batch_size=args.batch_sz_per_gpu,
+            shuffle=True, drop_last=world_size > 1, num_replicas=world_size, rank=rank, seed=args.seed
+        )
+        valid_sampler = LengthBucketBatchSampler(
+            [len(data['question']) for data in valid.data], batch_size=args.batch_sz_per_gpu,
+            shuffle=False, drop_last=world_size > 1, num_replicas=world_size, rank=rank, seed=args.seed
+        )
+        train_dataloader = DataLoader(
+            dataset=train, batch_sampler=train_sampler,
+            num_workers=args.n_workers_per_gpu, collate_fn=collate_fn.cp_collate_fn
+        )
+        valid_dataloader = DataLoader(
+            dataset=valid, batch_sampler=valid_sampler,
+            num_workers=args.n_workers_per_gpu, collate_fn=collate_fn.cp_collate_fn
+        )
+        
+    elif world_size == 1:
         train_dataloader = DataLoader(
             dataset=train, batch_size=args.batch_sz_per_gpu, shuffle=True,
             num_workers=args.n_workers_per_gpu, collate_fn=collate_fn.cp_collate_fn
@@ -256,7 +277,9 @@ def train(
 
     # Training Loop
     for epoch in range(args.n_epochs):
-        if world_size > 1:
+        if args.length_bucketing:
+            train_dataloader.batch_sampler.set_epoch(epoch)
+        elif world_size > 1:
             train_dataloader.sampler.set_epoch(epoch)
         train_logs = train_step(
             rank, world_size, 
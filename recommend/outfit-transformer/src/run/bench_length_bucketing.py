@@ -0,0 +1,107 @@
+"""Padding ratio and throughput of length-bucketed vs. random batching.
+
+Outfit lengths come from a Polyvore compatibility split when --polyvore_dir
+is given, otherwise from a synthetic 2-16 item mix. Throughput is measured on
+a style encoder with the OutfitTransformer configuration (without the item
+encoder), fed precomputed-size embeddings padded per batch.
+
+    python -m src.run.bench_length_bucketing --polyvore_dir ./datasets/polyvore --device cuda
+"""
+import time
+from argparse import ArgumentParser
+
+import numpy as np
+import torch
+import torch.nn.functional as F
+from torch import nn
+
+from ..data.bucketing import LengthBucketBatchSampler, bucket_indices, padding_ratio
+from ..models.outfit_transformer import OutfitTransformerConfig
+
+
+def parse_args():
+    parser = ArgumentParser()
+    parser.add_argument('--polyvore_dir', type=str, default=None)
+    parser.add_argument('--polyvore_type', type=str, choices=['nondisjoint', 'disjoint'],
+                        default='nondisjoint')
+    parser.add_argument('--n_outfits', type=int, default=20000)
+    parser.add_argument('--batch_sz', type=int, default=512)
+    parser.add_argument('--d_model', type=int, default=512)
+    parser.add_argument('--max_padding', type=float, default=0.25,
+                        help='max_padding used for the API-style bucket_indices run.')
+    parser.add_argument('--device', type=str, default='cuda' if torch.cuda.is_available() else 'cpu')
+    parser.add_argument('--seed', type=int, default=42)
+    return parser.parse_args()
+
+
+def load_lengths(args):
+    if args.polyvore_dir:
+        from ..data.datasets import polyvore
+
+        data = polyvore.load_task_data(args.polyvore_dir, args.polyvore_type, 'compatibility', 'train')
+        return [len(entry['question']) for entry in data]
+    rng = np.random.default_rng(args.seed)
+    # Polyvore-like: mostly 3-6 items with a long tail.
+    lengths = np.clip(np.round(rng.gamma(4.0, 1.2, size=args.n_outfits)) + 1, 2, 16)
+    return lengths.astype(int).tolist()
+
+
+def build_style_encoder(d_model, device):
+    cfg = OutfitTransformerConfig()
+    layer = nn.TransformerEncoderLayer(
+        d_model=d_model, nhead=cfg.transformer_n_head, dim_feedforward=cfg.transformer_d_ffn,
+        dropout=cfg.transformer_dropout, batch_first=True, norm_first=True, activation=F.mish,
+    )
+    encoder = nn.TransformerEncoder(layer, num_layers=cfg.transformer_n_layers, enable_nested_tensor=False)
+    return encoder.to(device).eval()
+
+
+def run_epoch(encoder, lengths, batches, d_model, device):
+    """Forward every batch (+1 task token, as in predict_score); returns outfits/s."""
+    def _forward(batch):
+        batch_lengths = torch.tensor([lengths[i] for i in batch], device=device)
+        max_length = int(batch_lengths.max()) + 1
+        inputs = torch.randn(len(batch), max_length, d_model, device=device)
+        mask = torch.arange(max_length, device=device).unsqueeze(0) > batch_lengths.unsqueeze(1)
+        encoder(inputs, src_key_padding_mask=mask)
+
+    with torch.no_grad():
+        _forward(batches[0])  # warm-up
+        if device.type == 'cuda':
+            torch.cuda.synchronize()
+        started = time.perf_counter()
+        for batch in batches:
+            _forward(batch)
+        if device.type == 'cuda':
+            torch.cuda.synchronize()
+    return sum(len(batch) for batch in batches) / (time.perf_counter() - started)
+
+
+def main():
+    args = parse_args()
+    device = torch.device(args.device)
+    lengths = load_lengths(args)
+    n = len(lengths)
+
+    order = np.random.default_rng(args.seed).permutation(n)
+    random_batches = [order[i:i + args.batch_sz].tolist() for i in range(0, n, args.batch_sz)]
+    sampler_batches = list(LengthBucketBatchSampler(lengths, args.batch_sz, shuffle=True, seed=args.seed))
+    api_batches = bucket_indices(lengths, args.batch_sz, max_padding=args.max_padding)
+
+    encoder = build_style_encoder(args.d_model, device)
+    print(f"{n} outfits, lengths {min(lengths)}-{max(lengths)} (mean {np.mean(lengths):.1f}), "
+          f"batch size {args.batch_sz}, {device}")
+    baseline = None
+    for name, batches in (
+        ('random', random_batches),
+        ('LengthBucketBatchSampler', sampler_batches),
+        (f'bucket_indices(max_padding={args.max_padding})', api_batches),
+    ):
+        throughput = run_epoch(encoder, lengths, batches, args.d_model, device)
+        baseline = baseline or throughput
+        print(f"{name:36s} batches {len(batches):5d}  padding {padding_ratio(lengths, batches):6.1%}  "
+              f"{throughput:10.0f} outfits/s ({throughput / baseline:.2f}x)")
+
+
+if __name__ == '__main__':
+    main()
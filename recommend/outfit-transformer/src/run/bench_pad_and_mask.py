@@ -0,0 +1,113 @@
+"""Microbenchmark for OutfitTransformer._pad_and_mask_for_embs.
+
+Compares the packed, vectorized padding path with the previous per-outfit
+loop on candidate batches shaped like /suggest-improvement requests (outfits
+built from a shared pool of closet items), and checks both give the same
+tensors.
+
+    python -m src.run.bench_pad_and_mask --n_outfits 4096 --device cuda
+"""
+import time
+from argparse import ArgumentParser
+
+import numpy as np
+import torch
+from torch import nn
+
+from ..models.outfit_transformer import OutfitTransformer, OutfitTransformerConfig
+
+
+class _PaddingOnly(nn.Module):
+    """Just the state the padding code reads, without loading the item encoder."""
+
+    _get_max_length = OutfitTransformer._get_max_length
+    _pack_embs = OutfitTransformer._pack_embs
+    _pad_and_mask_packed = OutfitTransformer._pad_and_mask_packed
+    _pad_and_mask_for_embs = OutfitTransformer._pad_and_mask_for_embs
+    device = OutfitTransformer.device
+
+    def __init__(self, d_embed: int, max_length: int):
+        super().__init__()
+        self.cfg = OutfitTransformerConfig(max_length=max_length)
+        self.item_enc = nn.Module()
+        self.item_enc.d_embed = d_embed
+        self.pad_emb = nn.Parameter(torch.randn(d_embed) * 0.02)
+
+
+def legacy_pad_and_mask(model, embs_of_outfits):
+    """The per-outfit loop that _pad_and_mask_for_embs used to run."""
+    max_length = model._get_max_length(embs_of_outfits)
+    batch_size = len(embs_of_outfits)
+
+    embeddings = torch.empty((batch_size, max_length, model.item_enc.d_embed),
+                             dtype=torch.float, device=model.device)
+    mask = []
+
+    for i, embs_of_outfit in enumerate(embs_of_outfits):
+        embs_of_outfit = torch.tensor(
+            np.array(embs_of_outfit[:max_length]), dtype=torch.float
+        ).to(model.device)
+        length = len(embs_of_outfit)
+
+        embeddings[i, :length] = embs_of_outfit
+        embeddings[i, length:] = model.pad_emb
+        mask.append([0] * length + [1] * (max_length - length))
+
+    return embeddings, torch.BoolTensor(mask).to(model.device)
+
+
+def parse_args():
+    parser = ArgumentParser()
+    parser.add_argument('--n_outfits', type=int, default=4096)
+    parser.add_argument('--n_closet_items', type=int, default=200)
+    parser.add_argument('--min_length', type=int, default=2)
+    parser.add_argument('--max_length', type=int, default=8)
+    parser.add_argument('--d_embed', type=int, default=512)
+    parser.add_argument('--repeats', type=int, default=10)
+    parser.add_argument('--device', type=str, default='cuda' if torch.cuda.is_available() else 'cpu')
+    return parser.parse_args()
+
+
+def _time(fn, repeats, device):
+    fn()  # warm-up
+    timings = []
+    for _ in range(repeats):
+        if device.type == 'cuda':
+            torch.cuda.synchronize()
+        started = time.perf_counter()
+        fn()
+        if device.type == 'cuda':
+            torch.cuda.synchronize()
+        timings.append(time.perf_counter() - started)
+    return float(np.median(timings))
+
+
+def main():
+    args = parse_args()
+    device = torch.device(args.device)
+    model = _PaddingOnly(args.d_embed, max_length=16).to(device)
+
+    rng = np.random.default_rng(0)
+    closet = [rng.standard_normal(args.d_embed).astype(np.float32) for _ in range(args.n_closet_items)]
+    embs_of_outfits = [
+        [closet[i] for i in rng.integers(0, len(closet), size=rng.integers(args.min_length, args.max_length + 1))]
+        for _ in range(args.n_outfits)
+    ]
+
+    with torch.no_grad():
+        expected = legacy_pad_and_mask(model, embs_of_outfits)
+        actual = model._pad_and_mask_for_embs(embs_of_outfits)
+        assert torch.equal(expected[1], actual[1]), 'masks differ'
+        assert torch.allclose(expected[0], actual[0]), 'embeddings differ'
+
+        legacy = _time(lambda: legacy_pad_and_mask(model, embs_of_outfits), args.repeats, device)
+        packed = _time(lambda: model._pad_and_mask_for_embs(embs_of_outfits), args.repeats, device)
+
+    print(f"{args.n_outfits} outfits of {args.min_length}-{args.max_length} items "
+          f"(d={args.d_embed}, {args.n_closet_items} distinct items) on {device}")
+    print(f"per-outfit loop: {legacy * 1000:8.2f} ms")
+    print(f"packed:          {packed * 1000:8.2f} ms  ({legacy / packed:.1f}x)")
+
+
+if __name__ == '__main__':
+    main()
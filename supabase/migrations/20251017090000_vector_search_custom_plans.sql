@@ -0,0 +1,6 @@
+-- Plan search_items_by_vector with the actual filter_category value so the
+-- per-category partial indexes built by clip/seed.py --partial-indexes
+-- (WHERE metadata->>'category' = '<category>') can be chosen; a cached
+-- generic plan cannot prove the predicate and falls back to the global index.
+ALTER FUNCTION search_items_by_vector(vector(512), int, text)
+  SET plan_cache_mode = force_custom_plan;
@@ -0,0 +1,39 @@
+-- Search the reduced-dimension collections written by clip/seed.py when
+-- PROJECTION_PATH is set (vecs.ec_item_vectors_<dim>). The query must come
+-- from the CLIP API with projected = true; its dimension selects the table.
+-- Dynamic SQL is planned per call, so per-category partial indexes apply.
+CREATE OR REPLACE FUNCTION search_items_by_projected_vector(
+  query_embedding vector,
+  match_count int DEFAULT 10,
+  filter_category text DEFAULT NULL
+)
+RETURNS TABLE (
+  item_id text,
+  similarity float
+)
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = vecs, public
+AS $$
+DECLARE
+  table_name text := 'ec_item_vectors_' || vector_dims(query_embedding);
+BEGIN
+  IF to_regclass(format('vecs.%I', table_name)) IS NULL THEN
+    RAISE EXCEPTION 'No projected collection vecs.% for % dimensions', table_name, vector_dims(query_embedding)
+      USING ERRCODE = 'undefined_table';
+  END IF;
+
+  RETURN QUERY EXECUTE format(
+    'SELECT ev.id::text, ((ev.vec <#> $1) * -1)::float '
+    'FROM vecs.%I ev '
+    'WHERE $3::text IS NULL OR ev.metadata->>''category'' = $3 '
+    'ORDER BY ev.vec <#> $1 '
+    'LIMIT $2',
+    table_name
+  )
+  USING query_embedding, match_count, filter_category;
+END;
+$$;
+
+GRANT EXECUTE ON FUNCTION search_items_by_projected_vector(vector, int, text)
+  TO authenticated, anon, service_role;